@@ -40,6 +40,7 @@ import tensorflow as tf
 
 from tf_agents.agents.dqn import dqn_agent
 from tf_agents.agents.dqn import q_network
+from tf_agents.drivers import async_runner
 from tf_agents.environments import batched_py_environment
 from tf_agents.environments import suite_gym
 from tf_agents.environments import time_step as ts
@@ -61,12 +62,14 @@ flags.DEFINE_integer('num_iterations', 10000,
 FLAGS = flags.FLAGS
 
 
-def collect_step(env, time_step, py_policy, replay_buffer):
+def collect_step(env, time_step, py_policy, replay_buffer, rate_limiter=None):
   """Steps the environment and collects experience into the replay buffer."""
   action_step = py_policy.action(time_step)
   next_time_step = env.step(action_step.action)
   if not time_step.is_last():
     traj = trajectory.from_transition(time_step, action_step, next_time_step)
+    if rate_limiter is not None:
+      rate_limiter.insert()
     replay_buffer.add_batch(traj)
   return next_time_step
 
@@ -91,6 +94,9 @@ def train_eval(
     gamma=0.99,
     reward_scale_factor=1.0,
     gradient_clipping=None,
+    # Params for asynchronous collection
+    async_collection=False,
+    samples_per_insert=None,
     # Params for eval
     num_eval_episodes=10,
     eval_interval=1000,
@@ -102,7 +108,14 @@ def train_eval(
     debug_summaries=False,
     summarize_grads_and_vars=False,
     eval_metrics_callback=None):
-  """A simple train and eval for DQN."""
+  """A simple train and eval for DQN.
+
+  With async_collection, experience is collected in a thread while training,
+  keeping samples_per_insert items sampled per item inserted in the replay
+  buffer, by default the ratio of the synchronous iterations. The collect
+  policy reads the variables of the learner, so it acts with the latest
+  weights.
+  """
   root_dir = os.path.expanduser(root_dir)
   train_dir = os.path.join(root_dir, 'train')
   eval_dir = os.path.join(root_dir, 'eval')
@@ -178,12 +191,21 @@ def train_eval(
       policy=agent.policy(),
       global_step=global_step)
 
-  ds = replay_buffer.as_dataset(sample_batch_size=batch_size, num_steps=2)
+  # Batches are sampled ahead of training by background threads.
+  ds = replay_buffer.as_dataset(
+      sample_batch_size=batch_size, num_steps=2, num_parallel_calls=3)
   ds = ds.prefetch(4)
   itr = ds.make_initializable_iterator()
 
   experience = itr.get_next()
 
+  rate_limiter = None
+  if async_collection:
+    if samples_per_insert is None:
+      samples_per_insert = (batch_size * train_steps_per_iteration /
+                            collect_steps_per_iteration)
+    rate_limiter = async_runner.RateLimiter(samples_per_insert)
+
   train_op = agent.train(experience, train_step_counter=global_step)
   summary_op = tf.contrib.summary.all_summary_ops()
 
@@ -193,6 +215,10 @@ def train_eval(
       eval_metric.tf_summaries()
 
   with tf.Session() as session:
+    if async_collection:
+      # Build the collect policy before restoring, rather than from the
+      # collector thread, since building it initializes its variables.
+      collect_policy.initialize(env.batch_size)
     train_checkpointer.initialize_or_restore(session)
     # TODO(sguada) Remove once Periodically can be saved.
     common_utils.initialize_uninitialized_variables(session)
@@ -221,50 +247,75 @@ def train_eval(
         tf.float32, shape=(), name='steps_per_sec_ph')
     steps_per_second_summary = tf.contrib.summary.scalar(
         name='global_steps/sec', tensor=steps_per_second_ph)
-    for _ in range(num_iterations):
-      start_time = time.time()
-      for _ in range(collect_steps_per_iteration):
-        time_step = collect_step(env, time_step, collect_policy, replay_buffer)
-      collect_time += time.time() - start_time
-      start_time = time.time()
-      for _ in range(train_steps_per_iteration):
-        loss, global_step_val, _ = train()
-      train_time += time.time() - start_time
-
-      if global_step_val % log_interval == 0:
-        tf.logging.info(
-            'step = %d, loss = %f', global_step_val, loss.loss)
-        steps_per_sec = (
-            (global_step_val - timed_at_step) / (collect_time + train_time))
-        session.run(
-            steps_per_second_summary,
-            feed_dict={steps_per_second_ph: steps_per_sec})
-        tf.logging.info('%.3f steps/sec' % steps_per_sec)
-        tf.logging.info('collect_time = {}, train_time = {}'.format(
-            collect_time, train_time))
-        timed_at_step = global_step_val
-        collect_time = 0
-        train_time = 0
-
-      if global_step_val % train_checkpoint_interval == 0:
-        train_checkpointer.save(global_step=global_step_val)
-
-      if global_step_val % policy_checkpoint_interval == 0:
-        policy_checkpointer.save(global_step=global_step_val)
-
-      if global_step_val % eval_interval == 0:
-        metric_utils.compute_summaries(
-            eval_metrics,
-            eval_py_env,
-            greedy_policy,
-            num_episodes=num_eval_episodes,
-            global_step=global_step_val,
-            log=True,
-            callback=eval_metrics_callback,
-        )
-        # Reset timing to avoid counting eval time.
-        timed_at_step = global_step_val
-        start_time = time.time()
+
+    if async_collection:
+      time_steps = [time_step]
+
+      def async_collect_step():
+        time_steps[0] = collect_step(env, time_steps[0], collect_policy,
+                                     replay_buffer, rate_limiter)
+
+      runner = async_runner.AsyncRunner(
+          [async_collect_step], train, rate_limiter=rate_limiter,
+          sample_batch_size=batch_size, session=session)
+      runner.start()
+
+    try:
+      for _ in range(num_iterations):
+        if async_collection:
+          # Collection runs in the background, counted in the train time.
+          start_time = time.time()
+          for _ in range(train_steps_per_iteration):
+            loss, global_step_val, _ = runner.train_step()
+          train_time += time.time() - start_time
+        else:
+          start_time = time.time()
+          for _ in range(collect_steps_per_iteration):
+            time_step = collect_step(env, time_step, collect_policy,
+                                     replay_buffer)
+          collect_time += time.time() - start_time
+          start_time = time.time()
+          for _ in range(train_steps_per_iteration):
+            loss, global_step_val, _ = train()
+          train_time += time.time() - start_time
+
+        if global_step_val % log_interval == 0:
+          tf.logging.info(
+              'step = %d, loss = %f', global_step_val, loss.loss)
+          steps_per_sec = (
+              (global_step_val - timed_at_step) / (collect_time + train_time))
+          session.run(
+              steps_per_second_summary,
+              feed_dict={steps_per_second_ph: steps_per_sec})
+          tf.logging.info('%.3f steps/sec' % steps_per_sec)
+          tf.logging.info('collect_time = {}, train_time = {}'.format(
+              collect_time, train_time))
+          timed_at_step = global_step_val
+          collect_time = 0
+          train_time = 0
+
+        if global_step_val % train_checkpoint_interval == 0:
+          train_checkpointer.save(global_step=global_step_val)
+
+        if global_step_val % policy_checkpoint_interval == 0:
+          policy_checkpointer.save(global_step=global_step_val)
+
+        if global_step_val % eval_interval == 0:
+          metric_utils.compute_summaries(
+              eval_metrics,
+              eval_py_env,
+              greedy_policy,
+              num_episodes=num_eval_episodes,
+              global_step=global_step_val,
+              log=True,
+              callback=eval_metrics_callback,
+          )
+          # Reset timing to avoid counting eval time.
+          timed_at_step = global_step_val
+          start_time = time.time()
+    finally:
+      if async_collection:
+        runner.stop()
 
 
 def main(_):
@@ -48,6 +48,7 @@ from __future__ import division
 from __future__ import print_function
 
 import os
+import threading
 from absl import flags
 
 import numpy as np
@@ -55,6 +56,7 @@ import tensorflow as tf
 
 from tf_agents.agents.dqn import dqn_agent
 from tf_agents.agents.dqn import q_network
+from tf_agents.drivers import async_runner
 from tf_agents.environments import batched_py_environment
 from tf_agents.environments import suite_atari
 from tf_agents.environments import time_step as ts
@@ -64,8 +66,9 @@ from tf_agents.metrics import py_metrics
 from tf_agents.policies import epsilon_greedy_policy
 from tf_agents.policies import policy_step
 from tf_agents.policies import py_tf_policy
+from tf_agents.policies import q_policy
 from tf_agents.policies import random_py_policy
-from tf_agents.replay_buffers import py_hashed_replay_buffer
+from tf_agents.replay_buffers import py_frame_stack_replay_buffer
 from tf_agents.specs import tensor_spec
 from tf_agents.utils import common as common_utils
 from tf_agents.utils import timer
@@ -129,6 +132,10 @@ class TrainEval(object):
       gamma=0.99,
       reward_scale_factor=1.0,
       gradient_clipping=None,
+      # Params for asynchronous collection
+      async_collection=False,
+      samples_per_insert=None,
+      policy_update_period=1,
       # Params for eval
       do_eval=True,
       eval_steps_per_iteration=500000,  # ALE frames
@@ -170,6 +177,16 @@ class TrainEval(object):
       gamma: Discount for future rewards.
       reward_scale_factor: Scaling factor for rewards.
       gradient_clipping: Norm length to clip gradients.
+      async_collection: If True, the train phases collect experience in a
+        collector thread while the learner trains, rather than alternating
+        between collect steps and train steps. The collector acts with a copy
+        of the Q-network on the CPU.
+      samples_per_insert: Number of items sampled per item inserted in the RB
+        that collection and training are kept at, with async_collection.
+        Defaults to batch_size / update_period, the ratio of the synchronous
+        train phases.
+      policy_update_period: Number of train steps between copies of the
+        Q-network to the collector, with async_collection.
       do_eval: If True, run an eval every iteration. If False, skip eval.
       eval_steps_per_iteration: Number of ALE frames to run through for each
         iteration of training.
@@ -199,6 +216,18 @@ class TrainEval(object):
     self._num_iterations = num_iterations
     self._log_interval = log_interval
     self._eval_metrics_callback = eval_metrics_callback
+    self._batch_size = batch_size
+    self._async_collection = async_collection
+    self._policy_update_period = policy_update_period
+    self._rate_limiter = None
+    if self._async_collection:
+      if samples_per_insert is None:
+        samples_per_insert = batch_size / self._update_period
+      self._rate_limiter = async_runner.RateLimiter(samples_per_insert)
+    # Guards the metrics, updated by the collector thread while the learner
+    # logs them when collecting asynchronously. Collecting may block on the
+    # rate limiter, so the lock is only held while observing.
+    self._metrics_lock = threading.Lock()
 
     with gin.unlock_config():
       gin.bind_parameter('AtariPreprocessing.terminal_on_life_loss',
@@ -271,8 +300,21 @@ class TrainEval(object):
             debug_summaries=debug_summaries,
             summarize_grads_and_vars=summarize_grads_and_vars)
 
-        self._collect_policy = py_tf_policy.PyTFPolicy(
-            tf_agent.collect_policy())
+        if self._async_collection:
+          # The collector acts with its own copy of the Q-network, so that
+          # acting doesn't wait for the train steps on the GPU.
+          with tf.device('/cpu:0'):
+            actor_q_net = q_net.copy(name='ActorQNetwork')
+            # Create the variables of the copy.
+            actor_q_net(tf.zeros([1] + observation_spec.shape.as_list(),
+                                 observation_spec.dtype))
+            collect_policy = epsilon_greedy_policy.EpsilonGreedyPolicy(
+                policy=q_policy.QPolicy(
+                    time_step_spec, action_spec, q_network=actor_q_net),
+                epsilon=epsilon)
+        else:
+          collect_policy = tf_agent.collect_policy()
+        self._collect_policy = py_tf_policy.PyTFPolicy(collect_policy)
 
         if self._do_eval:
           self._eval_policy = py_tf_policy.PyTFPolicy(
@@ -286,10 +328,12 @@ class TrainEval(object):
         data_spec = trajectory.from_transition(
             py_time_step_spec, py_action_spec, py_time_step_spec)
         self._replay_buffer = (
-            py_hashed_replay_buffer.PyHashedReplayBuffer(
+            py_frame_stack_replay_buffer.PyFrameStackReplayBuffer(
                 data_spec=data_spec, capacity=replay_buffer_capacity))
+        # Batches are sampled ahead of training by background threads.
         ds = self._replay_buffer.as_dataset(
-            sample_batch_size=batch_size, num_steps=2).prefetch(4)
+            sample_batch_size=batch_size, num_steps=2,
+            num_parallel_calls=3).prefetch(4)
         self._ds_itr = ds.make_initializable_iterator()
         experience = self._ds_itr.get_next()
 
@@ -299,6 +343,10 @@ class TrainEval(object):
 
         self._summary_op = tf.contrib.summary.all_summary_ops()
 
+        if self._async_collection:
+          self._update_actor_op = common_utils.soft_variables_update(
+              q_net.variables, actor_q_net.variables)
+
         self._env_steps_metric = py_metrics.EnvironmentSteps()
         self._step_metrics = [
             py_metrics.NumberOfEpisodes(),
@@ -374,9 +422,13 @@ class TrainEval(object):
         env_steps = 0
         for metric in self._train_phase_metrics:
           metric.reset()
-        while env_steps < self._train_steps_per_iteration:
-          env_steps += self._run_episode(
-              sess, self._train_metrics + self._train_phase_metrics, train=True)
+        if self._async_collection:
+          self._run_async_train_phase(sess)
+        else:
+          while env_steps < self._train_steps_per_iteration:
+            env_steps += self._run_episode(
+                sess, self._train_metrics + self._train_phase_metrics,
+                train=True)
         for metric in self._train_phase_metrics:
           log_metric(metric, prefix='Train/Metrics')
         py_metric.run_summaries(
@@ -409,6 +461,10 @@ class TrainEval(object):
 
   def _initialize_graph(self, sess):
     """Initialize the graph for sess."""
+    if self._async_collection:
+      # Build the collect policy now, rather than from the collector thread,
+      # since building it initializes the variables of the Q-network copy.
+      self._collect_policy.initialize(self._env.batch_size)
     self._train_checkpointer.initialize_or_restore(sess)
     self._rb_checkpointer.initialize_or_restore(sess)
     # TODO(sguada) Remove once Periodically can be saved.
@@ -420,6 +476,19 @@ class TrainEval(object):
     self._train_step_call = sess.make_callable(
         [self._train_op, self._summary_op])
 
+    if self._async_collection:
+      update_actor_call = sess.make_callable(self._update_actor_op)
+      update_actor_call()
+      self._runner = async_runner.AsyncRunner(
+          [self._async_collect_step],
+          self._train_step_call,
+          rate_limiter=self._rate_limiter,
+          sample_batch_size=self._batch_size,
+          policy_update_fn=update_actor_call,
+          policy_update_period=self._policy_update_period,
+          session=sess)
+      self._async_time_step = None
+
     self._collect_timer = timer.Timer()
     self._train_timer = timer.Timer()
     self._action_timer = timer.Timer()
@@ -477,8 +546,33 @@ class TrainEval(object):
 
     return env_steps
 
+  def _run_async_train_phase(self, sess):
+    """Run the train steps of an iteration while collecting in a thread."""
+    # The eval phase steps the same environment, so each phase starts a new
+    # episode.
+    self._async_time_step = None
+    num_train_steps = int(
+        self._train_steps_per_iteration / self._update_period)
+    with self._runner:
+      for _ in range(num_train_steps):
+        with self._train_timer:
+          total_loss, _ = self._runner.train_step()
+          global_step_val = sess.run(self._global_step)
+        self._maybe_log(sess, global_step_val, total_loss)
+        self._maybe_record_summaries(global_step_val)
+
+  def _async_collect_step(self):
+    """Collect a step in the collector thread of the AsyncRunner."""
+    if self._async_time_step is None or self.game_over():
+      self._async_time_step = self._env.reset()
+    with self._collect_timer:
+      self._async_time_step = self._collect_step(
+          self._async_time_step,
+          self._train_metrics + self._train_phase_metrics,
+          train=True)
+
   def _observe(self, metric_observers, traj):
-    with self._observer_timer:
+    with self._metrics_lock, self._observer_timer:
       for observer in metric_observers:
         observer(traj)
 
@@ -486,6 +580,8 @@ class TrainEval(object):
     # Clip the reward to (-1, 1) to normalize rewards in training.
     traj = traj._replace(
         reward=np.asarray(np.clip(traj.reward, -1, 1)))
+    if self._rate_limiter is not None:
+      self._rate_limiter.insert()
     self._replay_buffer.add_batch(traj)
 
   def _collect_step(self, time_step, metric_observers, train=False):
@@ -545,7 +641,8 @@ class TrainEval(object):
   def _maybe_record_summaries(self, global_step_val):
     """Record summaries if global_step_val is a multiple of summary_interval."""
     if global_step_val % self._summary_interval == 0:
-      py_metric.run_summaries(self._train_metrics)
+      with self._metrics_lock:
+        py_metric.run_summaries(self._train_metrics)
 
   def _maybe_log(self, sess, global_step_val, total_loss):
     """Log some stats if global_step_val is a multiple of log_interval."""
@@ -554,16 +651,22 @@ class TrainEval(object):
       tf.logging.info('action_time = {}'.format(self._action_timer.value()))
       tf.logging.info('step_time = {}'.format(self._step_timer.value()))
       tf.logging.info('oberver_time = {}'.format(self._observer_timer.value()))
-      steps_per_sec = ((global_step_val - self._timed_at_step) /
-                       (self._collect_timer.value()
-                        + self._train_timer.value()))
+      if self._async_collection:
+        # Collection runs while training, so the train time is the elapsed
+        # time.
+        elapsed_time = self._train_timer.value()
+      else:
+        elapsed_time = (self._collect_timer.value() +
+                        self._train_timer.value())
+      steps_per_sec = (global_step_val - self._timed_at_step) / elapsed_time
       sess.run(self._steps_per_second_summary,
                feed_dict={self._steps_per_second_ph: steps_per_sec})
       tf.logging.info('%.3f steps/sec' % steps_per_sec)
       tf.logging.info('collect_time = {}, train_time = {}'.format(
           self._collect_timer.value(), self._train_timer.value()))
-      for metric in self._train_metrics:
-        log_metric(metric, prefix='Train/Metrics')
+      with self._metrics_lock:
+        for metric in self._train_metrics:
+          log_metric(metric, prefix='Train/Metrics')
       self._timed_at_step = global_step_val
       self._collect_timer.reset()
       self._train_timer.reset()
@@ -0,0 +1,340 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A pool of actor processes collecting experience for a central learner.
+
+Each actor process creates its own environment, usually batched, and its own
+copy of the policy, e.g. a PyTFPolicy with its own graph and session on the
+CPU, and steps them with a PyDriver. The chunks of steps of the actors are
+sent to the learner process through pipes, and the learner pushes the weights
+of the policy to the actors through shared memory:
+
+```python
+pool = actor_pool.ActorPool(
+    env_constructors, policy_constructor, chunk_size=50,
+    initial_weights=sess.run(tf_policy.variables()), start_method='spawn')
+runner = async_runner.AsyncRunner(
+    [pool.collect_fn([rate_limiter.rate_limited(replay_buffer.add_batch)])],
+    train_fn, rate_limiter=rate_limiter, sample_batch_size=batch_size,
+    policy_update_fn=lambda: pool.update_weights(
+        sess.run(tf_policy.variables())),
+    policy_update_period=100)
+```
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import atexit
+import collections
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+import numpy as np
+import tensorflow as tf
+
+from tf_agents.drivers import py_driver
+from tf_agents.environments import parallel_py_environment
+import gin.tf
+
+# Message types for communication via the pipes.
+_READY = 1
+_CHUNK = 2
+_EXCEPTION = 3
+_CLOSE = 4
+
+
+@gin.configurable
+class ActorPool(object):
+  """Steps environments with copies of a policy in actor processes.
+
+  The chunks of steps of all the actors are received with `receive`, in the
+  order in which they arrive. An actor waits while the learner doesn't receive
+  its chunks, so the learner controls the speed of collection.
+
+  The policies get the weights given to `update_weights` between two chunks,
+  with their `set_weights` method, e.g. `PyTFPolicy.set_weights`.
+  """
+
+  def __init__(self, env_constructors, policy_constructor, chunk_size=100,
+               initial_weights=None, cpu_placement=None, start_method=None):
+    """Creates the actor processes, and waits until they are ready.
+
+    Args:
+      env_constructors: List of callables creating the environment of each
+        actor process, usually a batched one, e.g. a VectorizedPyEnvironment.
+      policy_constructor: Callable creating the py_policy.Base of each actor
+        process, acting on the time steps of its environment. It creates the
+        session of a PyTFPolicy, e.g. on the CPU with a
+        `tf.ConfigProto(device_count={'GPU': 0})`.
+      chunk_size: Number of steps of each environment of the actors sent per
+        chunk. The chunks are trajectories of outer dimensions [batch_size,
+        T], T being chunk_size for most chunks but not all, since the driver
+        of an actor sends the steps taken so far each time it checks for new
+        weights.
+      initial_weights: Optional list of the arrays of the weights of the
+        policy, given to the policies before they act. Their shapes and
+        dtypes are the ones of all the weights given to `update_weights`,
+        which requires them.
+      cpu_placement: Optional cpu_placement.CpuPlacement pinning each actor
+        process to cores.
+      start_method: Optional multiprocessing start method of the actors,
+        'fork', 'spawn' or 'forkserver'. Defaults to the one of the platform.
+        Other than 'fork' requires picklable constructors and Python 3, but is
+        safer when the learner already runs TensorFlow.
+    """
+    if start_method is None:
+      context = multiprocessing
+    else:
+      context = multiprocessing.get_context(start_method)
+    num_actors = len(env_constructors)
+    if cpu_placement is not None:
+      cpu_affinities = cpu_placement.worker_affinities(num_actors)
+      tf.logging.info('Placing actors with %r.', cpu_placement)
+    else:
+      cpu_affinities = [None] * num_actors
+    self._weights = None
+    self._weights_lock = context.Lock()
+    # Number of updates of the weights, for the actors to notice new ones.
+    self._weights_version = context.Value('l', 0, lock=False)
+    # Connections with messages left to receive, and the lock of `receive`.
+    self._ready = collections.deque()
+    self._receive_lock = threading.Lock()
+    self._connections = []
+    self._processes = []
+    self._closed = False
+    directory = None
+    weights_info = None
+    if initial_weights is not None:
+      directory, weights_info = self._create_shared_weights(initial_weights)
+    try:
+      for env_constructor, cpu_affinity in zip(env_constructors,
+                                               cpu_affinities):
+        connection, actor_connection = context.Pipe()
+        process = context.Process(
+            target=_actor_worker,
+            args=(actor_connection, env_constructor, policy_constructor,
+                  chunk_size, weights_info, self._weights_lock,
+                  self._weights_version, cpu_affinity),
+            name='actor_{}'.format(len(self._processes)))
+        process.daemon = True
+        process.start()
+        self._connections.append(connection)
+        self._processes.append(process)
+      atexit.register(self.close)
+      # The actors start at the same time, and map the shared weights before
+      # being ready.
+      for connection in self._connections:
+        self._receive(connection, expected_message=_READY)
+    finally:
+      if directory is not None:
+        shutil.rmtree(directory, ignore_errors=True)
+
+  def _create_shared_weights(self, initial_weights):
+    """Shares the initial weights, in memory-mapped files of a directory.
+
+    Args:
+      initial_weights: List of arrays of the weights.
+
+    Returns:
+      A (directory, weights info) pair of the temporary directory of the files,
+      preferably in /dev/shm, and a list of (path, dtype string, shape) of the
+      files.
+    """
+    shm_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+    directory = tempfile.mkdtemp(prefix='actor_pool_', dir=shm_dir)
+    weights_info = []
+    self._weights = []
+    for i, weight in enumerate(initial_weights):
+      weight = np.asarray(weight)
+      path = os.path.join(directory, str(i))
+      weights_info.append((path, weight.dtype.str, weight.shape))
+      self._weights.append(np.memmap(
+          path, dtype=weight.dtype, mode='w+', shape=weight.shape))
+      self._weights[-1][...] = weight
+    # The actors apply the initial weights before acting.
+    self._weights_version.value = 1
+    return directory, weights_info
+
+  @property
+  def num_actors(self):
+    return len(self._processes)
+
+  def update_weights(self, weights):
+    """Shares new weights of the policy, applied by the actors.
+
+    Args:
+      weights: List of arrays with the shapes and dtypes of initial_weights.
+
+    Raises:
+      ValueError: If the pool was created without initial_weights.
+    """
+    if self._weights is None:
+      raise ValueError('Updating the weights requires initial_weights.')
+    with self._weights_lock:
+      for shared_weight, weight in zip(self._weights, weights):
+        shared_weight[...] = weight
+      self._weights_version.value += 1
+
+  def receive(self):
+    """Waits for the next chunk of an actor.
+
+    Returns:
+      A trajectory.Trajectory of outer dimensions [batch_size, T].
+
+    Raises:
+      Exception: An exception was raised inside an actor process.
+    """
+    with self._receive_lock:
+      if not self._ready:
+        self._ready.extend(
+            parallel_py_environment.wait_connections(self._connections))
+      # The connections ready at the same time are received in turn.
+      return self._receive(self._ready.popleft(), expected_message=_CHUNK)
+
+  def collect_fn(self, observers):
+    """Returns a function receiving a chunk and passing it to observers.
+
+    Args:
+      observers: List of callable(trajectory.Trajectory), e.g. the
+        `add_batch` of a replay buffer.
+
+    Returns:
+      A function without arguments, e.g. a collect function of an
+      async_runner.AsyncRunner.
+    """
+    def collect():
+      chunk = self.receive()
+      for observer in observers:
+        observer(chunk)
+
+    return collect
+
+  def _receive(self, connection, expected_message):
+    """Waits for a message from an actor and returns its payload.
+
+    Args:
+      connection: The connection of the actor.
+      expected_message: The expected message type.
+
+    Returns:
+      The payload of the message.
+
+    Raises:
+      Exception: An exception was raised inside the actor process.
+      KeyError: The received message is of an unexpected type.
+    """
+    message, payload = connection.recv()
+    if message == _EXCEPTION:
+      raise Exception(payload)
+    if message != expected_message:
+      raise KeyError('Received message of unexpected type {}'.format(message))
+    return payload
+
+  def close(self, timeout=5):
+    """Stops the actors and joins their processes.
+
+    Args:
+      timeout: Seconds to wait for the actors to stop, before terminating
+        them.
+    """
+    if self._closed:
+      return
+    self._closed = True
+    for connection in self._connections:
+      try:
+        connection.send((_CLOSE, None))
+      except IOError:
+        # The connection was already closed.
+        pass
+    deadline = time.time() + timeout
+    for connection, process in zip(self._connections, self._processes):
+      # Receive the chunks the actor may be blocked sending, until it stops.
+      while process.is_alive() and time.time() < deadline:
+        try:
+          if connection.poll(0.1):
+            connection.recv()
+        except (EOFError, IOError):
+          break
+      process.join(max(0, deadline - time.time()))
+      if process.is_alive():
+        process.terminate()
+      connection.close()
+
+
+def _actor_worker(connection, env_constructor, policy_constructor,
+                  chunk_size, weights_info, weights_lock, weights_version,
+                  cpu_affinity):
+  """Steps an environment with a policy and sends the chunks of steps.
+
+  Args:
+    connection: Connection to the learner process.
+    env_constructor: Callable creating the environment.
+    policy_constructor: Callable creating the policy.
+    chunk_size: Number of steps of each environment per chunk.
+    weights_info: Optional list of (path, dtype string, shape) of the
+      memory-mapped files of the shared weights.
+    weights_lock: Lock of the shared weights.
+    weights_version: Shared number of updates of the weights.
+    cpu_affinity: Optional list of the cores to pin the process to.
+  """
+  try:
+    if cpu_affinity is not None:
+      os.sched_setaffinity(0, cpu_affinity)
+    env = env_constructor()
+    policy = policy_constructor()
+    shared_weights = None
+    if weights_info is not None:
+      shared_weights = [
+          np.memmap(path, dtype=np.dtype(dtype), mode='r', shape=shape)
+          for path, dtype, shape in weights_info]
+    connection.send((_READY, None))
+
+    time_step = env.reset()
+    policy_state = policy.get_initial_state(env.batch_size)
+    send_chunk = lambda chunk: connection.send((_CHUNK, chunk))
+    # Each run takes about chunk_size steps of each environment, and the
+    # weights are checked between runs.
+    driver = py_driver.PyDriver(
+        env, policy, observers=[], chunk_observers=[send_chunk],
+        chunk_size=chunk_size, max_steps=chunk_size * (env.batch_size or 1))
+    version = 0
+    while not connection.poll():
+      if shared_weights is not None and weights_version.value != version:
+        with weights_lock:
+          version = weights_version.value
+          weights = [np.array(weight) for weight in shared_weights]
+        policy.set_weights(weights)
+      time_step, policy_state = driver.run(time_step, policy_state)
+    message, _ = connection.recv()
+    assert message == _CLOSE, message
+  except (EOFError, IOError, KeyboardInterrupt):
+    # The learner is gone.
+    pass
+  except Exception:  # pylint: disable=broad-except
+    etype, evalue, tb = sys.exc_info()
+    stacktrace = ''.join(traceback.format_exception(etype, evalue, tb))
+    message = 'Error in actor process: {}'.format(stacktrace)
+    tf.logging.error(message)
+    connection.send((_EXCEPTION, stacktrace))
+  finally:
+    connection.close()
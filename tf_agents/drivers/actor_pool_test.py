@@ -0,0 +1,111 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for tf_agents.drivers.actor_pool."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+from tf_agents.drivers import actor_pool
+from tf_agents.drivers import test_utils as driver_test_utils
+from tf_agents.policies import policy_step
+from tf_agents.policies import py_policy
+
+
+class ConstantActionPolicy(py_policy.Base):
+  """Policy taking the action given by its weights."""
+
+  def __init__(self):
+    env = driver_test_utils.PyEnvironmentMock()
+    super(ConstantActionPolicy, self).__init__(env.time_step_spec(),
+                                               env.action_spec())
+    self._action_value = np.int32(1)
+
+  def set_weights(self, weights):
+    self._action_value = np.int32(weights[0])
+
+  def _action(self, time_step, policy_state):
+    return policy_step.PolicyStep(self._action_value, policy_state, ())
+
+
+class FailingEnvironment(driver_test_utils.PyEnvironmentMock):
+
+  def reset(self):
+    raise ValueError('reset error')
+
+
+class ActorPoolTest(tf.test.TestCase):
+
+  def _receive_actions(self, pool, num_chunks):
+    actions = set()
+    for _ in range(num_chunks):
+      chunk = pool.receive()
+      self.assertEqual(1, chunk.step_type.shape[0])
+      self.assertLessEqual(chunk.step_type.shape[1], 4)
+      actions.update(chunk.action.flatten())
+    return actions
+
+  def testReceivesChunks(self):
+    pool = actor_pool.ActorPool(
+        [driver_test_utils.PyEnvironmentMock] * 3, ConstantActionPolicy,
+        chunk_size=4, initial_weights=[np.array(2)])
+    try:
+      self.assertEqual(3, pool.num_actors)
+      # The actors act with the initial weights.
+      self.assertEqual({2}, self._receive_actions(pool, 10))
+    finally:
+      pool.close()
+
+  def testUpdateWeights(self):
+    pool = actor_pool.ActorPool(
+        [driver_test_utils.PyEnvironmentMock] * 2, ConstantActionPolicy,
+        chunk_size=4, initial_weights=[np.array(1)])
+    try:
+      self.assertEqual({1}, self._receive_actions(pool, 2))
+      pool.update_weights([np.array(2)])
+      # The chunks sent before the update are received first.
+      for _ in range(10000):
+        if 2 in self._receive_actions(pool, 1):
+          break
+      else:
+        self.fail('The actors did not act with the new weights.')
+    finally:
+      pool.close()
+
+  def testUpdateWeightsRequiresInitialWeights(self):
+    pool = actor_pool.ActorPool(
+        [driver_test_utils.PyEnvironmentMock], ConstantActionPolicy,
+        chunk_size=4)
+    try:
+      with self.assertRaises(ValueError):
+        pool.update_weights([np.array(2)])
+    finally:
+      pool.close()
+
+  def testRaisesActorError(self):
+    pool = actor_pool.ActorPool([FailingEnvironment], ConstantActionPolicy)
+    try:
+      with self.assertRaisesRegexp(Exception, 'reset error'):
+        pool.receive()
+    finally:
+      pool.close()
+
+
+if __name__ == '__main__':
+  tf.test.main()
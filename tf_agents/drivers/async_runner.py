@@ -0,0 +1,351 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Runs collection and training at the same time, in separate threads.
+
+Collector threads step their environments and add the trajectories to a
+replay buffer, while the learner trains from batches sampled from it. A
+RateLimiter keeps the number of samples trained on per item inserted close to
+a target, so that the replay ratio doesn't depend on the relative speed of
+collection and training:
+
+```python
+rate_limiter = async_runner.RateLimiter(samples_per_insert=8.)
+driver = py_driver.PyDriver(
+    env, collect_policy,
+    observers=[rate_limiter.rate_limited(replay_buffer.add_batch)],
+    max_steps=100)
+runner = async_runner.AsyncRunner(
+    [async_runner.driver_collect_fn(driver)], train_fn,
+    rate_limiter=rate_limiter, sample_batch_size=batch_size)
+with runner:
+  for _ in range(num_train_steps):
+    loss = runner.train_step()
+```
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import contextlib
+import threading
+
+import numpy as np
+import tensorflow as tf
+import gin.tf
+
+
+@gin.configurable
+class RateLimiter(object):
+  """Blocks inserts or samples to keep samples per insert near a target.
+
+  The limiter counts the items inserted in a replay buffer and the items
+  sampled from it, and lets the difference
+  `samples_per_insert * inserts - samples` drift at most error_buffer away
+  from `samples_per_insert * min_size_to_sample`: inserts wait while the
+  learner is too far behind, and samples wait while the collectors are too far
+  behind. Whether a call may proceed is checked before counting it, so calls
+  of any number of items never deadlock.
+
+  A closed limiter doesn't block anymore, but still counts the calls.
+  """
+
+  def __init__(self, samples_per_insert, min_size_to_sample=1,
+               error_buffer=100.):
+    """Creates a RateLimiter.
+
+    Args:
+      samples_per_insert: Target number of items sampled per item inserted.
+      min_size_to_sample: Number of items inserted before sampling starts.
+      error_buffer: Number of samples the learner may get ahead, or behind,
+        of the target.
+
+    Raises:
+      ValueError: If samples_per_insert is not positive, or error_buffer is
+        negative.
+    """
+    if samples_per_insert <= 0:
+      raise ValueError('samples_per_insert must be positive, got {}.'.format(
+          samples_per_insert))
+    if error_buffer < 0:
+      raise ValueError('error_buffer must not be negative, got {}.'.format(
+          error_buffer))
+    self._samples_per_insert = float(samples_per_insert)
+    self._min_size_to_sample = min_size_to_sample
+    target = self._samples_per_insert * min_size_to_sample
+    self._min_diff = target - error_buffer
+    self._max_diff = target + error_buffer
+    self._num_inserts = 0
+    self._num_samples = 0
+    self._closed = False
+    self._condition = threading.Condition()
+
+  @property
+  def num_inserts(self):
+    return self._num_inserts
+
+  @property
+  def num_samples(self):
+    return self._num_samples
+
+  def _diff(self):
+    return self._samples_per_insert * self._num_inserts - self._num_samples
+
+  def _can_insert(self):
+    return self._diff() <= self._max_diff
+
+  def _can_sample(self):
+    return (self._num_inserts >= self._min_size_to_sample and
+            self._diff() >= self._min_diff)
+
+  def _wait_and_count(self, can_proceed, num_inserts, num_samples):
+    """Waits until can_proceed() or closed, and counts the call."""
+    with self._condition:
+      while not self._closed and not can_proceed():
+        self._condition.wait()
+      self._num_inserts += num_inserts
+      self._num_samples += num_samples
+      self._condition.notify_all()
+      return not self._closed
+
+  def insert(self, num_items=1):
+    """Waits until num_items may be inserted, and counts them.
+
+    Args:
+      num_items: Number of items about to be inserted.
+
+    Returns:
+      False if the limiter is closed, True otherwise.
+    """
+    return self._wait_and_count(self._can_insert, num_items, 0)
+
+  def sample(self, num_items=1):
+    """Waits until num_items may be sampled, and counts them.
+
+    Args:
+      num_items: Number of items about to be sampled.
+
+    Returns:
+      False if the limiter is closed, True otherwise.
+    """
+    return self._wait_and_count(self._can_sample, 0, num_items)
+
+  def rate_limited(self, observer):
+    """Returns an observer calling `insert` before passing the trajectories.
+
+    Args:
+      observer: A callable(trajectory.Trajectory) inserting the trajectories
+        in the replay buffer, e.g. its `add_batch`.
+
+    Returns:
+      A callable(trajectory.Trajectory), counting one item per step type.
+    """
+    def rate_limited_observer(traj):
+      self.insert(int(np.size(traj.step_type)))
+      return observer(traj)
+
+    return rate_limited_observer
+
+  def close(self):
+    """Wakes up the waiting calls, the next ones don't block."""
+    with self._condition:
+      self._closed = True
+      self._condition.notify_all()
+
+  def open(self):
+    """Makes the calls block again, keeping the counts."""
+    with self._condition:
+      self._closed = False
+
+
+def driver_collect_fn(driver, time_step=None, policy_state=None):
+  """Returns a function running the driver from where it last stopped.
+
+  Args:
+    driver: A py_driver.PyDriver with max_steps or max_episodes set, so that
+      each call of the function collects a bounded amount of experience.
+    time_step: Optional initial time step, by default the environment of the
+      driver is reset.
+    policy_state: Optional initial policy state, by default the initial state
+      of the policy of the driver.
+
+  Returns:
+    A function without arguments calling `driver.run` once.
+  """
+  state = {'time_step': time_step, 'policy_state': policy_state}
+
+  def collect_fn():
+    if state['time_step'] is None:
+      state['time_step'] = driver.env.reset()
+    if state['policy_state'] is None:
+      state['policy_state'] = driver.policy.get_initial_state(
+          driver.env.batch_size)
+    state['time_step'], state['policy_state'] = driver.run(
+        state['time_step'], state['policy_state'])
+
+  return collect_fn
+
+
+@gin.configurable
+class AsyncRunner(object):
+  """Runs collect functions in threads while the caller trains.
+
+  Each collect function is called repeatedly in its own thread, between
+  `start` and `stop`, and is expected to insert the experience it collects in
+  the replay buffer through `RateLimiter.insert`, e.g. with an observer
+  wrapped by `RateLimiter.rate_limited`. `train_step` waits for the rate
+  limiter to allow sampling sample_batch_size items, runs the train function,
+  and refreshes the weights of the collect policies every policy_update_period
+  train steps.
+
+  The collect functions run with the session which was the default one when
+  `start` was called as default session, so that PyTFPolicies may be used
+  from the collector threads. Errors raised by the collect functions are
+  raised by the next `train_step` or by `stop`.
+  """
+
+  def __init__(self, collect_fns, train_fn, rate_limiter=None,
+               sample_batch_size=1, policy_update_fn=None,
+               policy_update_period=1, session=None):
+    """Creates an AsyncRunner.
+
+    Args:
+      collect_fns: List of functions without arguments, each one collecting
+        some experience and called in a loop in its own thread.
+      train_fn: Function without arguments running a train step, e.g. a
+        callable made with `session.make_callable(train_op)`.
+      rate_limiter: Optional RateLimiter the collect functions insert through.
+        If None, training and collection run freely.
+      sample_batch_size: Number of items sampled by each train step.
+      policy_update_fn: Optional function without arguments copying the
+        weights of the learner to the collect policies, e.g. a callable
+        running a `common.soft_variables_update` op.
+      policy_update_period: Number of train steps between calls of
+        policy_update_fn.
+      session: Optional session the collect functions run with. Defaults to
+        the default session when `start` is called.
+    """
+    self._collect_fns = collect_fns
+    self._train_fn = train_fn
+    self._rate_limiter = rate_limiter
+    self._sample_batch_size = sample_batch_size
+    self._policy_update_fn = policy_update_fn
+    self._policy_update_period = policy_update_period
+    self._session = session
+    self._num_train_steps = 0
+    self._stop_event = threading.Event()
+    self._threads = []
+    self._errors = []
+
+  @property
+  def num_train_steps(self):
+    """Number of train steps run so far."""
+    return self._num_train_steps
+
+  @property
+  def running(self):
+    return bool(self._threads)
+
+  def start(self):
+    """Starts the collector threads.
+
+    Raises:
+      RuntimeError: If the runner is already running.
+    """
+    if self._threads:
+      raise RuntimeError('The runner is already running.')
+    session = self._session or tf.get_default_session()
+    self._stop_event.clear()
+    self._errors = []
+    if self._rate_limiter is not None:
+      self._rate_limiter.open()
+    self._threads = [
+        threading.Thread(target=self._collect_loop, args=(collect_fn, session),
+                         name='collector_{}'.format(i))
+        for i, collect_fn in enumerate(self._collect_fns)]
+    for thread in self._threads:
+      thread.daemon = True
+      thread.start()
+
+  def _collect_loop(self, collect_fn, session):
+    """Calls collect_fn until the runner stops, or collect_fn raises."""
+    try:
+      with _session_context(session):
+        while not self._stop_event.is_set():
+          collect_fn()
+    except Exception as e:  # pylint: disable=broad-except
+      self._errors.append(e)
+      # Wake up the learner, to raise the error.
+      self._stop_event.set()
+      if self._rate_limiter is not None:
+        self._rate_limiter.close()
+
+  def _raise_collector_error(self):
+    if self._errors:
+      raise self._errors[0]
+
+  def train_step(self):
+    """Runs a train step once the rate limiter allows it.
+
+    Returns:
+      The output of train_fn.
+
+    Raises:
+      RuntimeError: If the runner is not running.
+      Exception: The first error raised by a collect function.
+    """
+    if not self._threads:
+      raise RuntimeError('The runner must be started before training.')
+    if self._rate_limiter is not None:
+      self._rate_limiter.sample(self._sample_batch_size)
+    self._raise_collector_error()
+    result = self._train_fn()
+    self._num_train_steps += 1
+    if (self._policy_update_fn is not None and
+        self._num_train_steps % self._policy_update_period == 0):
+      self._policy_update_fn()
+    return result
+
+  def stop(self):
+    """Stops the collector threads, once their collect functions return.
+
+    Raises:
+      Exception: The first error raised by a collect function.
+    """
+    self._stop_event.set()
+    if self._rate_limiter is not None:
+      self._rate_limiter.close()
+    for thread in self._threads:
+      thread.join()
+    self._threads = []
+    self._raise_collector_error()
+
+  def __enter__(self):
+    self.start()
+    return self
+
+  def __exit__(self, *args):
+    self.stop()
+
+
+@contextlib.contextmanager
+def _session_context(session):
+  """Makes session and its graph the default ones, if session is not None."""
+  if session is None:
+    yield
+    return
+  with session.graph.as_default(), session.as_default():
+    yield
@@ -0,0 +1,165 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for tf_agents.drivers.async_runner."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import threading
+
+import tensorflow as tf
+from tf_agents.drivers import async_runner
+from tf_agents.drivers import py_driver
+from tf_agents.drivers import test_utils as driver_test_utils
+
+
+class RateLimiterTest(tf.test.TestCase):
+
+  def testSampleWaitsForMinSize(self):
+    rate_limiter = async_runner.RateLimiter(
+        samples_per_insert=2., min_size_to_sample=3, error_buffer=10.)
+    sampled = threading.Event()
+
+    def sample():
+      rate_limiter.sample(4)
+      sampled.set()
+
+    thread = threading.Thread(target=sample)
+    thread.start()
+    rate_limiter.insert(2)
+    self.assertFalse(sampled.wait(0.1))
+    rate_limiter.insert(1)
+    thread.join()
+    self.assertEqual(4, rate_limiter.num_samples)
+
+  def testInsertWaitsForSamples(self):
+    rate_limiter = async_runner.RateLimiter(
+        samples_per_insert=2., min_size_to_sample=1, error_buffer=2.)
+    # The difference may grow up to 2 * 1 + 2 = 4, checked before inserting.
+    self.assertTrue(rate_limiter.insert(2))
+    self.assertTrue(rate_limiter.insert(1))
+    inserted = threading.Event()
+
+    def insert():
+      rate_limiter.insert(1)
+      inserted.set()
+
+    thread = threading.Thread(target=insert)
+    thread.start()
+    self.assertFalse(inserted.wait(0.1))
+    rate_limiter.sample(2)
+    thread.join()
+    self.assertEqual(4, rate_limiter.num_inserts)
+
+  def testCloseWakesUpWaitingCalls(self):
+    rate_limiter = async_runner.RateLimiter(samples_per_insert=1.)
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.append(rate_limiter.sample(1)))
+    thread.start()
+    rate_limiter.close()
+    thread.join()
+    self.assertEqual([False], results)
+    self.assertFalse(rate_limiter.sample(1))
+    self.assertEqual(2, rate_limiter.num_samples)
+
+  def testInvalidArguments(self):
+    with self.assertRaises(ValueError):
+      async_runner.RateLimiter(samples_per_insert=0.)
+    with self.assertRaises(ValueError):
+      async_runner.RateLimiter(samples_per_insert=1., error_buffer=-1.)
+
+
+class AsyncRunnerTest(tf.test.TestCase):
+
+  def testKeepsSamplesPerInsert(self):
+    rate_limiter = async_runner.RateLimiter(
+        samples_per_insert=4., min_size_to_sample=1, error_buffer=8.)
+
+    def collect_fn():
+      rate_limiter.insert(1)
+
+    runner = async_runner.AsyncRunner(
+        [collect_fn, collect_fn], train_fn=lambda: 'loss',
+        rate_limiter=rate_limiter, sample_batch_size=2)
+    with runner:
+      for _ in range(100):
+        self.assertEqual('loss', runner.train_step())
+    self.assertEqual(100, runner.num_train_steps)
+    self.assertEqual(200, rate_limiter.num_samples)
+    # 4 * inserts - samples stays within [4 - 8 - 2, 4 + 8 + 4], and each
+    # collector may insert one more item once the runner stops.
+    self.assertGreaterEqual(rate_limiter.num_inserts, 49)
+    self.assertLessEqual(rate_limiter.num_inserts, 56)
+
+  def testUpdatesPolicyEveryPeriod(self):
+    updates = []
+    runner = async_runner.AsyncRunner(
+        [lambda: None], train_fn=lambda: None,
+        policy_update_fn=lambda: updates.append(runner.num_train_steps),
+        policy_update_period=3)
+    with runner:
+      for _ in range(10):
+        runner.train_step()
+    self.assertEqual([3, 6, 9], updates)
+
+  def testRaisesCollectorError(self):
+    rate_limiter = async_runner.RateLimiter(samples_per_insert=1.)
+
+    def collect_fn():
+      raise ValueError('collect error')
+
+    runner = async_runner.AsyncRunner(
+        [collect_fn], train_fn=lambda: None, rate_limiter=rate_limiter)
+    runner.start()
+    with self.assertRaisesRegexp(ValueError, 'collect error'):
+      # The learner waits for an insert, until the collector fails.
+      runner.train_step()
+    with self.assertRaisesRegexp(ValueError, 'collect error'):
+      runner.stop()
+    self.assertFalse(runner.running)
+
+  def testTrainStepRequiresStart(self):
+    runner = async_runner.AsyncRunner([], train_fn=lambda: None)
+    with self.assertRaises(RuntimeError):
+      runner.train_step()
+
+  def testDriverCollectFn(self):
+    env = driver_test_utils.PyEnvironmentMock()
+    policy = driver_test_utils.PyPolicyMock(env.time_step_spec(),
+                                            env.action_spec())
+    rate_limiter = async_runner.RateLimiter(
+        samples_per_insert=1., error_buffer=0.)
+    trajectories = []
+    driver = py_driver.PyDriver(
+        env, policy,
+        observers=[rate_limiter.rate_limited(trajectories.append)],
+        max_steps=1)
+    runner = async_runner.AsyncRunner(
+        [async_runner.driver_collect_fn(driver)], train_fn=lambda: None,
+        rate_limiter=rate_limiter)
+    with runner:
+      for _ in range(5):
+        runner.train_step()
+    self.assertGreaterEqual(len(trajectories), 5)
+    # The driver continues from the last time step of the previous run.
+    self.assertEqual([0, 1, 3, 0, 1], [traj.observation for traj in
+                                       trajectories[:5]])
+
+
+if __name__ == '__main__':
+  tf.test.main()
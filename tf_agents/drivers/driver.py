@@ -21,6 +21,113 @@ from __future__ import print_function
 
 import abc
 import six
+import tensorflow as tf
+
+nest = tf.contrib.framework.nest
+
+
+def create_trajectory_arrays(trajectory_spec):
+  """Returns TensorArrays to accumulate the trajectories of a TF driver loop.
+
+  Args:
+    trajectory_spec: The spec of the batched trajectories to accumulate.
+
+  Returns:
+    A nest of empty TensorArrays matching trajectory_spec, to be passed through
+    a tf.while_loop and filled with `write_trajectory_arrays`.
+  """
+  return nest.map_structure(
+      lambda spec: tf.TensorArray(  # pylint: disable=g-long-lambda
+          spec.dtype, size=0, dynamic_size=True,
+          element_shape=tf.TensorShape([None]).concatenate(spec.shape)),
+      trajectory_spec)
+
+
+def write_trajectory_arrays(trajectory_arrays, traj):
+  """Returns the TensorArrays with the batched trajectory traj appended."""
+  return nest.map_structure(lambda array, t: array.write(array.size(), t),
+                            trajectory_arrays, traj)
+
+
+def stack_trajectory_arrays(trajectory_arrays):
+  """Returns the accumulated trajectories, with shape [batch_size, T, ...]."""
+  def stack(array):
+    # Stacked with shape [T, batch_size, ...].
+    stacked = array.stack()
+    perm = [1, 0] + list(range(2, stacked.shape.ndims))
+    return tf.transpose(stacked, perm)
+  return nest.map_structure(stack, trajectory_arrays)
+
+
+def run_chunked_while_loop(cond, body, loop_vars, trajectory_spec,
+                           chunk_observers, chunk_size=None,
+                           maximum_iterations=None, name='driver_loop'):
+  """Runs a driver loop, passing its trajectories to observers by chunks.
+
+  The driver loop runs as a tf.while_loop of chunks, each one running up to
+  chunk_size iterations of `body` in a nested tf.while_loop which accumulates
+  the trajectories in TensorArrays. The chunk observers are called with the
+  trajectories of each chunk, the last one being shorter if the number of
+  iterations is not a multiple of chunk_size.
+
+  Args:
+    cond: The condition of the driver loop, a callable(counter, time_step,
+      policy_state, trajectory_arrays).
+    body: The body of the driver loop, a callable(counter, time_step,
+      policy_state, trajectory_arrays) returning its next loop_vars, with the
+      trajectory of the step written with `write_trajectory_arrays`.
+    loop_vars: The list [counter, time_step, policy_state] of initial loop
+      vars.
+    trajectory_spec: The spec of the batched trajectories of the steps.
+    chunk_observers: A list of observers, each one a callable(Trajectory)
+      with trajectories of outer dimensions [batch_size, T], T being the
+      number of iterations of the chunk.
+    chunk_size: Optional maximum number of iterations of the chunks. If None,
+      a single chunk with all the iterations is passed to the observers.
+    maximum_iterations: Optional maximum number of iterations of the driver
+      loop.
+    name: Name of the tf.while_loop of chunks.
+
+  Returns:
+    The list [counter, time_step, policy_state] of loop vars after the loop.
+  """
+  def chunk_cond(iterations, *loop_vars):
+    should_continue = cond(*loop_vars)
+    if maximum_iterations is not None:
+      should_continue = tf.logical_and(should_continue,
+                                       iterations < maximum_iterations)
+    return should_continue
+
+  def chunk_body(iterations, *loop_vars):
+    chunk_iterations = chunk_size
+    if maximum_iterations is not None:
+      remaining_iterations = maximum_iterations - iterations
+      if chunk_size is not None:
+        remaining_iterations = tf.minimum(chunk_size, remaining_iterations)
+      chunk_iterations = remaining_iterations
+    loop_vars = tf.while_loop(
+        cond=cond,
+        body=body,
+        loop_vars=list(loop_vars) + [create_trajectory_arrays(trajectory_spec)],
+        back_prop=False,
+        parallel_iterations=1,
+        maximum_iterations=chunk_iterations,
+        name='chunk_loop')
+    trajectory_arrays = loop_vars.pop()
+    iterations += nest.flatten(trajectory_arrays)[0].size()
+    chunk = stack_trajectory_arrays(trajectory_arrays)
+    observer_ops = [observer(chunk) for observer in chunk_observers]
+    with tf.control_dependencies([tf.group(observer_ops)]):
+      return nest.map_structure(tf.identity, [iterations] + loop_vars)
+
+  loop_vars = tf.while_loop(
+      cond=chunk_cond,
+      body=chunk_body,
+      loop_vars=[tf.constant(0)] + list(loop_vars),
+      back_prop=False,
+      parallel_iterations=1,
+      name=name)
+  return loop_vars[1:]
 
 
 @six.add_metaclass(abc.ABCMeta)
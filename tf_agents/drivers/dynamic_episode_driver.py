@@ -46,7 +46,9 @@ class DynamicEpisodeDriver(driver.Driver):
                env,
                policy,
                observers=None,
-               num_episodes=1):
+               num_episodes=1,
+               chunk_observers=None,
+               chunk_size=100):
     """Creates a DynamicEpisodeDriver.
 
     Args:
@@ -55,6 +57,13 @@ class DynamicEpisodeDriver(driver.Driver):
       observers: A list of observers that are updated after every step in
         the environment. Each observer is a callable(Trajectory).
       num_episodes: The number of episodes to take in the environment.
+      chunk_observers: Optional list of observers that are updated once per
+        chunk of chunk_size iterations of the while loop rather than after
+        every step. Each one is a callable(Trajectory) with trajectories of
+        outer dimensions [batch_size, T], T being chunk_size, or less for the
+        last chunk of a run. See DynamicStepDriver.
+      chunk_size: Number of iterations of the chunks passed to chunk_observers.
+        If None, the trajectories of the whole run are passed in one chunk.
 
     Raises:
       ValueError:
@@ -63,6 +72,8 @@ class DynamicEpisodeDriver(driver.Driver):
     """
     super(DynamicEpisodeDriver, self).__init__(env, policy, observers)
     self._num_episodes = num_episodes
+    self._chunk_observers = chunk_observers or []
+    self._chunk_size = chunk_size
 
   def _loop_condition_fn(self, num_episodes):
     """Returns a function with the condition needed for tf.while_loop."""
@@ -81,7 +92,7 @@ class DynamicEpisodeDriver(driver.Driver):
 
   def _loop_body_fn(self):
     """Returns a function with the driver's loop body ops."""
-    def loop_body(counter, time_step, policy_state):
+    def loop_body(counter, time_step, policy_state, trajectory_arrays=None):
       """Runs a step in environment. While loop will call multiple times.
 
       Args:
@@ -89,6 +100,8 @@ class DynamicEpisodeDriver(driver.Driver):
         time_step: TimeStep tuple with elements shape [batch_size, ...].
         policy_state: Poicy state tensor shape [batch_size, policy_state_dim].
           Pass empty tuple for non-recurrent policies.
+        trajectory_arrays: Optional TensorArrays accumulating the trajectories
+          for the chunk observers.
       Returns:
         loop_vars for next iteration of tf.while_loop.
       """
@@ -105,7 +118,11 @@ class DynamicEpisodeDriver(driver.Driver):
       # While loop counter is only incremented for episode reset episodes.
       counter += tf.cast(traj.is_boundary(), dtype=tf.int32)
 
-      return [counter, next_time_step, policy_state]
+      if trajectory_arrays is None:
+        return [counter, next_time_step, policy_state]
+      trajectory_arrays = driver.write_trajectory_arrays(trajectory_arrays,
+                                                         traj)
+      return [counter, next_time_step, policy_state, trajectory_arrays]
 
     return loop_body
 
@@ -148,16 +165,25 @@ class DynamicEpisodeDriver(driver.Driver):
     counter = tf.zeros(batch_dims, tf.int32)
 
     num_episodes = num_episodes or self._num_episodes
-    [_, time_step, policy_state] = tf.while_loop(
-        cond=self._loop_condition_fn(num_episodes),
-        body=self._loop_body_fn(),
-        loop_vars=[
-            counter,
-            time_step,
-            policy_state],
-        back_prop=False,
-        parallel_iterations=1,
-        maximum_iterations=maximum_iterations,
-        name='driver_loop'
-    )
+    loop_vars = [counter, time_step, policy_state]
+    if self._chunk_observers:
+      loop_vars = driver.run_chunked_while_loop(
+          cond=self._loop_condition_fn(num_episodes),
+          body=self._loop_body_fn(),
+          loop_vars=loop_vars,
+          trajectory_spec=self.policy.trajectory_spec(),
+          chunk_observers=self._chunk_observers,
+          chunk_size=self._chunk_size,
+          maximum_iterations=maximum_iterations)
+    else:
+      loop_vars = tf.while_loop(
+          cond=self._loop_condition_fn(num_episodes),
+          body=self._loop_body_fn(),
+          loop_vars=loop_vars,
+          back_prop=False,
+          parallel_iterations=1,
+          maximum_iterations=maximum_iterations,
+          name='driver_loop'
+      )
+    time_step, policy_state = loop_vars[1:3]
     return time_step, policy_state
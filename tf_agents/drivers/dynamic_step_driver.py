@@ -43,6 +43,10 @@ class DynamicStepDriver(driver.Driver):
   batch_size > 1, there is no guarantee that exactly num_steps are taken -- it
   may be more but never less.
 
+  With skip_boundaries, the environments are reset in the same step as they
+  terminate an episode, so that there are no boundary steps after terminal
+  LAST time steps, and every step of the terminated episodes counts.
+
   This termination condition can be overridden in subclasses by implementing the
   self._loop_condition_fn() method.
   """
@@ -52,6 +56,9 @@ class DynamicStepDriver(driver.Driver):
                policy,
                observers=None,
                num_steps=1,
+               chunk_observers=None,
+               chunk_size=100,
+               skip_boundaries=False,
               ):
     """Creates a DynamicStepDriver.
 
@@ -61,14 +68,38 @@ class DynamicStepDriver(driver.Driver):
       observers: A list of observers that are updated after every step in
         the environment. Each observer is a callable(time_step.Trajectory).
       num_steps: The number of steps to take in the environment.
+      chunk_observers: Optional list of observers that are updated once per
+        chunk of chunk_size iterations of the while loop rather than after
+        every step, e.g. the `add_batch` of a TFUniformReplayBuffer to write
+        the steps of a chunk in one op. Each one is a
+        callable(time_step.Trajectory) with trajectories of outer dimensions
+        [batch_size, T], T being chunk_size, or less for the last chunk of a
+        run. The trajectories are accumulated in TensorArrays.
+      chunk_size: Number of iterations of the chunks passed to chunk_observers.
+        If None, the trajectories of the whole run are passed in one chunk.
+      skip_boundaries: Boolean, whether to reset the environments whose time
+        step is a terminal LAST one, with a zero discount, right after the
+        step, with the `reset_last` op of env, e.g. a TFPyEnvironment or a
+        TFVectorizedEnvironment, so that the policy acts on their initial time
+        step and no boundary trajectories are passed to the observers. The
+        LAST time steps of truncated episodes, which keep a non-zero discount,
+        are followed by boundary trajectories as usual, so that agents
+        bootstrap from their observation.
 
     Raises:
       ValueError:
         If env is not a tf_environment.Base or policy is not an instance of
-        tf_policy.Base.
+        tf_policy.Base, or if skip_boundaries is set and env has no
+        `reset_last`.
     """
+    if skip_boundaries and not hasattr(env, 'reset_last'):
+      raise ValueError('`skip_boundaries` requires an environment with '
+                       '`reset_last`.')
     super(DynamicStepDriver, self).__init__(env, policy, observers)
     self._num_steps = num_steps
+    self._chunk_observers = chunk_observers or []
+    self._chunk_size = chunk_size
+    self._skip_boundaries = skip_boundaries
 
   def _loop_condition_fn(self):
     """Returns a function with the condition needed for tf.while_loop."""
@@ -87,7 +118,7 @@ class DynamicStepDriver(driver.Driver):
 
   def _loop_body_fn(self):
     """Returns a function with the driver's loop body ops."""
-    def loop_body(counter, time_step, policy_state):
+    def loop_body(counter, time_step, policy_state, trajectory_arrays=None):
       """Runs a step in environment. While loop will call multiple times.
 
       Args:
@@ -95,6 +126,8 @@ class DynamicStepDriver(driver.Driver):
         time_step: TimeStep tuple with elements shape [batch_size, ...].
         policy_state: Policy state tensor shape [batch_size, policy_state_dim].
           Pass empty tuple for non-recurrent policies.
+        trajectory_arrays: Optional TensorArrays accumulating the trajectories
+          for the chunk observers.
       Returns:
         loop_vars for next iteration of tf.while_loop.
       """
@@ -109,9 +142,16 @@ class DynamicStepDriver(driver.Driver):
             tf.identity, (time_step, next_time_step, policy_state))
 
       # While loop counter should not be incremented for episode reset steps.
+      # Without boundaries, every step counts.
       counter += tf.to_int32(~traj.is_boundary())
+      if self._skip_boundaries:
+        next_time_step = self.env.reset_last(next_time_step)
 
-      return [counter, next_time_step, policy_state]
+      if trajectory_arrays is None:
+        return [counter, next_time_step, policy_state]
+      trajectory_arrays = driver.write_trajectory_arrays(trajectory_arrays,
+                                                         traj)
+      return [counter, next_time_step, policy_state, trajectory_arrays]
 
     return loop_body
 
@@ -140,22 +180,33 @@ class DynamicStepDriver(driver.Driver):
       time_step = self.env.current_time_step()
     if policy_state is None:
       policy_state = self.policy.get_initial_state(self.env.batch_size)
+    if self._skip_boundaries:
+      time_step = self.env.reset_last(time_step)
 
     # Batch dim should be first index of tensors during data collection.
     batch_dims = nest_utils.get_outer_shape(
         time_step, self.env.time_step_spec())
     counter = tf.zeros(batch_dims, tf.int32)
 
-    [_, time_step, policy_state] = tf.while_loop(
-        cond=self._loop_condition_fn(),
-        body=self._loop_body_fn(),
-        loop_vars=[
-            counter,
-            time_step,
-            policy_state],
-        back_prop=False,
-        parallel_iterations=1,
-        maximum_iterations=maximum_iterations,
-        name='driver_loop'
-    )
+    loop_vars = [counter, time_step, policy_state]
+    if self._chunk_observers:
+      loop_vars = driver.run_chunked_while_loop(
+          cond=self._loop_condition_fn(),
+          body=self._loop_body_fn(),
+          loop_vars=loop_vars,
+          trajectory_spec=self.policy.trajectory_spec(),
+          chunk_observers=self._chunk_observers,
+          chunk_size=self._chunk_size,
+          maximum_iterations=maximum_iterations)
+    else:
+      loop_vars = tf.while_loop(
+          cond=self._loop_condition_fn(),
+          body=self._loop_body_fn(),
+          loop_vars=loop_vars,
+          back_prop=False,
+          parallel_iterations=1,
+          maximum_iterations=maximum_iterations,
+          name='driver_loop'
+      )
+    time_step, policy_state = loop_vars[1:3]
     return time_step, policy_state
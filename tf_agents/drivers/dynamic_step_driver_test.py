@@ -155,6 +155,101 @@ class DynamicStepDriverTest(tf.test.TestCase):
     self.assertAllEqual(trajectories.reward, [[1., 1., 0., 1., 1., 0., 1., 1.]])
     self.assertAllEqual(trajectories.discount, [[1., 0., 1, 1, 0, 1., 1., 0.]])
 
+  def testChunkReplayBufferObservers(self):
+    env = tf_py_environment.TFPyEnvironment(
+        driver_test_utils.PyEnvironmentMock())
+    policy = driver_test_utils.TFPolicyMock(env.time_step_spec(),
+                                            env.action_spec())
+    policy_state = policy.get_initial_state(1)
+    replay_buffer = driver_test_utils.make_replay_buffer(policy)
+    num_steps_observer = driver_test_utils.NumStepsObserver()
+
+    driver = dynamic_step_driver.DynamicStepDriver(
+        env, policy, num_steps=6,
+        chunk_observers=[replay_buffer.add_batch, num_steps_observer])
+
+    run_driver = driver.run(policy_state=policy_state)
+    rb_gather_all = replay_buffer.gather_all()
+
+    self.evaluate(tf.global_variables_initializer())
+    self.evaluate(run_driver)
+    trajectories = self.evaluate(rb_gather_all)
+
+    # The trajectories of all the steps are added at once, in order.
+    self.assertEqual(6, self.evaluate(num_steps_observer.num_steps))
+    self.assertAllEqual(trajectories.step_type, [[0, 1, 2, 0, 1, 2, 0, 1]])
+    self.assertAllEqual(trajectories.observation, [[0, 1, 3, 0, 1, 3, 0, 1]])
+    self.assertAllEqual(trajectories.action, [[1, 2, 1, 1, 2, 1, 1, 2]])
+    self.assertAllEqual(trajectories.policy_info, [[2, 4, 2, 2, 4, 2, 2, 4]])
+    self.assertAllEqual(trajectories.next_step_type, [[1, 2, 0, 1, 2, 0, 1, 2]])
+    self.assertAllEqual(trajectories.reward, [[1., 1., 0., 1., 1., 0., 1., 1.]])
+    self.assertAllEqual(trajectories.discount, [[1., 0., 1, 1, 0, 1., 1., 0.]])
+
+  def testChunkSize(self):
+    env = tf_py_environment.TFPyEnvironment(
+        driver_test_utils.PyEnvironmentMock())
+    policy = driver_test_utils.TFPolicyMock(env.time_step_spec(),
+                                            env.action_spec())
+    policy_state = policy.get_initial_state(1)
+    replay_buffer = driver_test_utils.make_replay_buffer(policy)
+    num_steps_observer = driver_test_utils.NumStepsObserver()
+    chunk_lengths = tf.Variable(tf.zeros([0], tf.int32), validate_shape=False)
+
+    def chunk_length_observer(traj):
+      chunk_length = tf.shape(traj.step_type)[1:2]
+      return tf.assign(chunk_lengths, tf.concat([chunk_lengths, chunk_length],
+                                                0), validate_shape=False)
+
+    # The 8 iterations of the loop are passed in chunks of 3, 3 and 2 steps.
+    driver = dynamic_step_driver.DynamicStepDriver(
+        env, policy, num_steps=6,
+        chunk_observers=[replay_buffer.add_batch, num_steps_observer,
+                         chunk_length_observer],
+        chunk_size=3)
+
+    run_driver = driver.run(policy_state=policy_state)
+    rb_gather_all = replay_buffer.gather_all()
+
+    self.evaluate(tf.global_variables_initializer())
+    self.evaluate(run_driver)
+    trajectories = self.evaluate(rb_gather_all)
+
+    self.assertAllEqual([3, 3, 2], self.evaluate(chunk_lengths))
+    self.assertEqual(6, self.evaluate(num_steps_observer.num_steps))
+    self.assertAllEqual(trajectories.step_type, [[0, 1, 2, 0, 1, 2, 0, 1]])
+    self.assertAllEqual(trajectories.observation, [[0, 1, 3, 0, 1, 3, 0, 1]])
+    self.assertAllEqual(trajectories.action, [[1, 2, 1, 1, 2, 1, 1, 2]])
+    self.assertAllEqual(trajectories.next_step_type, [[1, 2, 0, 1, 2, 0, 1, 2]])
+
+  def testSkipBoundaries(self):
+    env = tf_py_environment.TFPyEnvironment(
+        driver_test_utils.PyEnvironmentMock())
+    policy = driver_test_utils.TFPolicyMock(env.time_step_spec(),
+                                            env.action_spec())
+    policy_state = policy.get_initial_state(1)
+    replay_buffer = driver_test_utils.make_replay_buffer(policy)
+    num_episodes_observer = driver_test_utils.NumEpisodesObserver()
+
+    driver = dynamic_step_driver.DynamicStepDriver(
+        env, policy, num_steps=6,
+        observers=[replay_buffer.add_batch, num_episodes_observer],
+        skip_boundaries=True)
+
+    run_driver = driver.run(policy_state=policy_state)
+    rb_gather_all = replay_buffer.gather_all()
+
+    self.evaluate(tf.global_variables_initializer())
+    self.evaluate(run_driver)
+    trajectories = self.evaluate(rb_gather_all)
+
+    # The environment is reset in the step it ends, and every step counts.
+    self.assertEqual(3, self.evaluate(num_episodes_observer.num_episodes))
+    self.assertAllEqual(trajectories.step_type, [[0, 1, 0, 1, 0, 1]])
+    self.assertAllEqual(trajectories.observation, [[0, 1, 0, 1, 0, 1]])
+    self.assertAllEqual(trajectories.action, [[1, 2, 1, 2, 1, 2]])
+    self.assertAllEqual(trajectories.next_step_type, [[1, 2, 1, 2, 1, 2]])
+    self.assertAllEqual(trajectories.reward, [[1., 1., 1., 1., 1., 1.]])
+    self.assertAllEqual(trajectories.discount, [[1., 0., 1., 0., 1., 0.]])
 
 if __name__ == '__main__':
   tf.test.main()
@@ -20,8 +20,12 @@ from __future__ import division
 from __future__ import print_function
 
 import numpy as np
+import tensorflow as tf
 from tf_agents.drivers import driver
 from tf_agents.environments import trajectory
+from tf_agents.utils import nest_utils
+
+nest = tf.contrib.framework.nest
 
 
 class PyDriver(driver.Driver):
@@ -32,33 +36,121 @@ class PyDriver(driver.Driver):
                policy,
                observers,
                max_steps=None,
-               max_episodes=None):
+               max_episodes=None,
+               num_ready_envs=None,
+               num_groups=None,
+               chunk_observers=None,
+               chunk_size=100,
+               skip_boundaries=False):
     """A driver that runs a python policy in a python environment.
 
     Args:
       env: A py_environment.Base environment.
       policy: A py_policy.Base policy.
       observers: A list of observers that are notified after every step
-        in the environment. Each observer is a callable(trajectory.Trajectory).
+        in the environment. Each observer is a callable(trajectory.Trajectory),
+        or callable(trajectory.Trajectory, env_ids) when num_ready_envs or
+        num_groups is set.
       max_steps: Optional maximum number of steps for each run() call.
         Also see below.  Default: 0.
       max_episodes: Optional maximum number of episodes for each run() call.
         At least one of max_steps or max_episodes must be provided. If both
         are set, run() terminates when at least one of the conditions is
         satisfied.  Default: 0.
+      num_ready_envs: Optional number of environments to act on at each step,
+        for a batched environment stepped asynchronously with `send(actions,
+        env_ids)` and `recv(num_envs)`, e.g. a ParallelPyEnvironment. All the
+        environments are kept stepping, and the policy acts on the first
+        num_ready_envs ones done stepping. The rows of the trajectories passed
+        to the observers then belong to different environments, given by
+        env_ids. When the environment resets its environments in its workers,
+        see ParallelPyEnvironment `auto_reset`, the policy acts on their
+        initial time steps right away, and the boundary trajectories are
+        passed to the observers separately.
+      num_groups: Optional number of groups of environments to act on in turn,
+        for a batched environment stepped asynchronously like with
+        num_ready_envs. The environments are split into num_groups groups of
+        consecutive ids, and the policy acts on each group in turn while the
+        environments of the other groups are stepping, so that the policy and
+        the environments run at the same time. The observers are called like
+        with num_ready_envs.
+      chunk_observers: Optional list of observers that are notified once per
+        chunk of chunk_size steps, e.g. the `add_batch` of a replay buffer or
+        py metrics, rather than after every step. Each one is a
+        callable(trajectory.Trajectory) with trajectories of outer dimensions
+        [batch_size, chunk_size], batch_size being 1 for an unbatched
+        environment. The chunks hold all the steps in order, boundaries
+        included. The steps are written in arrays allocated for the whole
+        chunk, and the last chunk of each run() call is passed with the steps
+        taken so far. Chunk observers require stepping synchronously.
+      chunk_size: Number of steps of the chunks passed to chunk_observers.
+      skip_boundaries: Boolean, whether to reset the environments in the same
+        step as they return a terminal LAST time step, with a zero discount,
+        so that the policy acts on their initial time step right away. No
+        boundary trajectories are then passed to the observers after terminal
+        LAST time steps, and every step of the terminated episodes counts
+        towards max_steps. The LAST time steps of truncated episodes, which
+        keep a non-zero discount, are followed by boundary trajectories as
+        usual, so that agents bootstrap from their observation. A batched
+        environment must implement `reset_envs(env_ids)`, e.g. a
+        BatchedPyEnvironment, and must reset its environments in its workers
+        when stepping asynchronously, see ParallelPyEnvironment `auto_reset`.
 
     Raises:
-      ValueError: If both max_steps and max_episodes are None.
+      ValueError: If both max_steps and max_episodes are None, if both
+        num_ready_envs and num_groups are set, if num_groups is greater
+        than the batch size of the environment, if chunk_observers are set
+        when stepping asynchronously, or if skip_boundaries is set with an
+        environment which cannot reset its environments separately.
     """
     max_steps = max_steps or 0
     max_episodes = max_episodes or 0
     if max_steps < 1 and max_episodes < 1:
       raise ValueError(
           'Either `max_steps` or `max_episodes` should be greater than 0.')
+    if num_ready_envs and num_groups:
+      raise ValueError('Only one of `num_ready_envs` and `num_groups` can be '
+                       'set.')
+    if num_groups and num_groups > env.batch_size:
+      raise ValueError('Cannot split {} environments into {} groups.'.format(
+          env.batch_size, num_groups))
+    if chunk_observers and (num_ready_envs or num_groups):
+      raise ValueError('`chunk_observers` require stepping synchronously, '
+                       'without `num_ready_envs` or `num_groups`.')
+    if skip_boundaries:
+      if num_ready_envs or num_groups:
+        if not getattr(env, 'auto_reset', False):
+          raise ValueError('`skip_boundaries` requires an environment with '
+                           '`auto_reset` when stepping asynchronously.')
+      elif env.batched and not hasattr(env, 'reset_envs'):
+        raise ValueError('`skip_boundaries` requires a batched environment '
+                         'with `reset_envs`.')
 
     super(PyDriver, self).__init__(env, policy, observers)
     self._max_steps = max_steps or np.inf
     self._max_episodes = max_episodes or np.inf
+    self._num_ready_envs = num_ready_envs
+    self._groups = None
+    if num_groups:
+      self._groups = np.array_split(np.arange(env.batch_size), num_groups)
+    # Index of the next group to act on.
+    self._next_group = 0
+    self._chunk_observers = chunk_observers or []
+    self._chunk_size = chunk_size
+    self._skip_boundaries = skip_boundaries
+    # Whether the environment overwrites the arrays of its time steps in the
+    # next step, see BatchedPyEnvironment `copy_time_steps`, so that the time
+    # steps kept across steps must be copied.
+    self._copy_time_steps = not getattr(env, 'copy_time_steps', True)
+    # Flat arrays of the chunk being filled, their structure, and the number
+    # of steps written.
+    self._chunk = None
+    self._chunk_structure = None
+    self._chunk_length = 0
+    # Last time step and action step of each environment, while stepping
+    # asynchronously.
+    self._async_time_step = None
+    self._async_action_step = None
 
   def run(self, time_step, policy_state=()):
     """Run policy in environment given initial time_step and policy_state.
@@ -70,20 +162,190 @@ class PyDriver(driver.Driver):
     Returns:
       A tuple (final time_step, final policy_state).
     """
+    if self._num_ready_envs or self._groups:
+      return self._run_async(time_step, policy_state)
+    if self._copy_time_steps:
+      time_step = nest.map_structure(np.array, time_step)
+    if self._skip_boundaries:
+      time_step = self._reset_last(time_step)
     num_steps = 0
     num_episodes = 0
     while num_steps < self._max_steps and num_episodes < self._max_episodes:
       action_step = self.policy.action(time_step, policy_state)
       next_time_step = self.env.step(action_step.action)
+      if self._copy_time_steps:
+        # The next step overwrites the arrays of next_time_step, which the
+        # trajectory and the next iteration keep.
+        next_time_step = nest.map_structure(np.array, next_time_step)
 
       traj = trajectory.from_transition(time_step, action_step, next_time_step)
       for observer in self.observers:
         observer(traj)
+      if self._chunk_observers:
+        self._add_to_chunk(traj)
 
       num_episodes += np.sum(traj.is_last())
+      # Without boundaries, every step counts.
       num_steps += np.sum(~traj.is_boundary())
+      if self._skip_boundaries:
+        next_time_step = self._reset_last(next_time_step)
 
       time_step = next_time_step
       policy_state = action_step.state
 
+    if self._chunk_length:
+      self._flush_chunk()
     return time_step, policy_state
+
+  def _reset_last(self, time_step):
+    """Replaces the terminal LAST time steps by those of the reset environments.
+
+    Args:
+      time_step: Time step of the environment.
+
+    Returns:
+      The time step to act on, with the initial time steps of the environments
+      which returned a LAST time step with a zero discount.
+    """
+    is_terminal = _is_terminal(time_step)
+    if not np.any(is_terminal):
+      return time_step
+    if not self.env.batched:
+      return self.env.reset()
+    reset_ids = np.flatnonzero(is_terminal)
+    reset_time_step = self.env.reset_envs(reset_ids)
+    # Copy, the observers may keep the arrays of the LAST time steps.
+    time_step = nest.map_structure(np.array, time_step)
+    _scatter_rows(time_step, reset_ids, reset_time_step)
+    return time_step
+
+  def _add_to_chunk(self, traj):
+    """Writes a step in the chunk, passing it to the observers once full."""
+    if not self.env.batched:
+      traj = nest_utils.batch_nested_array(traj)
+    flat_traj = [np.asarray(x) for x in nest.flatten(traj)]
+    if self._chunk is None:
+      self._chunk_structure = traj
+      self._chunk = [
+          np.empty((x.shape[0], self._chunk_size) + x.shape[1:], x.dtype)
+          for x in flat_traj]
+    for chunk_array, x in zip(self._chunk, flat_traj):
+      chunk_array[:, self._chunk_length] = x
+    self._chunk_length += 1
+    if self._chunk_length == self._chunk_size:
+      self._flush_chunk()
+
+  def _flush_chunk(self):
+    """Passes the steps of the chunk to the chunk observers."""
+    chunk = nest.pack_sequence_as(
+        self._chunk_structure,
+        [x[:, :self._chunk_length] for x in self._chunk])
+    for observer in self._chunk_observers:
+      observer(chunk)
+    # The arrays may be kept by the observers, the next chunk gets new ones.
+    self._chunk = None
+    self._chunk_length = 0
+
+  def _run_async(self, time_step, policy_state):
+    """Runs the policy on the first environments done stepping, or by group.
+
+    The environments are still stepping when run returns, and the next run
+    continues from there, ignoring its time_step and policy_state.
+
+    Args:
+      time_step: The initial time_step of all the environments.
+      policy_state: The initial policy_state of all the environments.
+
+    Returns:
+      A tuple (time_step, policy_state) of the last ones of all the
+      environments.
+    """
+    if self._async_time_step is None:
+      action_step = self.policy.action(time_step, policy_state)
+      # Copy before sending, the environment may reuse the arrays of its time
+      # steps while stepping.
+      self._async_time_step = nest.map_structure(np.array, time_step)
+      self._async_action_step = nest.map_structure(np.array, action_step)
+      self.env.send(action_step.action, np.arange(self.env.batch_size))
+
+    num_steps = 0
+    num_episodes = 0
+    while num_steps < self._max_steps and num_episodes < self._max_episodes:
+      next_time_step, env_ids = self._recv()
+      time_step, action_step = nest.map_structure(
+          lambda x: x[env_ids],  # pylint: disable=cell-var-from-loop
+          (self._async_time_step, self._async_action_step))
+
+      traj = trajectory.from_transition(time_step, action_step, next_time_step)
+      for observer in self.observers:
+        observer(traj, env_ids)
+
+      num_episodes += np.sum(traj.is_last())
+      num_steps += np.sum(~traj.is_boundary())
+
+      if getattr(self.env, 'auto_reset', False):
+        next_time_step = self._start_reset_episodes(
+            next_time_step, action_step, env_ids)
+
+      next_action_step = self.policy.action(next_time_step, action_step.state)
+      self.env.send(next_action_step.action, env_ids)
+      _scatter_rows(self._async_time_step, env_ids, next_time_step)
+      _scatter_rows(self._async_action_step, env_ids, next_action_step)
+
+    return self._async_time_step, self._async_action_step.state
+
+  def _recv(self):
+    """Returns the time steps and ids of the next environments to act on."""
+    if self._groups is None:
+      return self.env.recv(self._num_ready_envs)
+    env_ids = self._groups[self._next_group]
+    self._next_group = (self._next_group + 1) % len(self._groups)
+    return self.env.recv(env_ids=env_ids)
+
+  def _start_reset_episodes(self, time_step, action_step, env_ids):
+    """Replaces the LAST time steps by those of the reset environments.
+
+    The boundary trajectories from the LAST time steps to the initial ones are
+    passed to the observers, except the ones from terminal LAST time steps
+    when skipping boundaries.
+
+    Args:
+      time_step: Time steps received from the environments env_ids.
+      action_step: Action steps which led to time_step.
+      env_ids: Ids of the environments of each row.
+
+    Returns:
+      The time steps to act on, with the initial time steps of the reset
+      environments.
+    """
+    is_last = time_step.is_last()
+    if not np.any(is_last):
+      return time_step
+    reset_ids = env_ids[is_last]
+    reset_time_step = self.env.pop_reset_time_steps(reset_ids)
+    is_boundary = np.ones_like(reset_ids, dtype=np.bool_)
+    if self._skip_boundaries:
+      is_boundary = ~_is_terminal(time_step)[is_last]
+    if np.any(is_boundary):
+      last_time_step, last_action_step = nest.map_structure(
+          lambda x: x[is_last][is_boundary], (time_step, action_step))
+      traj = trajectory.from_transition(
+          last_time_step, last_action_step,
+          nest.map_structure(lambda x: x[is_boundary], reset_time_step))
+      for observer in self.observers:
+        observer(traj, reset_ids[is_boundary])
+    time_step = nest.map_structure(np.array, time_step)
+    _scatter_rows(time_step, np.flatnonzero(is_last), reset_time_step)
+    return time_step
+
+
+def _is_terminal(time_step):
+  """Returns whether the time steps are LAST ones with a zero discount."""
+  return time_step.is_last() & np.equal(time_step.discount, 0)
+
+
+def _scatter_rows(batch, rows, values):
+  """Writes the rows of nested values in the rows of a nested batch."""
+  def scatter(batch_array, values_array):
+    batch_array[rows] = values_array
+  nest.map_structure(scatter, batch, values)
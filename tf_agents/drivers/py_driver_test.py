@@ -19,6 +19,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import functools
+
 from absl.testing import parameterized
 
 import numpy as np
@@ -26,7 +28,13 @@ import tensorflow as tf
 from tf_agents.drivers import py_driver
 from tf_agents.drivers import test_utils as driver_test_utils
 from tf_agents.environments import batched_py_environment
+from tf_agents.environments import parallel_py_environment
+from tf_agents.environments import time_step as ts
 from tf_agents.environments import trajectory
+from tf_agents.environments import wrappers
+from tf_agents.policies import random_py_policy
+
+nest = tf.contrib.framework.nest
 
 
 class MockReplayBufferObserver(object):
@@ -218,6 +226,225 @@ class PyDriverTest(parameterized.TestCase, tf.test.TestCase):
       for t1_field, t2_field in zip(t1, t2):
         self.assertAllEqual(t1_field, t2_field)
 
+  def testBatchedEnvironmentWithoutCopies(self):
+    trajectories = []
+    for copy_time_steps in [True, False]:
+      env = batched_py_environment.BatchedPyEnvironment(
+          [driver_test_utils.PyEnvironmentMock(final_state=final_state)
+           for final_state in [3, 4]],
+          backend=batched_py_environment.SERIAL,
+          copy_time_steps=copy_time_steps)
+      policy = driver_test_utils.PyPolicyMock(
+          env.time_step_spec(),
+          env.action_spec(),
+          initial_policy_state=np.array([1, 2]))
+      replay_buffer_observer = MockReplayBufferObserver()
+      driver = py_driver.PyDriver(
+          env, policy, observers=[replay_buffer_observer], max_steps=4)
+      driver.run(env.reset(), policy.get_initial_state())
+      trajectories.append(replay_buffer_observer.gather_all())
+
+    # The environment overwrites its time steps when stepping, the driver
+    # copies them.
+    self.assertAllEqual([0, 0], trajectories[1][0].step_type)
+    self.assertEqual(len(trajectories[0]), len(trajectories[1]))
+    nest.map_structure(self.assertAllEqual, trajectories[0], trajectories[1])
+
+  @parameterized.named_parameters(
+      [('Batched', True),
+       ('Unbatched', False),
+      ])
+  def testChunkObservers(self, batched):
+    env = driver_test_utils.PyEnvironmentMock(final_state=3)
+    initial_policy_state = np.int32(2)
+    if batched:
+      env = batched_py_environment.BatchedPyEnvironment(
+          [env, driver_test_utils.PyEnvironmentMock(final_state=4)])
+      initial_policy_state = np.array([1, 2], np.int32)
+    policy = driver_test_utils.PyPolicyMock(
+        env.time_step_spec(), env.action_spec(),
+        initial_policy_state=initial_policy_state)
+    replay_buffer_observer = MockReplayBufferObserver()
+    chunk_observer = MockReplayBufferObserver()
+    driver = py_driver.PyDriver(
+        env,
+        policy,
+        observers=[replay_buffer_observer],
+        max_steps=7,
+        chunk_observers=[chunk_observer],
+        chunk_size=3)
+    time_step = env.reset()
+    policy_state = policy.get_initial_state()
+    expected_lengths = []
+    for _ in range(2):
+      num_trajectories = len(replay_buffer_observer.gather_all())
+      time_step, policy_state = driver.run(time_step, policy_state)
+      # Each run passes full chunks, then its last steps in a partial chunk.
+      num_steps = len(replay_buffer_observer.gather_all()) - num_trajectories
+      expected_lengths += [3] * (num_steps // 3)
+      if num_steps % 3:
+        expected_lengths.append(num_steps % 3)
+
+    trajectories = replay_buffer_observer.gather_all()
+    chunks = chunk_observer.gather_all()
+    self.assertEqual(expected_lengths,
+                     [chunk.step_type.shape[1] for chunk in chunks])
+    if not batched:
+      trajectories = [nest.map_structure(lambda x: np.reshape(x, [1]), traj)
+                      for traj in trajectories]
+    expected = nest.map_structure(lambda *x: np.stack(x, axis=1),
+                                  *trajectories)
+    chunks = nest.map_structure(lambda *x: np.concatenate(x, axis=1), *chunks)
+    nest.map_structure(self.assertAllEqual, expected, chunks)
+
+  def testChunkObserversRequireSynchronousStepping(self):
+    env = batched_py_environment.BatchedPyEnvironment(
+        [driver_test_utils.PyEnvironmentMock()])
+    policy = random_py_policy.RandomPyPolicy(env.time_step_spec(),
+                                             env.action_spec())
+    with self.assertRaises(ValueError):
+      py_driver.PyDriver(env, policy, [], max_steps=1, num_ready_envs=1,
+                         chunk_observers=[lambda traj: None])
+
+  def testSkipBoundaries(self):
+    env = driver_test_utils.PyEnvironmentMock()
+    policy = driver_test_utils.PyPolicyMock(env.time_step_spec(),
+                                            env.action_spec())
+    replay_buffer_observer = MockReplayBufferObserver()
+    driver = py_driver.PyDriver(
+        env,
+        policy,
+        observers=[replay_buffer_observer],
+        max_steps=4,
+        skip_boundaries=True)
+
+    driver.run(env.reset(), policy.get_initial_state())
+    # The environment is reset in the step it ends, and every step counts.
+    trajectories = replay_buffer_observer.gather_all()
+    self.assertEqual([self._trajectories[i] for i in [0, 1, 3, 4]],
+                     trajectories)
+
+  def testSkipBoundariesTruncatedEpisodes(self):
+    env = wrappers.TimeLimit(
+        driver_test_utils.PyEnvironmentMock(final_state=10), duration=2)
+    policy = driver_test_utils.PyPolicyMock(env.time_step_spec(),
+                                            env.action_spec())
+    replay_buffer_observer = MockReplayBufferObserver()
+    driver = py_driver.PyDriver(
+        env,
+        policy,
+        observers=[replay_buffer_observer],
+        max_steps=4,
+        skip_boundaries=True)
+
+    driver.run(env.reset(), policy.get_initial_state())
+    # The LAST time step of a truncated episode keeps its discount, and is
+    # followed by a boundary trajectory to bootstrap from its observation.
+    trajectories = replay_buffer_observer.gather_all()
+    self.assertEqual([ts.StepType.FIRST, ts.StepType.MID, ts.StepType.LAST,
+                      ts.StepType.FIRST, ts.StepType.MID],
+                     [traj.step_type for traj in trajectories])
+    self.assertEqual([1.] * 5, [traj.discount for traj in trajectories])
+    self.assertEqual(3, trajectories[2].observation)
+
+  def testSkipBoundariesBatchedEnvironment(self):
+    env = batched_py_environment.BatchedPyEnvironment([
+        driver_test_utils.PyEnvironmentMock(final_state=final_state)
+        for final_state in [3, 4]])
+    policy = random_py_policy.RandomPyPolicy(env.time_step_spec(),
+                                             env.action_spec(), seed=0)
+    chunks = []
+    driver = py_driver.PyDriver(
+        env, policy, observers=[], max_steps=20, chunk_observers=[
+            chunks.append], chunk_size=10, skip_boundaries=True)
+
+    driver.run(env.reset())
+    self.assertEqual(1, len(chunks))
+    chunk = chunks[0]
+    self.assertFalse(np.any(chunk.is_boundary()))
+    # Each LAST step is followed by the initial step of a new episode.
+    after_last = chunk.next_step_type[:, :-1] == ts.StepType.LAST
+    self.assertTrue(np.any(after_last))
+    self.assertAllEqual(after_last,
+                        chunk.step_type[:, 1:] == ts.StepType.FIRST)
+    self.assertAllEqual(np.zeros(np.sum(after_last)),
+                        chunk.observation[:, 1:][after_last])
+
+  def testSkipBoundariesRequiresAutoResetWhenAsync(self):
+    env = parallel_py_environment.ParallelPyEnvironment(
+        [driver_test_utils.PyEnvironmentMock] * 2)
+    policy = random_py_policy.RandomPyPolicy(env.time_step_spec(),
+                                             env.action_spec())
+    with self.assertRaises(ValueError):
+      py_driver.PyDriver(env, policy, [], max_steps=1, num_ready_envs=1,
+                         skip_boundaries=True)
+    env.close()
+
+  def _assertAsyncTrajectoriesChain(self, auto_reset, **driver_kwargs):
+    num_envs = 4
+    env = parallel_py_environment.ParallelPyEnvironment([
+        functools.partial(driver_test_utils.PyEnvironmentMock,
+                          final_state=final_state)
+        for final_state in range(3, 3 + num_envs)], auto_reset=auto_reset)
+    policy = random_py_policy.RandomPyPolicy(env.time_step_spec(),
+                                             env.action_spec(), seed=0)
+    observed = []
+    driver = py_driver.PyDriver(
+        env,
+        policy,
+        observers=[lambda traj, env_ids: observed.append((traj, env_ids))],
+        max_steps=20,
+        **driver_kwargs)
+    time_step = env.reset()
+    for _ in range(3):
+      time_step, _ = driver.run(time_step)
+    env.close()
+
+    self.assertGreaterEqual(len(observed), 30)
+    for env_id in range(num_envs):
+      # Gather the trajectory of each environment, in order.
+      steps = [nest.map_structure(lambda x: x[env_ids == env_id], traj)  # pylint: disable=cell-var-from-loop
+               for traj, env_ids in observed]
+      env_traj = nest.map_structure(lambda *x: np.concatenate(x), *steps)
+      self.assertAllEqual(env_traj.next_step_type[:-1],
+                          env_traj.step_type[1:])
+      # The mock environment adds the action to its state, until it restarts.
+      expected_observation = np.where(
+          env_traj.step_type[:-1] == ts.StepType.LAST, 0,
+          env_traj.observation[:-1] + env_traj.action[:-1])
+      self.assertAllEqual(expected_observation, env_traj.observation[1:])
+    return observed
+
+  def testAsyncParallelEnvironment(self):
+    self._assertAsyncTrajectoriesChain(auto_reset=False, num_ready_envs=2)
+
+  def testAsyncParallelEnvironmentAutoReset(self):
+    self._assertAsyncTrajectoriesChain(auto_reset=True, num_ready_envs=2)
+
+  @parameterized.named_parameters(
+      [('NoAutoReset', False),
+       ('AutoReset', True),
+      ])
+  def testGroupsParallelEnvironment(self, auto_reset):
+    observed = self._assertAsyncTrajectoriesChain(auto_reset=auto_reset,
+                                                  num_groups=2)
+    # The groups are acted on in turn.
+    groups = [env_ids.tolist() for traj, env_ids in observed
+              if not auto_reset or not np.all(traj.is_boundary())]
+    self.assertEqual([[0, 1], [2, 3]] * (len(groups) // 2),
+                     groups[:len(groups) // 2 * 2])
+
+  def testGroupsRequireAsyncEnvironmentSize(self):
+    env = batched_py_environment.BatchedPyEnvironment(
+        [driver_test_utils.PyEnvironmentMock()])
+    policy = random_py_policy.RandomPyPolicy(env.time_step_spec(),
+                                             env.action_spec())
+    with self.assertRaises(ValueError):
+      py_driver.PyDriver(env, policy, [], max_steps=1, num_groups=2)
+    with self.assertRaises(ValueError):
+      py_driver.PyDriver(env, policy, [], max_steps=1, num_groups=1,
+                         num_ready_envs=1)
+
 
 if __name__ == '__main__':
   tf.test.main()
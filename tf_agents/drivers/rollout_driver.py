@@ -0,0 +1,142 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A Driver stepping a TFPyEnvironment several steps per call into Python."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+from tf_agents.drivers import driver
+from tf_agents.environments import tf_py_environment
+import gin.tf
+
+nest = tf.contrib.framework.nest
+
+
+@gin.configurable
+class RolloutDriver(driver.Driver):
+  """A driver taking N steps in a TFPyEnvironment with a Python policy.
+
+  Like DynamicStepDriver, it runs a tf.while_loop until num_steps steps which
+  are not episode boundaries were taken, but each iteration takes
+  steps_per_call steps with `TFPyEnvironment.rollout`, the policy and the
+  environment running together in a single `py_func`. The observers are called
+  once per iteration with trajectories of outer dimensions [batch_size,
+  steps_per_call], e.g. `TFUniformReplayBuffer.add_batch` to write them in one
+  op.
+
+  Since the steps are taken by steps_per_call, more than num_steps steps may be
+  taken.
+  """
+
+  def __init__(self,
+               env,
+               policy,
+               observers=None,
+               num_steps=1,
+               steps_per_call=10):
+    """Creates a RolloutDriver.
+
+    Args:
+      env: A tf_py_environment.TFPyEnvironment environment.
+      policy: A py_policy.Base policy acting on the batched time steps of the
+        Python environment of env.
+      observers: A list of observers that are updated after every
+        steps_per_call steps in the environment. Each observer is a
+        callable(trajectory.Trajectory), with trajectories of outer dimensions
+        [batch_size, steps_per_call].
+      num_steps: The number of steps to take in the environment.
+      steps_per_call: The number of steps taken by each call into Python.
+
+    Raises:
+      TypeError: If env is not a TFPyEnvironment.
+    """
+    if not isinstance(env, tf_py_environment.TFPyEnvironment):
+      raise TypeError('RolloutDriver requires a TFPyEnvironment, got '
+                      '{}.'.format(type(env).__name__))
+    super(RolloutDriver, self).__init__(env, policy, observers)
+    self._num_steps = num_steps
+    self._steps_per_call = steps_per_call
+
+  def _loop_condition_fn(self):
+    """Returns a function with the condition needed for tf.while_loop."""
+    def loop_cond(counter, *_):
+      return tf.less(counter, self._num_steps)
+
+    return loop_cond
+
+  def _loop_body_fn(self):
+    """Returns a function with the driver's loop body ops."""
+    def loop_body(counter, time_step, policy_state):
+      """Takes steps_per_call steps in the environment.
+
+      Args:
+        counter: Number of steps taken so far, shape [].
+        time_step: TimeStep tuple with elements shape [batch_size, ...].
+        policy_state: Policy state with elements shape [batch_size, ...].
+      Returns:
+        loop_vars for next iteration of tf.while_loop.
+      """
+      # The TFPyEnvironment steps from its current time step, the dependency
+      # only orders the calls into Python.
+      with tf.control_dependencies(nest.flatten(time_step)):
+        traj, time_step, policy_state = self.env.rollout(
+            self.policy, self._steps_per_call, policy_state)
+      observer_ops = [observer(traj) for observer in self._observers]
+      with tf.control_dependencies([tf.group(observer_ops)]):
+        time_step, policy_state = nest.map_structure(
+            tf.identity, (time_step, policy_state))
+
+      # The counter is not incremented for episode reset steps.
+      counter += tf.reduce_sum(tf.to_int32(~traj.is_boundary()))
+
+      return [counter, time_step, policy_state]
+
+    return loop_body
+
+  def run(self, policy_state=None, maximum_iterations=None):
+    """Takes steps in the environment using the policy while updating observers.
+
+    Args:
+      policy_state: Optional initial state of the policy, with a batch
+        dimension. By default the initial state of the Python policy.
+      maximum_iterations: Optional maximum number of iterations of the while
+        loop to run, each taking steps_per_call steps.
+
+    Returns:
+      time_step: TimeStep named tuple with final observation, reward, etc.
+      policy_state: Tensor with final step policy state.
+    """
+    time_step = self.env.current_time_step()
+    if policy_state is None:
+      policy_state = nest.map_structure(
+          tf.convert_to_tensor,
+          self.policy.get_initial_state(self.env.batch_size))
+
+    [_, time_step, policy_state] = tf.while_loop(
+        cond=self._loop_condition_fn(),
+        body=self._loop_body_fn(),
+        loop_vars=[
+            tf.constant(0, tf.int32),
+            time_step,
+            policy_state],
+        back_prop=False,
+        parallel_iterations=1,
+        maximum_iterations=maximum_iterations,
+        name='driver_loop'
+    )
+    return time_step, policy_state
@@ -0,0 +1,92 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for tf_agents.drivers.rollout_driver."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+from tf_agents.drivers import rollout_driver
+from tf_agents.drivers import test_utils as driver_test_utils
+from tf_agents.environments import batched_py_environment
+from tf_agents.environments import tf_py_environment
+from tf_agents.environments import time_step as ts
+from tf_agents.replay_buffers import tf_uniform_replay_buffer
+from tf_agents.specs import tensor_spec
+
+nest = tf.contrib.framework.nest
+
+
+class RolloutDriverTest(tf.test.TestCase):
+
+  def _make_env_and_policy(self, batch_size):
+    py_env = batched_py_environment.BatchedPyEnvironment(
+        [driver_test_utils.PyEnvironmentMock() for _ in range(batch_size)])
+    env = tf_py_environment.TFPyEnvironment(py_env)
+    policy = driver_test_utils.PyPolicyMock(
+        ts.time_step_spec(py_env.observation_spec()), py_env.action_spec(),
+        initial_policy_state=np.full([batch_size], 2, np.int32))
+    return env, policy
+
+  def testRunUpdatesObservers(self):
+    env, policy = self._make_env_and_policy(batch_size=1)
+    num_steps_observer = driver_test_utils.NumStepsObserver()
+    driver = rollout_driver.RolloutDriver(
+        env, policy, observers=[num_steps_observer], num_steps=5,
+        steps_per_call=2)
+    run_driver = driver.run()
+
+    self.evaluate(tf.global_variables_initializer())
+    self.evaluate(run_driver)
+    num_steps = self.evaluate(num_steps_observer.num_steps)
+    self.assertGreaterEqual(num_steps, 5)
+    self.assertLess(num_steps, 7)
+
+  def testReplayBufferObserver(self):
+    env, policy = self._make_env_and_policy(batch_size=2)
+    replay_buffer = tf_uniform_replay_buffer.TFUniformReplayBuffer(
+        tensor_spec.from_spec(policy.trajectory_spec()), batch_size=2,
+        max_length=20)
+    driver = rollout_driver.RolloutDriver(
+        env, policy, observers=[replay_buffer.add_batch], num_steps=8,
+        steps_per_call=4)
+    run_driver = driver.run()
+    traj = replay_buffer.gather_all()
+
+    self.evaluate(tf.global_variables_initializer())
+    self.evaluate(run_driver)
+    traj = self.evaluate(traj)
+    num_items = traj.step_type.shape[1]
+    self.assertEqual(0, num_items % 4)
+    # The trajectories of each environment chain from one step to the next.
+    self.assertAllEqual(traj.next_step_type[:, :-1], traj.step_type[:, 1:])
+    self.assertEqual(ts.StepType.FIRST, traj.step_type[0, 0])
+    # The policy alternates actions 1 and 2 from the start of each episode.
+    is_first = traj.step_type == ts.StepType.FIRST
+    self.assertAllEqual(np.ones_like(traj.action[is_first]),
+                        traj.action[is_first])
+
+  def testRequiresTFPyEnvironment(self):
+    env, policy = self._make_env_and_policy(batch_size=1)
+    with self.assertRaises(TypeError):
+      rollout_driver.RolloutDriver(env.pyenv, policy)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -156,8 +156,9 @@ class PyPolicyMock(py_policy.Base):
                                                maximum=2,
                                                name='policy_state_spec')
     self._initial_policy_state = initial_policy_state
+    info_spec = action_spec
     super(PyPolicyMock, self).__init__(time_step_spec, action_spec,
-                                       policy_state_spec)
+                                       policy_state_spec, info_spec)
 
   def _get_initial_state(self, batch_size=None):
     return self._initial_policy_state
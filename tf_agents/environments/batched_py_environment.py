@@ -25,6 +25,9 @@ from __future__ import print_function
 #   https://docs.python.org/2/library/multiprocessing.html#module-multiprocessing.dummy
 from multiprocessing import dummy as mp_threads
 # pylint: enable=line-too-long
+import functools
+import multiprocessing
+import time
 
 import numpy as np
 
@@ -34,6 +37,29 @@ import gin.tf
 
 nest = tf.contrib.framework.nest
 
+# Execution backends stepping the environments:
+# Steps the environments one after another, the lowest overhead for cheap
+# environments.
+SERIAL = 'serial'
+# Steps the environments in a thread pool, for environments releasing the GIL.
+THREADS = 'threads'
+# Steps the environments in persistent worker processes, which write the
+# batched time steps in shared memory, for expensive pure Python environments.
+PROCESSES = 'processes'
+# Picks SERIAL or THREADS from the timings of the first steps. PROCESSES is
+# only recommended in the logs, as the worker processes must be forked before
+# the environments are stepped and TF starts its threads.
+AUTO = 'auto'
+BACKENDS = (SERIAL, THREADS, PROCESSES, AUTO)
+
+# Number of steps timed with each of the serial and threads backends.
+_CALIBRATION_STEPS = 10
+# Threads must step this much faster than serial to be picked.
+_MIN_THREADS_SPEEDUP = 1.25
+# Processes are recommended when an environment step takes longer than this,
+# in seconds, so that it outweighs the communication with the process.
+_MIN_PROCESSES_ENV_STEP_TIME = 5e-4
+
 
 @gin.configurable
 class BatchedPyEnvironment(py_environment.Base):
@@ -41,9 +67,14 @@ class BatchedPyEnvironment(py_environment.Base):
 
   The environments should only access shared python variables using
   shared mutex locks (from the threading module).
+
+  The environments are stepped by one of the execution `BACKENDS`. With
+  PROCESSES, each worker process steps a copy of some of the environments
+  forked from this process, so that `envs` are no longer updated.
   """
 
-  def __init__(self, envs):
+  def __init__(self, envs, backend=THREADS, num_processes=None,
+               copy_time_steps=True):
     """Batch together multiple (non-batched) py environments.
 
     The environments can be different but must use the same action and
@@ -51,12 +82,27 @@ class BatchedPyEnvironment(py_environment.Base):
 
     Args:
       envs: List python environments (must be non-batched).
+      backend: One of `BACKENDS`, how the environments are stepped. With AUTO,
+        the first steps are timed with SERIAL and THREADS, and then the
+        fastest one is used. PROCESSES is never picked, but it is recommended
+        in the logs when neither steps the environments in parallel and they
+        are slow enough.
+      num_processes: Number of worker processes of the PROCESSES backend,
+        defaults to the number of cores.
+      copy_time_steps: Boolean, whether `reset` and `step` return copies of
+        the batched time_steps. If False, they return the batch arrays they
+        fill, which are overwritten by the next call, so callers keeping a
+        time_step across calls must copy it. PyDriver does so.
 
     Raises:
       ValueError: If envs is not a list or tuple, or is zero length, or if
         one of the envs is already batched.
-      ValueError: If the action or observation specs don't match.
+      ValueError: If the action or observation specs don't match, or if the
+        backend is unknown.
     """
+    if backend not in BACKENDS:
+      raise ValueError(
+          "backend must be one of %s, got %s." % (BACKENDS, backend))
     if not isinstance(envs, (list, tuple)):
       raise ValueError("envs must be a list or tuple.  Got: %s" % envs)
     batched_envs = [(i, env) for i, env in enumerate(envs) if env.batched]
@@ -76,8 +122,25 @@ class BatchedPyEnvironment(py_environment.Base):
       raise ValueError(
           "All environments must have the same time_step_spec.  Saw: %s" %
           [env.time_step_spec() for env in self._envs])
+    self._backend = backend
+    self._copy_time_steps = copy_time_steps
+    # Batch arrays of the time steps, filled in place when they are returned
+    # without copies.
+    self._batch_time_step = None
+    if not copy_time_steps:
+      self._batch_time_step = allocate_batch(self._time_step_spec,
+                                             self._num_envs)
+    self._num_processes = num_processes or multiprocessing.cpu_count()
     # Create a multiprocessing threadpool for execution.
-    self._pool = mp_threads.Pool(self._num_envs)
+    self._pool = None
+    if backend in (THREADS, AUTO):
+      self._pool = mp_threads.Pool(self._num_envs)
+    # ParallelPyEnvironment of the PROCESSES backend.
+    self._parallel_env = None
+    if backend == PROCESSES:
+      self._start_processes()
+    # Step times of the SERIAL and THREADS backends while calibrating.
+    self._step_times = {SERIAL: [], THREADS: []}
 
   @property
   def batched(self):
@@ -91,6 +154,16 @@ class BatchedPyEnvironment(py_environment.Base):
   def envs(self):
     return self._envs
 
+  @property
+  def backend(self):
+    """The backend stepping the environments, AUTO while calibrating."""
+    return self._backend
+
+  @property
+  def copy_time_steps(self):
+    """Whether `reset` and `step` return copies of the batch arrays."""
+    return self._copy_time_steps
+
   def observation_spec(self):
     return self._observation_spec
 
@@ -106,7 +179,24 @@ class BatchedPyEnvironment(py_environment.Base):
     Returns:
       Time step with batch dimension.
     """
-    time_steps = self._pool.map(lambda env: env.reset(), self._envs)
+    if self._parallel_env is not None:
+      return self._parallel_env.reset()
+    time_steps = self._map(lambda env: env.reset(), self._envs)
+    return self._stack_time_steps(time_steps)
+
+  def reset_envs(self, env_ids):
+    """Resets some of the environments, e.g. the ones which returned LAST.
+
+    Args:
+      env_ids: Ids of the environments to reset, in [0, batch_size).
+
+    Returns:
+      The batched initial time steps of the environments, in new arrays.
+    """
+    if self._parallel_env is not None:
+      return self._parallel_env.reset_envs(env_ids)
+    time_steps = self._map(lambda env_id: self._envs[env_id].reset(),
+                           env_ids)
     return stack_time_steps(time_steps)
 
   def step(self, actions):
@@ -126,26 +216,124 @@ class BatchedPyEnvironment(py_environment.Base):
       raise ValueError(
           "Primary dimension of action items does not match "
           "batch size: %d vs. %d" % (len(unstacked_actions), self.batch_size))
-    time_steps = self._pool.map(
+    if self._parallel_env is not None:
+      return self._parallel_env.step(actions)
+    if self._backend != AUTO:
+      time_steps = self._map(
+          lambda env_action: env_action[0].step(env_action[1]),
+          zip(self._envs, unstacked_actions))
+      return self._stack_time_steps(time_steps)
+
+    # Time the steps of each backend, serial first.
+    if len(self._step_times[SERIAL]) < _CALIBRATION_STEPS:
+      backend = SERIAL
+    else:
+      backend = THREADS
+    start_time = time.time()
+    time_steps = self._map(
         lambda env_action: env_action[0].step(env_action[1]),
-        zip(self._envs, unstacked_actions))
-    return stack_time_steps(time_steps)
+        zip(self._envs, unstacked_actions), backend)
+    self._step_times[backend].append(time.time() - start_time)
+    if len(self._step_times[THREADS]) == _CALIBRATION_STEPS:
+      self._select_backend()
+    return self._stack_time_steps(time_steps)
 
   def close(self):
     """Send close messages to the external process and join them."""
-    self._pool.map(lambda env: env.close(), self._envs)
-    self._pool.close()
-    self._pool.join()
+    if self._parallel_env is not None:
+      self._parallel_env.close()
+    else:
+      self._map(lambda env: env.close(), self._envs)
+    if self._pool is not None:
+      self._pool.close()
+      self._pool.join()
+
+  def _map(self, fn, iterable, backend=None):
+    """Maps fn over iterable, in the thread pool for the THREADS backend."""
+    backend = backend or self._backend
+    if backend in (THREADS, AUTO):
+      return self._pool.map(fn, iterable)
+    return [fn(x) for x in iterable]
+
+  def _select_backend(self):
+    """Selects the backend from the step times of the calibration."""
+    # The median is robust to the first, slower steps.
+    serial_time = np.median(self._step_times[SERIAL])
+    threads_time = np.median(self._step_times[THREADS])
+    if serial_time > _MIN_THREADS_SPEEDUP * threads_time:
+      self._backend = THREADS
+    else:
+      self._backend = SERIAL
+    tf.logging.info(
+        "BatchedPyEnvironment steps took %.3g ms serially and %.3g ms with "
+        "threads, using the %s backend.", 1000 * serial_time,
+        1000 * threads_time, self._backend)
+    if (self._backend == SERIAL and
+        serial_time / self._num_envs > _MIN_PROCESSES_ENV_STEP_TIME and
+        self._num_envs > 1 and self._num_processes > 1):
+      tf.logging.info(
+          "BatchedPyEnvironment steps are slow enough for the %s backend, "
+          "which is recommended for these environments.", PROCESSES)
+    if self._backend != THREADS:
+      self._pool.close()
+      self._pool.join()
+      self._pool = None
+
+  def _start_processes(self):
+    """Forks worker processes stepping the environments in shared memory."""
+    # Imported here as parallel_py_environment imports this module.
+    from tf_agents.environments import parallel_py_environment  # pylint: disable=g-import-not-at-top
+    num_processes = min(self._num_processes, self._num_envs)
+    envs_per_worker = -(-self._num_envs // num_processes)
+    # The environments are copied into the workers when they are forked.
+    start_method = "fork" if hasattr(multiprocessing, "get_context") else None
+    self._parallel_env = parallel_py_environment.ParallelPyEnvironment(
+        [functools.partial(_identity, env) for env in self._envs],
+        envs_per_worker=envs_per_worker, shared_memory=True,
+        start_method=start_method, copy_time_steps=self._copy_time_steps)
+
+  def _stack_time_steps(self, time_steps):
+    """Stacks the time steps in new arrays, or in the batch arrays."""
+    return stack_time_steps(time_steps, out=self._batch_time_step)
+
+
+def _identity(x):
+  return x
 
 
 # TODO(ebrevdo,sguada): Factor these helper functions out into common utils.
-def stack_time_steps(time_steps):
-  """Given a list of TimeStep, combine to one with a batch dimension."""
-  return fast_map_structure(lambda *arrays: np.stack(arrays), *time_steps)
+def allocate_batch(spec, batch_size):
+  """Returns a nest of uninitialized arrays of spec with a batch dimension."""
+  return nest.map_structure(
+      lambda s: np.empty((batch_size,) + tuple(s.shape), s.dtype), spec)
+
+
+def stack_time_steps(time_steps, out=None):
+  """Given a list of TimeStep, combine to one with a batch dimension.
+
+  Args:
+    time_steps: List of TimeStep.
+    out: Optional nest of batch arrays, e.g. from `allocate_batch`, to write the
+      time steps in rather than allocating new arrays.
+
+  Returns:
+    The batched TimeStep, out if given.
+  """
+  if out is None:
+    return fast_map_structure(lambda *arrays: np.stack(arrays), *time_steps)
+  flat_time_steps = [nest.flatten(time_step) for time_step in time_steps]
+  for array, arrays in zip(nest.flatten(out), zip(*flat_time_steps)):
+    np.stack(arrays, out=array)
+  return out
 
 
 def unstack_actions(batched_actions):
-  """Returns a list of actions from potentially nested batch of actions."""
+  """Returns a list of actions from potentially nested batch of actions.
+
+  The actions are views of the rows of the batched arrays, not copies.
+  """
+  if not nest.is_sequence(batched_actions):
+    return list(batched_actions)
   flattened_actions = nest.flatten(batched_actions)
   unstacked_actions = [
       nest.pack_sequence_as(batched_actions, actions)
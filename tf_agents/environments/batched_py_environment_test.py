@@ -86,6 +86,77 @@ class BatchedPyEnvironmentTest(tf.test.TestCase):
                         time_step2.observation.shape)
     env.close()
 
+  def _assert_same_time_steps(self, num_envs=5, num_steps=25, **kwargs):
+    """Checks that an environment created with kwargs matches the serial one."""
+    # Each environment has its own seed, so their observations differ.
+    def make_envs():
+      return [random_py_environment.RandomPyEnvironment(
+          self.observation_spec, self.action_spec, seed=seed)
+              for seed in range(num_envs)]
+    env = batched_py_environment.BatchedPyEnvironment(
+        make_envs(), backend=batched_py_environment.SERIAL)
+    other_env = batched_py_environment.BatchedPyEnvironment(
+        make_envs(), **kwargs)
+    rng = np.random.RandomState()
+
+    tf.contrib.framework.nest.map_structure(
+        self.assertAllEqual, env.reset(), other_env.reset())
+    for _ in range(num_steps):
+      action = np.array([array_spec.sample_bounded_spec(self.action_spec, rng)
+                         for _ in range(num_envs)])
+      tf.contrib.framework.nest.map_structure(
+          self.assertAllEqual, env.step(action), other_env.step(action))
+    env.close()
+    other_env.close()
+    return other_env
+
+  def test_step_threads(self):
+    self._assert_same_time_steps(backend=batched_py_environment.THREADS)
+
+  def test_step_processes(self):
+    self._assert_same_time_steps(backend=batched_py_environment.PROCESSES,
+                                 num_processes=2)
+
+  def test_step_auto(self):
+    env = self._assert_same_time_steps(backend=batched_py_environment.AUTO)
+    self.assertIn(env.backend, [batched_py_environment.SERIAL,
+                                batched_py_environment.THREADS])
+
+  def test_auto_does_not_start_processes(self):
+    envs = [random_py_environment.RandomPyEnvironment(
+        self.observation_spec, self.action_spec) for _ in range(2)]
+    env = batched_py_environment.BatchedPyEnvironment(
+        envs, backend=batched_py_environment.AUTO, num_processes=2)
+    # Slow steps which threads do not speed up.
+    env._step_times = {batched_py_environment.SERIAL: [1.],
+                       batched_py_environment.THREADS: [1.]}
+    env._select_backend()
+    self.assertEqual(batched_py_environment.SERIAL, env.backend)
+    self.assertIsNone(env._parallel_env)
+    env.close()
+
+  def test_no_copy(self):
+    env = self._assert_same_time_steps(
+        backend=batched_py_environment.SERIAL, copy_time_steps=False)
+    self.assertIs(env.reset().observation, env.step(
+        np.zeros((5, 7), np.float32)).observation)
+
+  def test_stack_time_steps_out(self):
+    time_step_spec = ts.time_step_spec(self.observation_spec)
+    out = batched_py_environment.allocate_batch(time_step_spec, 2)
+    time_steps = [ts.restart(np.full((3, 3), i, np.float32)) for i in range(2)]
+    time_step = batched_py_environment.stack_time_steps(time_steps, out=out)
+    self.assertIs(out, time_step)
+    tf.contrib.framework.nest.map_structure(
+        self.assertAllEqual,
+        batched_py_environment.stack_time_steps(time_steps), time_step)
+
+  def test_unknown_backend(self):
+    with self.assertRaises(ValueError):
+      batched_py_environment.BatchedPyEnvironment(
+          [random_py_environment.RandomPyEnvironment(self.observation_spec)],
+          backend='gpu')
+
   def test_unstack_actions(self):
     num_envs = 5
     action_spec = self.action_spec
@@ -99,6 +170,8 @@ class BatchedPyEnvironmentTest(tf.test.TestCase):
     unstacked_actions = batched_py_environment.unstack_actions(batched_action)
     for action in unstacked_actions:
       self.assertAllEqual(action_spec.shape, action.shape)
+      # The actions are views of the batch.
+      self.assertIs(batched_action, action.base)
 
   def test_unstack_nested_actions(self):
     num_envs = 5
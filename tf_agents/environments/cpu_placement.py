@@ -0,0 +1,192 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Placement of environment worker processes and the learner on CPU cores.
+
+Pinning the workers of a ParallelPyEnvironment, and keeping the learner on
+other cores, avoids their competing for the same cores and caches:
+
+```python
+placement = cpu_placement.CpuPlacement(num_learner_cpus=8)
+env = parallel_py_environment.ParallelPyEnvironment(
+    env_constructors, cpu_placement=placement)
+placement.pin_learner()
+with tf.Session(config=placement.session_config()) as sess:
+  ...
+```
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import glob
+import multiprocessing
+import os
+import re
+
+import tensorflow as tf
+import gin.tf
+
+# Each worker is pinned to a single core, the cores being taken in turn from
+# each NUMA node.
+ROUND_ROBIN = 'round_robin'
+# Each worker is pinned to all the worker cores of a NUMA node, the nodes being
+# taken in turn, so that the workers and their memory stay on one node.
+NUMA_NODES = 'numa_nodes'
+MODES = (ROUND_ROBIN, NUMA_NODES)
+
+_NUMA_NODES_GLOB = '/sys/devices/system/node/node[0-9]*/cpulist'
+
+
+def available_cpus():
+  """Returns the sorted ids of the cores the current process may run on."""
+  if hasattr(os, 'sched_getaffinity'):
+    return sorted(os.sched_getaffinity(0))
+  return list(range(multiprocessing.cpu_count()))
+
+
+def parse_cpu_list(cpu_list):
+  """Parses a Linux cpu list such as '0-3,8,10-11' into a list of ids."""
+  cpus = []
+  for cpu_range in cpu_list.strip().split(','):
+    if not cpu_range:
+      continue
+    first, _, last = cpu_range.partition('-')
+    cpus.extend(range(int(first), int(last or first) + 1))
+  return cpus
+
+
+def numa_nodes():
+  """Returns the sorted core ids of each NUMA node, a single node if unknown."""
+  paths = glob.glob(_NUMA_NODES_GLOB)
+  # Sort node9 before node10.
+  paths.sort(key=lambda path: int(re.search(r'node(\d+)', path).group(1)))
+  nodes = []
+  for path in paths:
+    with open(path) as f:
+      cpus = parse_cpu_list(f.read())
+    if cpus:
+      nodes.append(sorted(cpus))
+  return nodes or [available_cpus()]
+
+
+@gin.configurable
+class CpuPlacement(object):
+  """Assigns cores to environment workers, reserving some for the learner."""
+
+  def __init__(self, mode=ROUND_ROBIN, num_learner_cpus=0, cpus=None,
+               nodes=None):
+    """Creates a placement of the workers and the learner.
+
+    Args:
+      mode: How the workers are pinned, ROUND_ROBIN or NUMA_NODES.
+      num_learner_cpus: Number of cores reserved for the learner, taken from
+        the first NUMA node first. The workers get the other cores.
+      cpus: Optional list of the cores to place on. Defaults to the cores the
+        current process may run on.
+      nodes: Optional list of the lists of cores of each NUMA node. Defaults to
+        the nodes of the machine.
+
+    Raises:
+      ValueError: If the mode is unknown, if no core is left for the workers,
+        or if the platform cannot pin processes to cores.
+    """
+    if mode not in MODES:
+      raise ValueError('mode must be one of {}, got {}.'.format(MODES, mode))
+    if not hasattr(os, 'sched_setaffinity'):
+      raise ValueError('Pinning processes to cores requires '
+                       'os.sched_setaffinity, which is only available in '
+                       'Python 3 on Linux.')
+    cpus = set(cpus if cpus is not None else available_cpus())
+    nodes = [sorted(cpus.intersection(node)) for node in nodes or numa_nodes()]
+    nodes = [node for node in nodes if node]
+    # Cores missing from the nodes make a node of their own.
+    unknown_cpus = cpus.difference(*nodes)
+    if unknown_cpus:
+      nodes.append(sorted(unknown_cpus))
+    if num_learner_cpus >= len(cpus):
+      raise ValueError('Cannot reserve {} of the {} cores for the learner, no '
+                       'core would be left for the workers.'.format(
+                           num_learner_cpus, len(cpus)))
+    self._mode = mode
+    self._learner_cpus = [cpu for node in nodes for cpu in node
+                         ][:num_learner_cpus]
+    self._worker_nodes = [
+        [cpu for cpu in node if cpu not in self._learner_cpus]
+        for node in nodes]
+    self._worker_nodes = [node for node in self._worker_nodes if node]
+
+  @property
+  def mode(self):
+    return self._mode
+
+  @property
+  def learner_cpus(self):
+    """Sorted list of the cores reserved for the learner."""
+    return sorted(self._learner_cpus)
+
+  @property
+  def worker_cpus(self):
+    """Sorted list of the cores of the workers."""
+    return sorted(cpu for node in self._worker_nodes for cpu in node)
+
+  def worker_affinities(self, num_workers):
+    """Returns the list of the sorted cores each worker is pinned to.
+
+    Args:
+      num_workers: Number of workers to place. When there are more workers
+        than cores, or nodes, they are placed in turn again.
+
+    Returns:
+      A list of num_workers lists of core ids.
+    """
+    if self._mode == NUMA_NODES:
+      return [list(self._worker_nodes[i % len(self._worker_nodes)])
+              for i in range(num_workers)]
+    # Interleave the cores of the nodes, to spread the workers over them.
+    max_node_size = max(len(node) for node in self._worker_nodes)
+    cpus = [node[i] for i in range(max_node_size)
+            for node in self._worker_nodes if i < len(node)]
+    return [[cpus[i % len(cpus)]] for i in range(num_workers)]
+
+  def pin_learner(self):
+    """Pins the calling thread, and the threads it creates, to learner_cpus.
+
+    Call it before creating the TF session so that its thread pools are pinned
+    too. Does nothing when no core is reserved for the learner.
+    """
+    if self._learner_cpus:
+      os.sched_setaffinity(0, self._learner_cpus)
+
+  def session_config(self, config=None):
+    """Returns a session config sizing the TF thread pools to learner_cpus.
+
+    Args:
+      config: Optional tf.ConfigProto to update, a new one by default.
+
+    Returns:
+      The tf.ConfigProto, unchanged when no core is reserved for the learner.
+    """
+    if config is None:
+      config = tf.ConfigProto()
+    if self._learner_cpus:
+      config.intra_op_parallelism_threads = len(self._learner_cpus)
+      config.inter_op_parallelism_threads = len(self._learner_cpus)
+    return config
+
+  def __repr__(self):
+    return 'CpuPlacement(mode={}, learner_cpus={}, worker_cpus={})'.format(
+        self._mode, self.learner_cpus, self.worker_cpus)
@@ -0,0 +1,80 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for tf_agents.environments.cpu_placement."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import unittest
+
+import tensorflow as tf
+
+from tf_agents.environments import cpu_placement
+
+# Two NUMA nodes of 4 cores.
+_NODES = [[0, 1, 2, 3], [4, 5, 6, 7]]
+
+
+@unittest.skipUnless(hasattr(os, 'sched_setaffinity'),
+                     'Requires os.sched_setaffinity.')
+class CpuPlacementTest(tf.test.TestCase):
+
+  def testParseCpuList(self):
+    self.assertEqual([0, 1, 2, 3, 8, 10, 11],
+                     cpu_placement.parse_cpu_list('0-3,8,10-11\n'))
+
+  def testRoundRobin(self):
+    placement = cpu_placement.CpuPlacement(cpus=range(8), nodes=_NODES)
+    self.assertEqual([[0], [4], [1], [5], [2], [6], [3], [7], [0]],
+                     placement.worker_affinities(9))
+    self.assertEqual([], placement.learner_cpus)
+
+  def testReserveLearnerCpus(self):
+    placement = cpu_placement.CpuPlacement(
+        num_learner_cpus=3, cpus=range(8), nodes=_NODES)
+    self.assertEqual([0, 1, 2], placement.learner_cpus)
+    self.assertEqual([3, 4, 5, 6, 7], placement.worker_cpus)
+    self.assertEqual([[3], [4], [5]], placement.worker_affinities(3))
+    config = placement.session_config()
+    self.assertEqual(3, config.intra_op_parallelism_threads)
+    self.assertEqual(3, config.inter_op_parallelism_threads)
+
+  def testNumaNodes(self):
+    placement = cpu_placement.CpuPlacement(
+        mode=cpu_placement.NUMA_NODES, num_learner_cpus=2, cpus=range(8),
+        nodes=_NODES)
+    self.assertEqual([[2, 3], [4, 5, 6, 7], [2, 3]],
+                     placement.worker_affinities(3))
+
+  def testRestrictedCpus(self):
+    placement = cpu_placement.CpuPlacement(cpus=[1, 5, 9], nodes=_NODES)
+    # Core 9 is on no known node.
+    self.assertEqual([[1], [5], [9]], placement.worker_affinities(3))
+
+  def testNoWorkerCpus(self):
+    with self.assertRaises(ValueError):
+      cpu_placement.CpuPlacement(num_learner_cpus=8, cpus=range(8),
+                                 nodes=_NODES)
+
+  def testUnknownMode(self):
+    with self.assertRaises(ValueError):
+      cpu_placement.CpuPlacement(mode='random')
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -20,13 +20,20 @@ from __future__ import division
 from __future__ import print_function
 
 import atexit
+import collections
+import functools
 import multiprocessing
+import multiprocessing.connection
+import os
+import shutil
 import sys
+import tempfile
 import traceback
 
 import numpy as np
 import tensorflow as tf
 
+from tf_agents.environments import batched_py_environment
 from tf_agents.environments import py_environment
 
 nest = tf.contrib.framework.nest
@@ -39,9 +46,35 @@ class ParallelPyEnvironment(py_environment.Base):
   callables. This can be an environment class, or a function creating the
   environment and potentially wrapping it. The returned environment should not
   access global variables.
+
+  Besides `step`, the environments can be stepped asynchronously with `send`
+  and `recv`, so that slow environments don't hold back the others:
+
+  ```python
+  time_step = env.reset()
+  env.send(actions, env_ids=np.arange(env.batch_size))
+  while True:
+    # The time steps of the first 8 environments done stepping.
+    time_step, env_ids = env.recv(8)
+    env.send(policy.action(time_step).action, env_ids)
+  ```
+
+  With `auto_reset`, the workers reset their environment as soon as it returns
+  a LAST time step, while the others are still stepping, and send the initial
+  time step along with the terminal one. The next `step` or `send` of such an
+  environment then returns the initial time step right away, ignoring its
+  action, like a GymWrapper with `auto_reset`. Drivers stepping asynchronously
+  can instead get the initial time steps with `pop_reset_time_steps` and act on
+  them without this wasted step.
+
+  `recv` can also wait for given environments, e.g. to step groups of
+  environments in turn, acting on one group while the others are stepping.
   """
 
-  def __init__(self, env_constructors, blocking=False, flatten=False):
+  def __init__(self, env_constructors, blocking=False, flatten=False,
+               shared_memory=False, envs_per_worker=1, auto_reset=False,
+               cpu_placement=None, start_method=None, preload_modules=None,
+               copy_time_steps=True):
     """Batch together environments and simulate them in external processes.
 
     The environments can be different but must use the same action and
@@ -52,28 +85,138 @@ class ParallelPyEnvironment(py_environment.Base):
       blocking: Whether to step environments one after another.
       flatten: Boolean, whether to use flatten action and time_steps during
         communication to reduce overhead.
+      shared_memory: Boolean, whether the workers write their time_steps
+        directly into their row of batched arrays in shared memory, instead of
+        sending them through the pipe.
+      envs_per_worker: Number of environments created and stepped one after
+        another by each worker process. Each worker then sends back a batch of
+        time_steps, so fewer processes and round-trips are needed for cheap
+        environments. The last worker gets fewer environments when the number
+        of environments is not a multiple of envs_per_worker.
+      auto_reset: Boolean, whether the workers reset their environment right
+        after a LAST time step and send back the initial time step with it.
+      cpu_placement: Optional cpu_placement.CpuPlacement pinning each worker
+        process to cores. The cores of each worker are logged, and given by
+        `cpu_affinities`.
+      start_method: Optional multiprocessing start method of the workers,
+        'fork', 'spawn' or 'forkserver'. Defaults to the one of the platform.
+        Other than 'fork' requires picklable env_constructors and Python 3.
+      preload_modules: Optional list of module names imported once by the
+        'forkserver' process, e.g. ['tensorflow', 'gym'], which the workers
+        forked from it then don't import again. Only effective if the
+        forkserver of this process was not started yet.
+      copy_time_steps: Boolean, whether `reset` and `step` return copies of
+        the batched time_steps. If False, they return the batch arrays they
+        fill, which are overwritten by the next call, so callers keeping a
+        time_step across calls must copy it. PyDriver does so.
 
     Raises:
-      ValueError: If the action or observation specs don't match.
+      ValueError: If the action or observation specs don't match, if
+        auto_reset is used with envs_per_worker other than 1, or if
+        preload_modules is used without the 'forkserver' start method.
     """
-    self._envs = [ProcessPyEnvironment(ctor, flatten=flatten)
-                  for ctor in env_constructors]
+    if auto_reset and envs_per_worker > 1:
+      raise ValueError('auto_reset requires envs_per_worker=1.')
+    if preload_modules and start_method != 'forkserver':
+      raise ValueError('preload_modules requires the forkserver start method.')
+    if start_method is not None and not hasattr(multiprocessing,
+                                                'get_context'):
+      raise ValueError('start_method requires Python 3.')
+    if preload_modules:
+      multiprocessing.get_context('forkserver').set_forkserver_preload(
+          list(preload_modules))
     self._num_envs = len(env_constructors)
+    self._envs_per_worker = envs_per_worker
+    if envs_per_worker == 1:
+      worker_constructors = env_constructors
+    else:
+      worker_constructors = [
+          functools.partial(_create_env_group,
+                            env_constructors[i:i + envs_per_worker])
+          for i in range(0, self._num_envs, envs_per_worker)]
+    # Rows of the batch of each worker.
+    self._worker_rows = [
+        slice(i, min(i + envs_per_worker, self._num_envs))
+        for i in range(0, self._num_envs, envs_per_worker)]
+    if cpu_placement is not None:
+      cpu_affinities = cpu_placement.worker_affinities(
+          len(worker_constructors))
+    else:
+      cpu_affinities = [None] * len(worker_constructors)
+    self._envs = [
+        ProcessPyEnvironment(ctor, flatten=flatten, auto_reset=auto_reset,
+                             cpu_affinity=cpu_affinity,
+                             start_method=start_method)
+        for ctor, cpu_affinity in zip(worker_constructors, cpu_affinities)]
+    if cpu_placement is not None:
+      tf.logging.info('Placing workers with %r.', cpu_placement)
+      for i, cpu_affinity in enumerate(cpu_affinities):
+        tf.logging.info('Worker %d pinned to cores %s.', i, cpu_affinity)
     self.start()
     self._action_spec = self._envs[0].action_spec()
-    self._observation_spec = self._envs[0].observation_spec()
     self._time_step_spec = self._envs[0].time_step_spec()
-    if any(env.action_spec() != self._action_spec for env in self._envs):
+    self._observation_spec = self._time_step_spec.observation
+    # The other workers compare their specs, all at the same time.
+    promises = [env.check_specs(self._action_spec, self._time_step_spec,
+                                blocking=False)
+                for env in self._envs[1:]]
+    same_specs = [promise() for promise in promises]
+    if not all(same_action_spec for same_action_spec, _ in same_specs):
       raise ValueError('All environments must have the same action spec.')
-    if any(env.time_step_spec() != self._time_step_spec for env in self._envs):
+    if not all(same_time_step_spec for _, same_time_step_spec in same_specs):
       raise ValueError('All environments must have the same time_step_spec.')
     self._blocking = blocking
     self._flatten = flatten
+    self._auto_reset = auto_reset
+    # Promises of the environments stepped with send, by environment id.
+    self._pending = collections.OrderedDict()
+    # Ids of the pending environments returning their reset time step, which
+    # are ready without waiting for their worker.
+    self._reset_ids = []
+    self._copy_time_steps = copy_time_steps
+    self._shared_time_step = None
+    if shared_memory:
+      self._shared_time_step = self._create_shared_time_step()
+      self._batch_time_step = self._shared_time_step
+    else:
+      self._batch_time_step = batched_py_environment.allocate_batch(
+          self._time_step_spec, self._num_envs)
+
+  def _create_shared_time_step(self):
+    """Shares batched time_step arrays with the workers.
+
+    Each array is a memory-mapped file of a temporary directory, preferably in
+    /dev/shm. The files are removed once all the workers have mapped them.
+
+    Returns:
+      A time step of arrays with a batch dimension, whose rows are written by
+      the workers.
+    """
+    shm_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+    directory = tempfile.mkdtemp(prefix='parallel_py_environment_',
+                                 dir=shm_dir)
+    try:
+      arrays_info = []
+      arrays = []
+      for i, spec in enumerate(nest.flatten(self._time_step_spec)):
+        path = os.path.join(directory, str(i))
+        shape = (self._num_envs,) + tuple(spec.shape)
+        arrays_info.append((path, spec.dtype.str, shape))
+        arrays.append(np.asarray(np.memmap(
+            path, dtype=spec.dtype, mode='w+', shape=shape)))
+      for env, rows in zip(self._envs, self._worker_rows):
+        env.share_memory(arrays_info, rows)
+    finally:
+      shutil.rmtree(directory, ignore_errors=True)
+    return nest.pack_sequence_as(self._time_step_spec, arrays)
 
   def start(self):
+    """Starts all the processes, and waits until they are all ready."""
     tf.logging.info('Starting all processes.')
     for env in self._envs:
-      env.start()
+      env.start(wait_to_start=False)
+    for env in self._envs:
+      env.wait_start()
     tf.logging.info('All processes started.')
 
   @property
@@ -84,6 +227,20 @@ class ParallelPyEnvironment(py_environment.Base):
   def batch_size(self):
     return self._num_envs
 
+  @property
+  def auto_reset(self):
+    return self._auto_reset
+
+  @property
+  def copy_time_steps(self):
+    """Whether `reset` and `step` return copies of the batch arrays."""
+    return self._copy_time_steps
+
+  @property
+  def cpu_affinities(self):
+    """Cores each worker process is pinned to, None when not pinned."""
+    return [env.cpu_affinity for env in self._envs]
+
   def observation_spec(self):
     return self._observation_spec
 
@@ -99,6 +256,7 @@ class ParallelPyEnvironment(py_environment.Base):
     Returns:
       Time step with batch dimension.
     """
+    self._check_no_pending_steps()
     time_steps = [env.reset(self._blocking) for env in self._envs]
     if not self._blocking:
       time_steps = [promise() for promise in time_steps]
@@ -116,6 +274,7 @@ class ParallelPyEnvironment(py_environment.Base):
     Returns:
       Batch of observations, rewards, and done flags.
     """
+    self._check_no_pending_steps()
     time_steps = [
         env.step(action, self._blocking)
         for env, action in zip(self._envs, self._unstack_actions(actions))]
@@ -124,6 +283,166 @@ class ParallelPyEnvironment(py_environment.Base):
       time_steps = [promise() for promise in time_steps]
     return self._stack_time_steps(time_steps)
 
+  def send(self, actions, env_ids):
+    """Starts stepping some environments, without waiting for the results.
+
+    Args:
+      actions: Batched action, possibly nested, with one row per environment
+        of env_ids.
+      env_ids: Ids of the environments to step, in [0, batch_size). They must
+        not be stepping already.
+
+    Raises:
+      ValueError: If an environment is stepping already, or if envs_per_worker
+        is not 1.
+    """
+    if self._envs_per_worker > 1:
+      raise ValueError('Asynchronous stepping requires envs_per_worker=1.')
+    env_ids = [int(env_id) for env_id in env_ids]
+    busy_ids = [env_id for env_id in env_ids if env_id in self._pending]
+    if busy_ids:
+      raise ValueError('Environments {} are stepping already, call recv to get '
+                       'their time steps.'.format(busy_ids))
+    for env_id, action in zip(env_ids, self._unstack_actions(actions)):
+      if self._envs[env_id].reset_time_step is not None:
+        self._reset_ids.append(env_id)
+      self._pending[env_id] = self._envs[env_id].step(action, blocking=False)
+
+  def recv(self, num_envs=None, env_ids=None):
+    """Returns the time steps of the first environments done stepping.
+
+    Args:
+      num_envs: Number of time steps to return, at most the number of
+        environments stepping. Defaults to all of them.
+      env_ids: Optional ids of the environments whose time steps to return,
+        waiting for all of them, instead of the first num_envs ones.
+
+    Returns:
+      A tuple (time_step, env_ids), where time_step has a batch dimension of
+      size num_envs and env_ids is an int64 array of the ids of the
+      environments of each row.
+
+    Raises:
+      ValueError: If fewer than num_envs environments are stepping, or if
+        some of env_ids are not stepping.
+    """
+    if env_ids is not None:
+      env_ids = [int(env_id) for env_id in env_ids]
+      idle_ids = [env_id for env_id in env_ids if env_id not in self._pending]
+      if idle_ids:
+        raise ValueError('Cannot receive the time steps of environments {}, '
+                         'they are not stepping.'.format(idle_ids))
+      self._reset_ids = [env_id for env_id in self._reset_ids
+                         if env_id not in env_ids]
+      num_envs = len(env_ids)
+    else:
+      if num_envs is None:
+        num_envs = len(self._pending)
+      if num_envs > len(self._pending):
+        raise ValueError('Cannot receive {} time steps, only {} environments '
+                         'are stepping.'.format(num_envs, len(self._pending)))
+      env_ids = self._reset_ids[:num_envs]
+      del self._reset_ids[:num_envs]
+    time_steps = [self._pending.pop(env_id)() for env_id in env_ids]
+    while len(env_ids) < num_envs:
+      connection_ids = {self._envs[env_id].connection: env_id
+                        for env_id in self._pending
+                        if env_id not in self._reset_ids}
+      for connection in wait_connections(list(connection_ids)):
+        if len(env_ids) == num_envs:
+          break
+        env_id = connection_ids[connection]
+        time_steps.append(self._pending.pop(env_id)())
+        env_ids.append(env_id)
+    env_ids = np.array(env_ids, dtype=np.int64)
+    if self._shared_time_step is not None:
+      self._write_rows([self._worker_rows[env_id] for env_id in env_ids],
+                       time_steps)
+      # Copy the rows, the others are still being written.
+      return nest.map_structure(lambda array: array[env_ids],
+                                self._shared_time_step), env_ids
+    return self._stack_rows(time_steps), env_ids
+
+  def pop_reset_time_steps(self, env_ids):
+    """Returns the initial time steps of environments reset by their worker.
+
+    With auto_reset, each environment which returned a LAST time step is reset
+    by its worker. Popping its initial time step makes its next `step` or
+    `send` apply the action to the new episode, rather than return the initial
+    time step.
+
+    Args:
+      env_ids: Ids of environments whose last time step was LAST.
+
+    Returns:
+      The batched initial time steps of the environments.
+
+    Raises:
+      ValueError: If an environment was not reset by its worker.
+    """
+    time_steps = [self._envs[env_id].pop_reset_time_step()
+                  for env_id in env_ids]
+    if any(time_step is None for time_step in time_steps):
+      raise ValueError('Environments {} were not reset by their worker.'.format(
+          [env_id for env_id, time_step in zip(env_ids, time_steps)
+           if time_step is None]))
+    return self._stack_rows(time_steps)
+
+  def reset_envs(self, env_ids):
+    """Resets some of the environments, e.g. the ones which returned LAST.
+
+    The environments already reset by their worker with auto_reset are not
+    reset again, their initial time step is popped like with
+    `pop_reset_time_steps`.
+
+    Args:
+      env_ids: Ids of the environments to reset, in [0, batch_size). They must
+        not be stepping asynchronously.
+
+    Returns:
+      The batched initial time steps of the environments.
+
+    Raises:
+      ValueError: If an environment is stepping asynchronously.
+    """
+    env_ids = np.asarray(env_ids, dtype=np.int64)
+    busy_ids = [env_id for env_id in env_ids if env_id in self._pending]
+    if busy_ids:
+      raise ValueError('Environments {} are stepping asynchronously, call recv '
+                       'to get their time steps first.'.format(busy_ids))
+    if self._envs_per_worker == 1:
+      rows = env_ids
+      promises = [self._reset_promise(self._envs[env_id])
+                  for env_id in env_ids]
+    else:
+      # The environments of each worker are reset in one call.
+      worker_ids = collections.OrderedDict()
+      for env_id in env_ids:
+        worker_ids.setdefault(env_id // self._envs_per_worker, []).append(
+            env_id % self._envs_per_worker)
+      rows = [worker * self._envs_per_worker + np.array(ids)
+              for worker, ids in worker_ids.items()]
+      promises = [self._envs[worker].call('reset_envs', ids)
+                  for worker, ids in worker_ids.items()]
+    # With shared memory, the workers write the time steps they reset in the
+    # batch arrays.
+    self._write_rows(rows, [promise() for promise in promises])
+    return nest.map_structure(lambda array: array[env_ids],
+                              self._batch_time_step)
+
+  def _reset_promise(self, env):
+    """Returns a promise of the initial time step of a worker environment."""
+    if env.reset_time_step is not None:
+      time_step = env.pop_reset_time_step()
+      return lambda: time_step
+    return env.reset(blocking=False)
+
+  def _check_no_pending_steps(self):
+    if self._pending:
+      raise RuntimeError('Environments {} are stepping asynchronously, call '
+                         'recv to get their time steps first.'.format(
+                             list(self._pending)))
+
   def close(self):
     """Close all external process."""
     tf.logging.info('Closing all processes.')
@@ -133,6 +452,15 @@ class ParallelPyEnvironment(py_environment.Base):
 
   def _stack_time_steps(self, time_steps):
     """Given a list of TimeStep, combine to one with a batch dimension."""
+    # With shared memory, the workers wrote their time steps in the batch
+    # arrays already, except the reset time steps they sent with a LAST one.
+    self._write_rows(self._worker_rows, time_steps)
+    if self._copy_time_steps:
+      return nest.map_structure(np.copy, self._batch_time_step)
+    return self._batch_time_step
+
+  def _stack_rows(self, time_steps):
+    """Stacks the time steps of single environments into a batch."""
     if self._flatten:
       return fast_map_structure_flatten(lambda *arrays: np.stack(arrays),
                                         self._time_step_spec,
@@ -140,17 +468,47 @@ class ParallelPyEnvironment(py_environment.Base):
     else:
       return fast_map_structure(lambda *arrays: np.stack(arrays), *time_steps)
 
+  def _write_rows(self, rows, time_steps):
+    """Writes the time steps of the workers, if any, in their batch rows."""
+    flat_arrays = nest.flatten(self._batch_time_step)
+    for row, time_step in zip(rows, time_steps):
+      if time_step is not None:
+        for array, value in zip(flat_arrays, nest.flatten(time_step)):
+          array[row] = value
+
   def _unstack_actions(self, batched_actions):
-    """Returns a list of actions from potentially nested batch of actions."""
+    """Returns a list of the actions of each worker from a batch of actions."""
     flattened_actions = nest.flatten(batched_actions)
+    if self._envs_per_worker > 1:
+      worker_actions = [[action[rows] for action in flattened_actions]
+                        for rows in self._worker_rows]
+      if self._flatten:
+        return worker_actions
+      return [nest.pack_sequence_as(batched_actions, actions)
+              for actions in worker_actions]
     if self._flatten:
       unstacked_actions = zip(*flattened_actions)
+    elif not nest.is_sequence(batched_actions):
+      # The rows of the array, as views.
+      unstacked_actions = list(batched_actions)
     else:
       unstacked_actions = [nest.pack_sequence_as(batched_actions, actions)
                            for actions in zip(*flattened_actions)]
     return unstacked_actions
 
 
+def wait_connections(connections):
+  """Waits until some connections have data to receive, and returns them."""
+  if hasattr(multiprocessing.connection, 'wait'):
+    return multiprocessing.connection.wait(connections)
+  # Python 2 has no multiprocessing.connection.wait.
+  while True:
+    ready = [connection for connection in connections if connection.poll()]
+    if ready:
+      return ready
+    connections[0].poll(0.001)
+
+
 # TODO(sguada) Move to utils.
 def fast_map_structure_flatten(func, structure, *flat_structure):
   entries = zip(*flat_structure)
@@ -165,6 +523,16 @@ def fast_map_structure(func, *structure):
       structure[0], [func(*x) for x in entries])
 
 
+def _create_env_group(env_constructors):
+  """Creates the environments of a worker process, stepped one after another.
+
+  The time steps are not copied, as the worker sends or writes them right away.
+  """
+  return batched_py_environment.BatchedPyEnvironment(
+      [ctor() for ctor in env_constructors],
+      backend=batched_py_environment.SERIAL, copy_time_steps=False)
+
+
 class ProcessPyEnvironment(object):
   """Step a single env in a separate process for lock free paralellism."""
 
@@ -175,8 +543,11 @@ class ProcessPyEnvironment(object):
   _RESULT = 4
   _EXCEPTION = 5
   _CLOSE = 6
+  _SHARE_MEMORY = 7
+  _CHECK_SPECS = 8
 
-  def __init__(self, env_constructor, flatten=False):
+  def __init__(self, env_constructor, flatten=False, auto_reset=False,
+               cpu_affinity=None, start_method=None):
     """Step environment in a separate process for lock free paralellism.
 
     The environment is created in an external process by calling the provided
@@ -188,6 +559,13 @@ class ProcessPyEnvironment(object):
       env_constructor: Callable that creates and returns a Python environment.
       flatten: Boolean, whether to assume flattened actions and time_steps
         during communication to avoid overhead.
+      auto_reset: Boolean, whether the worker resets the environment right
+        after a LAST time step, and sends the initial time step with it. The
+        next `step` then returns the initial time step, ignoring its action.
+      cpu_affinity: Optional list of the cores the worker process is pinned to,
+        before it creates the environment.
+      start_method: Optional multiprocessing start method, 'fork', 'spawn' or
+        'forkserver'. Defaults to the one of the platform.
 
     Attributes:
       observation_spec: The cached observation spec of the environment.
@@ -196,18 +574,41 @@ class ProcessPyEnvironment(object):
     """
     self._env_constructor = env_constructor
     self._flatten = flatten
+    self._auto_reset = auto_reset
+    self._cpu_affinity = cpu_affinity
+    self._start_method = start_method
+    # Initial time step sent by the worker with the last LAST time step.
+    self._reset_time_step = None
     self._observation_spec = None
     self._action_spec = None
     self._time_step_spec = None
 
-  def start(self):
-    """Start the process."""
-    self._conn, conn = multiprocessing.Pipe()
-    self._process = multiprocessing.Process(
-        target=self._worker,
-        args=(conn, self._env_constructor, self._flatten))
+  def start(self, wait_to_start=True):
+    """Start the process.
+
+    Args:
+      wait_to_start: Whether to wait until the environment is created. If
+        False, `wait_start` must be called before using the environment, which
+        lets several processes start at the same time.
+    """
+    if self._start_method is None:
+      context = multiprocessing
+    else:
+      context = multiprocessing.get_context(self._start_method)
+    self._conn, conn = context.Pipe()
+    # The worker is a class method, so that the other start methods than fork
+    # don't need to pickle this object.
+    self._process = context.Process(
+        target=type(self)._worker,
+        args=(conn, self._env_constructor, self._flatten, self._auto_reset,
+              self._cpu_affinity))
     atexit.register(self.close)
     self._process.start()
+    if wait_to_start:
+      self.wait_start()
+
+  def wait_start(self):
+    """Wait until the process is ready, re-raising errors of the environment."""
     result = self._conn.recv()
     if isinstance(result, Exception):
       self._conn.close()
@@ -215,6 +616,27 @@ class ProcessPyEnvironment(object):
       raise result
     assert result is self._READY, result
 
+  @property
+  def connection(self):
+    """Connection to the worker process, e.g. to wait for results."""
+    return self._conn
+
+  @property
+  def cpu_affinity(self):
+    """Cores the worker process is pinned to, None when not pinned."""
+    return self._cpu_affinity
+
+  @property
+  def reset_time_step(self):
+    """Initial time step returned by the next `step`, if the env was reset."""
+    return self._reset_time_step
+
+  def pop_reset_time_step(self):
+    """Returns the reset_time_step, so that the next `step` steps the env."""
+    time_step = self._reset_time_step
+    self._reset_time_step = None
+    return time_step
+
   def observation_spec(self):
     if not self._observation_spec:
       self._observation_spec = self.call('observation_spec')()
@@ -260,6 +682,49 @@ class ProcessPyEnvironment(object):
     self._conn.send((self._CALL, payload))
     return self._receive
 
+  def check_specs(self, action_spec, time_step_spec, blocking=True):
+    """Compares the specs of the environment with the given ones.
+
+    The comparison is done in the worker, so that the specs are sent once. When
+    they match, they are cached as the specs of the environment.
+
+    Args:
+      action_spec: The expected action spec.
+      time_step_spec: The expected time step spec.
+      blocking: Whether to wait for the result.
+
+    Returns:
+      A (same action_spec, same time_step_spec) pair of booleans when blocking,
+      otherwise callable that returns it.
+    """
+    self._conn.send((self._CHECK_SPECS, (action_spec, time_step_spec)))
+
+    def promise():
+      same_specs = self._receive()
+      if all(same_specs):
+        self._action_spec = action_spec
+        self._time_step_spec = time_step_spec
+        self._observation_spec = time_step_spec.observation
+      return same_specs
+
+    if blocking:
+      return promise()
+    return promise
+
+  def share_memory(self, arrays_info, rows):
+    """Makes the worker write its time_steps in shared batched arrays.
+
+    Once shared, `step` and `reset` return None instead of the time step.
+
+    Args:
+      arrays_info: List of (path, dtype string, shape) of memory-mapped files
+        holding the flattened batched time_step.
+      rows: Slice of the rows of the environment in the batched arrays, a
+        single row unless the environment is batched.
+    """
+    self._conn.send((self._SHARE_MEMORY, (arrays_info, rows)))
+    self._receive()
+
   def close(self):
     """Send a close message to the external process and join it."""
     try:
@@ -280,7 +745,14 @@ class ProcessPyEnvironment(object):
     Returns:
       time step when blocking, otherwise callable that returns the time step.
     """
-    promise = self.call('step', action)
+    if self._reset_time_step is not None:
+      # The worker reset the environment already.
+      time_step = self.pop_reset_time_step()
+      promise = lambda: time_step
+    elif self._auto_reset:
+      promise = functools.partial(self._receive_step, self.call('step', action))
+    else:
+      promise = self.call('step', action)
     if blocking:
       return promise()
     else:
@@ -296,12 +768,18 @@ class ProcessPyEnvironment(object):
       New observation when blocking, otherwise callable that returns the new
       observation.
     """
+    self._reset_time_step = None
     promise = self.call('reset')
     if blocking:
       return promise()
     else:
       return promise
 
+  def _receive_step(self, promise):
+    """Returns the time step of a step, keeping the reset time step if any."""
+    time_step, self._reset_time_step = promise()
+    return time_step
+
   def _receive(self):
     """Wait for a message from the worker process and return its payload.
 
@@ -322,7 +800,9 @@ class ProcessPyEnvironment(object):
     self.close()
     raise KeyError('Received message of unexpected type {}'.format(message))
 
-  def _worker(self, conn, env_constructor, flatten=False):
+  @classmethod
+  def _worker(cls, conn, env_constructor, flatten=False, auto_reset=False,
+              cpu_affinity=None):
     """The process waits for actions and sends back environment results.
 
     Args:
@@ -330,14 +810,21 @@ class ProcessPyEnvironment(object):
       env_constructor: env_constructor for the OpenAI Gym environment.
       flatten: Boolean, whether to assume flattened actions and time_steps
         during communication to avoid overhead.
+      auto_reset: Boolean, whether to reset the environment after a LAST time
+        step, and send a (time_step, reset_time_step or None) pair for steps.
+      cpu_affinity: Optional list of the cores to pin the process to.
 
     Raises:
       KeyError: When receiving a message of unknown type.
     """
     try:
+      if cpu_affinity is not None:
+        os.sched_setaffinity(0, cpu_affinity)
       env = env_constructor()
       action_spec = env.action_spec()
-      conn.send(self._READY)  # Ready.
+      # Rows of the shared batched arrays the time steps are written to.
+      shared_rows = None
+      conn.send(cls._READY)  # Ready.
       while True:
         try:
           # Only block for short times to have keyboard exceptions be raised.
@@ -346,21 +833,48 @@ class ProcessPyEnvironment(object):
           message, payload = conn.recv()
         except (EOFError, KeyboardInterrupt):
           break
-        if message == self._ACCESS:
+        if message == cls._ACCESS:
           name = payload
           result = getattr(env, name)
-          conn.send((self._RESULT, result))
+          conn.send((cls._RESULT, result))
           continue
-        if message == self._CALL:
+        if message == cls._CALL:
           name, args, kwargs = payload
           if flatten and name == 'step':
             args = [nest.pack_sequence_as(action_spec, args[0])]
           result = getattr(env, name)(*args, **kwargs)
-          if flatten and name in ['step', 'reset']:
+          reset_result = None
+          if auto_reset and name == 'step' and result.is_last():
+            # Reset now rather than when the next action comes in.
+            reset_result = env.reset()
+            if flatten:
+              reset_result = nest.flatten(reset_result)
+          if shared_rows is not None and name in ['step', 'reset']:
+            for row, value in zip(shared_rows, nest.flatten(result)):
+              row[...] = value
+            result = None
+          elif flatten and name in ['step', 'reset']:
             result = nest.flatten(result)
-          conn.send((self._RESULT, result))
+          if auto_reset and name == 'step':
+            result = (result, reset_result)
+          conn.send((cls._RESULT, result))
+          continue
+        if message == cls._CHECK_SPECS:
+          expected_action_spec, expected_time_step_spec = payload
+          conn.send((cls._RESULT, (
+              env.action_spec() == expected_action_spec,
+              env.time_step_spec() == expected_time_step_spec)))
+          continue
+        if message == cls._SHARE_MEMORY:
+          arrays_info, rows = payload
+          # Slices rather than indices, so that scalar rows stay writable.
+          shared_rows = [
+              np.memmap(path, dtype=np.dtype(dtype), mode='r+',
+                        shape=shape)[rows]
+              for path, dtype, shape in arrays_info]
+          conn.send((cls._RESULT, None))
           continue
-        if message == self._CLOSE:
+        if message == cls._CLOSE:
           assert payload is None
           break
         raise KeyError('Received message of unknown type {}'.format(message))
@@ -369,6 +883,6 @@ class ProcessPyEnvironment(object):
       stacktrace = ''.join(traceback.format_exception(etype, evalue, tb))
       message = 'Error in environment process: {}'.format(stacktrace)
       tf.logging.error(message)
-      conn.send((self._EXCEPTION, stacktrace))
+      conn.send((cls._EXCEPTION, stacktrace))
     finally:
       conn.close()
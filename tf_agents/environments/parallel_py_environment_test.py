@@ -21,10 +21,14 @@ from __future__ import print_function
 
 import collections
 import functools
+import os
+import sys
+import unittest
 
 import numpy as np
 import tensorflow as tf
 
+from tf_agents.environments import cpu_placement
 from tf_agents.environments import parallel_py_environment
 from tf_agents.environments import random_py_environment
 from tf_agents.environments import time_step as ts
@@ -33,7 +37,8 @@ from tf_agents.specs import array_spec
 
 class ParallelPyEnvironmentTest(tf.test.TestCase):
 
-  def _make_parallel_py_environment(self, constructor=None, num_envs=2):
+  def _make_parallel_py_environment(self, constructor=None, num_envs=2,
+                                    **kwargs):
     self.observation_spec = array_spec.ArraySpec((3, 3), np.float32)
     self.time_step_spec = ts.time_step_spec(self.observation_spec)
     self.action_spec = array_spec.BoundedArraySpec(
@@ -43,7 +48,7 @@ class ParallelPyEnvironmentTest(tf.test.TestCase):
         self.observation_spec,
         self.action_spec)
     return parallel_py_environment.ParallelPyEnvironment(
-        env_constructors=[constructor] * num_envs, blocking=True)
+        env_constructors=[constructor] * num_envs, blocking=True, **kwargs)
 
   def test_close_no_hang_after_init(self):
     env = self._make_parallel_py_environment()
@@ -80,6 +85,206 @@ class ParallelPyEnvironmentTest(tf.test.TestCase):
                         time_step2.observation.shape)
     env.close()
 
+  def _assert_same_time_steps(self, num_envs, **kwargs):
+    """Checks that an environment created with kwargs matches the default."""
+    observation_spec = array_spec.ArraySpec((3, 3), np.float32)
+    action_spec = array_spec.BoundedArraySpec(
+        [7], dtype=np.float32, minimum=-1.0, maximum=1.0)
+    # Each environment has its own seed, so their observations differ, and
+    # their episodes end within the steps taken.
+    constructors = [
+        functools.partial(random_py_environment.RandomPyEnvironment,
+                          observation_spec, action_spec, seed=seed,
+                          max_duration=3)
+        for seed in range(num_envs)]
+    env = parallel_py_environment.ParallelPyEnvironment(
+        constructors, blocking=True)
+    other_env = parallel_py_environment.ParallelPyEnvironment(
+        constructors, **kwargs)
+    self.assertEqual(env.time_step_spec(), other_env.time_step_spec())
+    self.assertEqual(num_envs, other_env.batch_size)
+    rng = np.random.RandomState()
+
+    tf.contrib.framework.nest.map_structure(
+        self.assertAllEqual, env.reset(), other_env.reset())
+    for _ in range(8):
+      action = np.array([array_spec.sample_bounded_spec(action_spec, rng)
+                         for _ in range(num_envs)])
+      time_step = env.step(action)
+      other_time_step = other_env.step(action)
+      tf.contrib.framework.nest.map_structure(
+          self.assertAllEqual, time_step, other_time_step)
+    self.assertEqual((num_envs, 3, 3), other_time_step.observation.shape)
+    self.assertEqual(np.float32, other_time_step.observation.dtype)
+    env.close()
+    other_env.close()
+
+  def test_step_shared_memory(self):
+    self._assert_same_time_steps(num_envs=3, shared_memory=True)
+
+  def test_envs_per_worker(self):
+    self._assert_same_time_steps(num_envs=5, envs_per_worker=2)
+
+  def test_envs_per_worker_flatten(self):
+    self._assert_same_time_steps(num_envs=5, envs_per_worker=2, flatten=True)
+
+  def test_envs_per_worker_shared_memory(self):
+    self._assert_same_time_steps(
+        num_envs=5, envs_per_worker=2, shared_memory=True)
+
+  def test_auto_reset(self):
+    self._assert_same_time_steps(num_envs=3, auto_reset=True)
+
+  def test_auto_reset_flatten_shared_memory(self):
+    self._assert_same_time_steps(
+        num_envs=3, auto_reset=True, flatten=True, shared_memory=True)
+
+  def test_auto_reset_pop_reset_time_steps(self):
+    num_envs = 2
+    constructor = functools.partial(
+        random_py_environment.RandomPyEnvironment,
+        array_spec.ArraySpec((3, 3), np.float32),
+        array_spec.BoundedArraySpec([1], np.float32, minimum=-1.0, maximum=1.0),
+        max_duration=2)
+    env = parallel_py_environment.ParallelPyEnvironment(
+        [constructor] * num_envs, auto_reset=True)
+    actions = np.zeros((num_envs, 1), np.float32)
+    env.reset()
+    env.step(actions)
+    with self.assertRaises(ValueError):
+      env.pop_reset_time_steps([0])
+
+    env.send(actions, env_ids=np.arange(num_envs))
+    time_step, env_ids = env.recv()
+    self.assertAllEqual([ts.StepType.LAST] * num_envs, time_step.step_type)
+    reset_time_step = env.pop_reset_time_steps(env_ids[:1])
+    self.assertAllEqual([ts.StepType.FIRST], reset_time_step.step_type)
+    self.assertEqual((1, 3, 3), reset_time_step.observation.shape)
+
+    # The popped environment steps its new episode, the other one returns its
+    # reset time step.
+    env.send(actions, env_ids=env_ids)
+    time_step, env_ids = env.recv(1)
+    self.assertAllEqual([ts.StepType.FIRST], time_step.step_type)
+    time_step, env_ids = env.recv(1)
+    self.assertAllEqual([ts.StepType.MID], time_step.step_type)
+    env.close()
+
+  def _assert_reset_envs(self, **kwargs):
+    """Checks reset_envs with an environment created with kwargs."""
+    num_envs = 3
+    constructor = functools.partial(
+        random_py_environment.RandomPyEnvironment,
+        array_spec.ArraySpec((3, 3), np.float32),
+        array_spec.BoundedArraySpec([1], np.float32, minimum=-1.0, maximum=1.0),
+        min_duration=2, max_duration=2)
+    env = parallel_py_environment.ParallelPyEnvironment(
+        [constructor] * num_envs, **kwargs)
+    actions = np.zeros((num_envs, 1), np.float32)
+    env.reset()
+    env.step(actions)
+    time_step = env.step(actions)
+    self.assertAllEqual([ts.StepType.LAST] * num_envs, time_step.step_type)
+    reset_time_step = env.reset_envs([2, 0])
+    self.assertAllEqual([ts.StepType.FIRST] * 2, reset_time_step.step_type)
+    self.assertEqual((2, 3, 3), reset_time_step.observation.shape)
+
+    # The reset environments step their new episode, the other one restarts.
+    time_step = env.step(actions)
+    self.assertAllEqual(
+        [ts.StepType.MID, ts.StepType.FIRST, ts.StepType.MID],
+        time_step.step_type)
+    env.close()
+
+  def test_reset_envs(self):
+    self._assert_reset_envs()
+
+  def test_reset_envs_auto_reset_shared_memory(self):
+    self._assert_reset_envs(auto_reset=True, shared_memory=True)
+
+  def test_reset_envs_envs_per_worker_shared_memory(self):
+    self._assert_reset_envs(envs_per_worker=2, shared_memory=True)
+
+  @unittest.skipUnless(hasattr(os, 'sched_setaffinity'),
+                       'Requires os.sched_setaffinity.')
+  def test_cpu_placement(self):
+    cpus = sorted(os.sched_getaffinity(0))
+    placement = cpu_placement.CpuPlacement(cpus=cpus)
+    self._assert_same_time_steps(num_envs=2, cpu_placement=placement)
+    env = parallel_py_environment.ParallelPyEnvironment(
+        [functools.partial(random_py_environment.RandomPyEnvironment,
+                           array_spec.ArraySpec((3, 3), np.float32))] * 3,
+        cpu_placement=placement)
+    self.assertEqual(placement.worker_affinities(3), env.cpu_affinities)
+    env.close()
+
+  @unittest.skipUnless(sys.version_info[0] >= 3, 'Requires Python 3.')
+  def test_forkserver_preload(self):
+    self._assert_same_time_steps(
+        num_envs=2, start_method='forkserver', preload_modules=['numpy'])
+
+  def test_preload_requires_forkserver(self):
+    with self.assertRaises(ValueError):
+      self._make_parallel_py_environment(preload_modules=['numpy'])
+
+  def test_spec_mismatch(self):
+    action_spec = array_spec.BoundedArraySpec(
+        [7], dtype=np.float32, minimum=-1.0, maximum=1.0)
+    constructors = [
+        functools.partial(random_py_environment.RandomPyEnvironment,
+                          array_spec.ArraySpec(shape, np.float32), action_spec)
+        for shape in [(3, 3), (3, 3), (2, 3)]]
+    with self.assertRaisesRegexp(ValueError, 'time_step_spec'):
+      parallel_py_environment.ParallelPyEnvironment(constructors)
+
+  def test_no_copy(self):
+    self._assert_same_time_steps(num_envs=3, copy_time_steps=False)
+
+  def test_send_recv(self):
+    num_envs = 3
+    env = self._make_parallel_py_environment(num_envs=num_envs)
+    rng = np.random.RandomState()
+    actions = np.array([array_spec.sample_bounded_spec(self.action_spec, rng)
+                        for _ in range(num_envs)])
+    env.reset()
+
+    env.send(actions, env_ids=np.arange(num_envs))
+    with self.assertRaises(ValueError):
+      env.send(actions[:1], env_ids=[1])
+    with self.assertRaises(RuntimeError):
+      env.step(actions)
+    time_step, env_ids = env.recv(2)
+    self.assertEqual((2, 3, 3), time_step.observation.shape)
+    self.assertEqual(2, len(set(env_ids)))
+
+    # The environments received can be stepped again.
+    env.send(actions[:2], env_ids)
+    with self.assertRaises(ValueError):
+      env.recv(4)
+    time_step, env_ids = env.recv()
+    self.assertEqual((num_envs, 3, 3), time_step.observation.shape)
+    self.assertAllEqual(np.arange(num_envs), np.sort(env_ids))
+    env.step(actions)
+    env.close()
+
+  def test_recv_env_ids(self):
+    num_envs = 4
+    env = self._make_parallel_py_environment(num_envs=num_envs)
+    rng = np.random.RandomState()
+    actions = np.array([array_spec.sample_bounded_spec(self.action_spec, rng)
+                        for _ in range(num_envs)])
+    env.reset()
+
+    env.send(actions, env_ids=np.arange(num_envs))
+    time_step, env_ids = env.recv(env_ids=[3, 1])
+    self.assertEqual((2, 3, 3), time_step.observation.shape)
+    self.assertAllEqual([3, 1], env_ids)
+    with self.assertRaises(ValueError):
+      env.recv(env_ids=[1])
+    time_step, env_ids = env.recv()
+    self.assertAllEqual([0, 2], np.sort(env_ids))
+    env.close()
+
   def test_unstack_actions(self):
     num_envs = 2
     env = self._make_parallel_py_environment(num_envs=num_envs)
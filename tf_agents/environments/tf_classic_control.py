@@ -0,0 +1,93 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Gym classic control environments written in TensorFlow ops.
+
+The dynamics, rewards, terminations and episode lengths match the ones of the
+gym environments loaded by `suite_gym.load`, with the same specs.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+from tf_agents.environments import tf_vectorized_environment
+from tf_agents.specs import tensor_spec
+import gin.tf
+
+
+@gin.configurable
+class CartPole(tf_vectorized_environment.TFVectorizedEnvironment):
+  """CartPole-v0 in TF ops, or CartPole-v1 with max_episode_steps=500."""
+
+  _GRAVITY = 9.8
+  _MASS_CART = 1.0
+  _MASS_POLE = 0.1
+  _TOTAL_MASS = _MASS_CART + _MASS_POLE
+  # Half of the pole length.
+  _LENGTH = 0.5
+  _POLE_MASS_LENGTH = _MASS_POLE * _LENGTH
+  _FORCE_MAG = 10.0
+  # Seconds between state updates.
+  _TAU = 0.02
+  _THETA_THRESHOLD = 12 * 2 * np.pi / 360
+  _X_THRESHOLD = 2.4
+
+  def __init__(self, batch_size, discount=1.0, max_episode_steps=200,
+               scope=None):
+    high = np.array([self._X_THRESHOLD * 2, np.finfo(np.float32).max,
+                     self._THETA_THRESHOLD * 2, np.finfo(np.float32).max],
+                    dtype=np.float32)
+    observation_spec = tensor_spec.BoundedTensorSpec(
+        [4], tf.float32, minimum=-high, maximum=high)
+    action_spec = tensor_spec.BoundedTensorSpec(
+        [], tf.int64, minimum=0, maximum=1)
+    # The state is kept in float64 like in gym.
+    state_spec = tensor_spec.TensorSpec([4], tf.float64)
+    super(CartPole, self).__init__(
+        observation_spec, action_spec, state_spec, batch_size,
+        discount=discount, max_episode_steps=max_episode_steps, scope=scope)
+
+  def _reset_states(self, num_states):
+    return tf.random_uniform([num_states, 4], -0.05, 0.05, dtype=tf.float64)
+
+  def _step_states(self, states, actions):
+    x, x_dot, theta, theta_dot = tf.unstack(states, axis=1)
+    force = tf.where(tf.equal(actions, 1),
+                     tf.fill(tf.shape(x), np.float64(self._FORCE_MAG)),
+                     tf.fill(tf.shape(x), np.float64(-self._FORCE_MAG)))
+    costheta = tf.cos(theta)
+    sintheta = tf.sin(theta)
+    temp = (force + self._POLE_MASS_LENGTH * theta_dot * theta_dot * sintheta
+           ) / self._TOTAL_MASS
+    thetaacc = (self._GRAVITY * sintheta - costheta * temp) / (
+        self._LENGTH * (4.0 / 3.0 - self._MASS_POLE * costheta * costheta /
+                        self._TOTAL_MASS))
+    xacc = temp - self._POLE_MASS_LENGTH * thetaacc * costheta / (
+        self._TOTAL_MASS)
+    x += self._TAU * x_dot
+    x_dot += self._TAU * xacc
+    theta += self._TAU * theta_dot
+    theta_dot += self._TAU * thetaacc
+    terminated = tf.logical_or(tf.abs(x) > self._X_THRESHOLD,
+                               tf.abs(theta) > self._THETA_THRESHOLD)
+    states = tf.stack([x, x_dot, theta, theta_dot], axis=1)
+    return states, tf.ones_like(x), terminated
+
+  def _observe(self, states):
+    return tf.cast(states, tf.float32)
@@ -0,0 +1,90 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the TF classic control environments against the gym ones."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import gym
+import numpy as np
+import tensorflow as tf
+
+from tf_agents.drivers import dynamic_step_driver
+from tf_agents.environments import suite_gym
+from tf_agents.environments import tf_classic_control
+from tf_agents.environments import time_step as ts
+from tf_agents.policies import random_tf_policy
+from tf_agents.specs import tensor_spec
+
+
+class CartPoleTest(tf.test.TestCase):
+
+  def testMatchesGym(self):
+    batch_size = 64
+    env = tf_classic_control.CartPole(batch_size)
+    gym_env = suite_gym.load('CartPole-v0')
+    self.assertEqual(tensor_spec.from_spec(gym_env.observation_spec()),
+                     env.observation_spec())
+    self.assertEqual(tensor_spec.from_spec(gym_env.action_spec()),
+                     env.action_spec())
+
+    states = tf.placeholder(tf.float64, [batch_size, 4])
+    actions = tf.placeholder(tf.int64, [batch_size])
+    next_states, rewards, terminated = env._step_states(states, actions)
+    observations = env._observe(next_states)
+
+    # Step the same states and actions with the unwrapped gym environment.
+    unwrapped_env = gym.make('CartPole-v0').unwrapped
+    rng = np.random.RandomState(0)
+    states_value = rng.uniform(-0.05, 0.05, size=(batch_size, 4))
+    with self.cached_session() as sess:
+      for _ in range(20):
+        actions_value = rng.randint(2, size=batch_size)
+        (next_states_value, observations_value, rewards_value,
+         terminated_value) = sess.run(
+             [next_states, observations, rewards, terminated],
+             {states: states_value, actions: actions_value})
+        for i in range(batch_size):
+          # Resetting clears the end of episode.
+          unwrapped_env.reset()
+          unwrapped_env.state = states_value[i].copy()
+          observation, reward, done, _ = unwrapped_env.step(actions_value[i])
+          self.assertAllClose(observation, observations_value[i], atol=1e-5)
+          self.assertAllClose(reward, rewards_value[i])
+          self.assertEqual(done, terminated_value[i])
+        states_value = np.where(
+            terminated_value[:, None],
+            rng.uniform(-0.05, 0.05, size=(batch_size, 4)), next_states_value)
+
+  def testDynamicStepDriver(self):
+    batch_size = 8
+    env = tf_classic_control.CartPole(batch_size, max_episode_steps=10)
+    policy = random_tf_policy.RandomTFPolicy(env.time_step_spec(),
+                                             env.action_spec())
+    driver = dynamic_step_driver.DynamicStepDriver(
+        env, policy, num_steps=25 * batch_size)
+    run_op = driver.run()
+    self.evaluate(tf.global_variables_initializer())
+    time_step, _ = self.evaluate(run_op)
+    self.assertEqual((batch_size, 4), time_step.observation.shape)
+    # The episodes were reset in-graph after at most 10 steps.
+    self.assertTrue(np.all(self.evaluate(env._episode_steps) <= 10))
+    self.assertTrue(np.all(time_step.step_type <= ts.StepType.LAST))
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -0,0 +1,79 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A batched grid world written in TensorFlow ops."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+from tf_agents.environments import tf_vectorized_environment
+from tf_agents.specs import tensor_spec
+import gin.tf
+
+# Row and column moves of the actions up, right, down and left.
+_MOVES = [[-1, 0], [0, 1], [1, 0], [0, -1]]
+
+
+@gin.configurable
+class GridWorld(tf_vectorized_environment.TFVectorizedEnvironment):
+  """Square grid where the agent moves to the goal in the bottom-right corner.
+
+  The episodes start in a random cell other than the goal, and end with a
+  reward of 1 when reaching the goal. Moves into the walls leave the agent in
+  place. The observation is the one-hot encoding of the cell of the agent.
+  """
+
+  def __init__(self, batch_size, size=5, discount=1.0, max_episode_steps=None,
+               scope=None):
+    """Creates the grid world.
+
+    Args:
+      batch_size: Number of environments.
+      size: Number of rows and columns of the grid.
+      discount: Discount of the steps which don't reach the goal.
+      max_episode_steps: Optional number of steps after which the episodes
+        end, by default 4 * size.
+      scope: Optional variable scope of the variables.
+    """
+    self._size = size
+    observation_spec = tensor_spec.BoundedTensorSpec(
+        [size * size], tf.float32, minimum=0, maximum=1)
+    action_spec = tensor_spec.BoundedTensorSpec(
+        [], tf.int64, minimum=0, maximum=len(_MOVES) - 1)
+    # The row and column of the agent.
+    state_spec = tensor_spec.TensorSpec([2], tf.int64)
+    super(GridWorld, self).__init__(
+        observation_spec, action_spec, state_spec, batch_size,
+        discount=discount,
+        max_episode_steps=max_episode_steps or 4 * size, scope=scope)
+
+  def _reset_states(self, num_states):
+    # Any cell but the goal, which is the last one.
+    cells = tf.random_uniform(
+        [num_states], 0, self._size * self._size - 1, dtype=tf.int64)
+    return tf.stack([cells // self._size, cells % self._size], axis=1)
+
+  def _step_states(self, states, actions):
+    moves = tf.gather(tf.constant(_MOVES, tf.int64), actions)
+    states = tf.clip_by_value(states + moves, 0, self._size - 1)
+    terminated = tf.reduce_all(tf.equal(states, self._size - 1), axis=1)
+    return states, tf.cast(terminated, tf.float32), terminated
+
+  def _observe(self, states):
+    cells = states[:, 0] * self._size + states[:, 1]
+    return tf.one_hot(cells, self._size * self._size, dtype=tf.float32)
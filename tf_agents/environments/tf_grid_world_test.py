@@ -0,0 +1,76 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for tf_agents.environments.tf_grid_world."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+from tf_agents.environments import tf_grid_world
+from tf_agents.environments import time_step as ts
+
+FIRST = ts.StepType.FIRST
+MID = ts.StepType.MID
+LAST = ts.StepType.LAST
+
+RIGHT = 1
+DOWN = 2
+
+
+class GridWorldTest(tf.test.TestCase):
+
+  def testReachGoal(self):
+    size = 3
+    env = tf_grid_world.GridWorld(batch_size=2, size=size)
+    actions = tf.placeholder(tf.int64, [2])
+    next_time_step = env.step(actions)
+    self.evaluate(tf.global_variables_initializer())
+    time_step = self.evaluate(env.current_time_step())
+    self.assertAllEqual([FIRST, FIRST], time_step.step_type)
+    self.assertAllEqual([1, 1], np.sum(time_step.observation, axis=1))
+    # The goal is the last cell.
+    self.assertAllEqual([0, 0], time_step.observation[:, -1])
+
+    # Going right then down reaches the goal from any cell.
+    episode_ended = np.zeros(2, np.bool_)
+    with self.cached_session() as sess:
+      for action in [RIGHT] * (size - 1) + [DOWN] * (size - 1):
+        time_step = sess.run(next_time_step,
+                             {actions: np.full(2, action, np.int64)})
+        episode_ended |= time_step.step_type == LAST
+        self.assertTrue(np.all(
+            (time_step.step_type == LAST) == (time_step.reward == 1)))
+      self.assertTrue(np.all(episode_ended))
+
+      # The environments which reached the goal restart.
+      is_last = time_step.step_type == LAST
+      time_step = sess.run(next_time_step, {actions: np.full(2, DOWN)})
+      self.assertAllEqual(is_last, time_step.step_type == FIRST)
+
+  def testMaxEpisodeSteps(self):
+    env = tf_grid_world.GridWorld(batch_size=4, size=4, max_episode_steps=2)
+    # Moving up or left never reaches the goal.
+    next_time_step = env.step(tf.zeros([4], tf.int64))
+    self.evaluate(tf.global_variables_initializer())
+    step_types = [self.evaluate(next_time_step.step_type) for _ in range(3)]
+    self.assertAllEqual([[MID] * 4, [LAST] * 4, [FIRST] * 4], step_types)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -22,12 +22,15 @@ from __future__ import print_function
 import contextlib
 import threading
 
+import numpy as np
 import tensorflow as tf
 
 from tf_agents.environments import batched_py_environment
 from tf_agents.environments import py_environment
 from tf_agents.environments import tf_environment
 from tf_agents.environments import time_step as ts
+from tf_agents.environments import trajectory
+from tf_agents.policies import py_policy
 from tf_agents.specs import tensor_spec
 
 import tensorflow.contrib.eager as tfe  # TF internal
@@ -208,6 +211,138 @@ class TFPyEnvironment(tf_environment.Base):
       return self._set_names_and_shapes(step_type, reward, discount,
                                         *flat_observations)
 
+  def reset_last(self, time_step):
+    """Returns an op resetting the environments which terminated an episode.
+
+    The environments whose time step is LAST with a zero discount are reset.
+    Truncated episodes, whose LAST time step keeps a non-zero discount, are not
+    reset, so that their boundary step is taken as usual. The batched Python
+    environment must implement `reset_envs(env_ids)`, like the
+    BatchedPyEnvironment unbatched environments are wrapped in.
+
+    Args:
+      time_step: The current `TimeStep` of the environment, e.g. returned by
+        `step`.
+
+    Returns:
+      The `TimeStep` to act on, time_step with the initial time steps of the
+      reset environments in the rows of the terminal LAST time steps.
+    """
+
+    def _reset_last(step_type, discount):
+      with _check_not_called_concurrently(self._lock):
+        env_ids = np.flatnonzero((step_type.numpy() == ts.StepType.LAST) &
+                                 (discount.numpy() == 0))
+        if env_ids.size:
+          reset_time_step = self._env.reset_envs(env_ids)
+          # Copied, the environment may reuse the arrays of its time steps.
+          self._time_step = nest.map_structure(np.array, self._time_step)
+          for array, reset_array in zip(nest.flatten(self._time_step),
+                                        nest.flatten(reset_time_step)):
+            array[env_ids] = reset_array
+        return nest.flatten(self._time_step)
+
+    with tf.name_scope('reset_last', values=[time_step]):
+      outputs = tfe.py_func(
+          _reset_last,
+          [time_step.step_type, time_step.discount],
+          self._time_step_dtypes,
+          name='reset_last_py_func')
+      step_type, reward, discount = outputs[0:3]
+      flat_observations = outputs[3:]
+      return self._set_names_and_shapes(step_type, reward, discount,
+                                        *flat_observations)
+
+  def rollout(self, policy, num_steps, policy_state=()):
+    """Returns a TensorFlow op taking num_steps with a Python policy.
+
+    The policy acts on the environment within a single `py_func` for the
+    num_steps steps, rather than crossing from TF to Python for every step, so
+    that cheap environments are not dominated by the cost of this crossing.
+
+    Args:
+      policy: A `py_policy.Base` acting on batches of time steps of the Python
+        environment.
+      num_steps: The number of steps to take, a Python int.
+      policy_state: The policy state, a Tensor or nest of Tensors matching
+        `policy.policy_state_spec()` with a batch dimension.
+
+    Returns:
+      A tuple (trajectory, time_step, policy_state):
+        trajectory: A `Trajectory` of the num_steps steps, with outer
+          dimensions [batch_size, num_steps].
+        time_step: The `TimeStep` after the last step.
+        policy_state: The policy state after the last step.
+
+    Raises:
+      TypeError: If `policy` is not a subclass of `py_policy.Base`.
+    """
+    if not isinstance(policy, py_policy.Base):
+      raise TypeError('Policy should implement py_policy.Base')
+    policy_state_spec = tensor_spec.from_spec(policy.policy_state_spec())
+    trajectory_spec = trajectory.from_transition(
+        self.time_step_spec(),
+        tensor_spec.from_spec(policy.policy_step_spec()),
+        self.time_step_spec())
+    trajectory_dtypes = [s.dtype for s in nest.flatten(trajectory_spec)]
+    policy_state_dtypes = [s.dtype for s in nest.flatten(policy_state_spec)]
+    num_trajectory_outputs = len(trajectory_dtypes)
+    num_time_step_outputs = len(self._time_step_dtypes)
+
+    def _rollout(*flattened_policy_state):
+      with _check_not_called_concurrently(self._lock):
+        # Copied, since policies may update their state in place.
+        policy_state = nest.pack_sequence_as(
+            structure=policy.policy_state_spec(),
+            flat_sequence=[np.array(x.numpy()) for x in flattened_policy_state])
+        if self._time_step is None:
+          self._time_step = self._env.reset()
+        flat_trajectories = None
+        for i in range(num_steps):
+          action_step = policy.action(self._time_step, policy_state)
+          if not getattr(self._env, 'copy_time_steps', True):
+            # The environment overwrites the arrays of its time step when
+            # stepping, see BatchedPyEnvironment `copy_time_steps`.
+            self._time_step = nest.map_structure(np.array, self._time_step)
+          next_time_step = self._env.step(action_step.action)
+          traj = nest.flatten(trajectory.from_transition(
+              self._time_step, action_step, next_time_step))
+          if flat_trajectories is None:
+            flat_trajectories = [
+                np.empty((x.shape[0], num_steps) + x.shape[1:], x.dtype)
+                for x in traj]
+          # Write the step right away, next_time_step may get overwritten.
+          for out, x in zip(flat_trajectories, traj):
+            out[:, i] = x
+          self._time_step = next_time_step
+          policy_state = action_step.state
+        return (flat_trajectories + nest.flatten(self._time_step) +
+                nest.flatten(policy_state))
+
+    with tf.name_scope('rollout', values=[policy_state]):
+      outputs = tfe.py_func(
+          _rollout,
+          nest.flatten(policy_state),
+          trajectory_dtypes + self._time_step_dtypes + policy_state_dtypes,
+          name='rollout_py_func')
+      flat_trajectory = outputs[:num_trajectory_outputs]
+      flat_time_step = outputs[num_trajectory_outputs:
+                               num_trajectory_outputs + num_time_step_outputs]
+      flat_policy_state = outputs[num_trajectory_outputs +
+                                  num_time_step_outputs:]
+      if not tfe.executing_eagerly():
+        outer_shape = tf.TensorShape([self.batch_size, num_steps])
+        for x, spec in zip(flat_trajectory, nest.flatten(trajectory_spec)):
+          x.set_shape(outer_shape.concatenate(spec.shape))
+        for x, spec in zip(flat_policy_state, nest.flatten(policy_state_spec)):
+          x.set_shape(tf.TensorShape([self.batch_size]).concatenate(
+              spec.shape))
+      traj = nest.pack_sequence_as(trajectory_spec, flat_trajectory)
+      time_step = self._set_names_and_shapes(*flat_time_step)
+      policy_state = nest.pack_sequence_as(policy_state_spec,
+                                           flat_policy_state)
+      return traj, time_step, policy_state
+
   def _set_names_and_shapes(self, step_type, reward, discount,
                             *flat_observations):
     """Returns a `TimeStep` namedtuple."""
@@ -29,6 +29,7 @@ from tf_agents.environments import batched_py_environment
 from tf_agents.environments import py_environment
 from tf_agents.environments import tf_py_environment
 from tf_agents.environments import time_step as ts
+from tf_agents.policies import random_py_policy
 
 nest = tf.contrib.framework.nest
 
@@ -283,6 +284,74 @@ class TFPYEnvironmentTest(tf.test.TestCase, parameterized.TestCase):
 
     self.assertEqual(np.array([0]), observation)
 
+  def testResetLast(self):
+    py_env = PYEnvironmentMock()
+    tf_env = tf_py_environment.TFPyEnvironment(py_env)
+    time_step = tf_env.current_time_step()
+    with tf.control_dependencies([time_step.step_type]):
+      action = tf.constant([1])
+    next_time_step = tf_env.reset_last(tf_env.step(action))
+
+    time_step = self.evaluate(next_time_step)
+    self.assertAllEqual([ts.StepType.MID], time_step.step_type)
+    self.assertEqual(1, py_env.resets)
+
+    # The environment is reset in the step it ends.
+    time_step = self.evaluate(next_time_step)
+    self.assertAllEqual([ts.StepType.FIRST], time_step.step_type)
+    self.assertAllEqual([0.], time_step.reward)
+    self.assertAllEqual([0], time_step.observation)
+    self.assertEqual(2, py_env.resets)
+    self.assertEqual(1, py_env.episodes)
+
+    time_step = self.evaluate(next_time_step)
+    self.assertAllEqual([ts.StepType.MID], time_step.step_type)
+    self.assertEqual(3, py_env.steps)
+
+  @parameterized.named_parameters(
+      ('CopyTimeSteps', True),
+      ('ReuseTimeSteps', False),
+  )
+  def testRollout(self, copy_time_steps):
+    py_envs = [PYEnvironmentMock() for _ in range(3)]
+    batched_py_env = batched_py_environment.BatchedPyEnvironment(
+        py_envs, copy_time_steps=copy_time_steps)
+    tf_env = tf_py_environment.TFPyEnvironment(batched_py_env)
+    policy = random_py_policy.RandomPyPolicy(
+        ts.time_step_spec(batched_py_env.observation_spec()),
+        batched_py_env.action_spec(), outer_dims=(3,))
+    traj, time_step, _ = tf_env.rollout(policy, num_steps=4)
+    self.assertEqual([3, 4], traj.observation.shape.as_list())
+    self.assertEqual([3], time_step.observation.shape.as_list())
+
+    traj, time_step = self.evaluate((traj, time_step))
+    self.assertAllEqual([[ts.StepType.FIRST, ts.StepType.MID,
+                          ts.StepType.LAST, ts.StepType.FIRST]] * 3,
+                        traj.step_type)
+    self.assertAllEqual([[ts.StepType.MID, ts.StepType.LAST,
+                          ts.StepType.FIRST, ts.StepType.MID]] * 3,
+                        traj.next_step_type)
+    self.assertAllEqual([[0, 1, 2, 0]] * 3, traj.observation)
+    self.assertAllEqual([[0., 1., 0., 0.]] * 3, traj.reward)
+    self.assertAllEqual([ts.StepType.MID] * 3, time_step.step_type)
+    self.assertAllEqual([1] * 3, time_step.observation)
+    for i, py_env in enumerate(py_envs):
+      self.assertEqual(4, py_env.steps)
+      self.assertAllEqual(traj.action[i], py_env.actions_taken)
+
+  def testRolloutContinuesFromCurrentTimeStep(self):
+    py_env = PYEnvironmentMock()
+    tf_env = tf_py_environment.TFPyEnvironment(py_env)
+    policy = random_py_policy.RandomPyPolicy(
+        ts.time_step_spec(py_env.observation_spec()), py_env.action_spec(),
+        outer_dims=(1,))
+    time_step = tf_env.current_time_step()
+    with tf.control_dependencies([time_step.step_type]):
+      action = tf.constant([1])
+    self.evaluate(tf_env.step(action))
+    traj, _, _ = self.evaluate(tf_env.rollout(policy, num_steps=2))
+    self.assertAllEqual([[1, 2]], traj.observation)
+
 
 if __name__ == '__main__':
   tf.test.main()
@@ -0,0 +1,189 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Base class for batched environments written in TensorFlow ops.
+
+Like VectorizedPyEnvironment, a TFVectorizedEnvironment steps the states of its
+environments at once, but with TF ops on states held in variables. Stepping
+them doesn't call into Python, e.g. within the tf.while_loop of a
+DynamicStepDriver, so that collection and training can run in a single graph.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import abc
+
+import tensorflow as tf
+
+from tf_agents.environments import tf_environment
+from tf_agents.environments import time_step as ts
+
+nest = tf.contrib.framework.nest
+
+
+class TFVectorizedEnvironment(tf_environment.Base):
+  """Batched TF environment whose subclasses step all the states at once.
+
+  Subclasses implement `_reset_states`, `_step_states` and `_observe` on
+  batches of states, and this class handles the episodes in-graph: the rows
+  which returned a LAST time step are reset by the next `step`, ignoring their
+  action, and episodes end after max_episode_steps like with a TimeLimit
+  wrapper, i.e. with a LAST time step keeping the discount.
+
+  The environments start reset, `current_time_step` returning FIRST time steps
+  once the variables are initialized.
+  """
+
+  def __init__(self, observation_spec, action_spec, state_spec, batch_size,
+               discount=1.0, max_episode_steps=None, scope=None):
+    """Creates the variables of the environment.
+
+    Args:
+      observation_spec: The TensorSpec of the observations.
+      action_spec: The BoundedTensorSpec of the actions.
+      state_spec: The TensorSpec of the state of an environment.
+      batch_size: Number of environments.
+      discount: Discount of the steps which don't terminate the episode.
+      max_episode_steps: Optional number of steps after which the episodes
+        end, 0 or None for no limit.
+      scope: Optional variable scope of the variables, by default the name of
+        the class.
+    """
+    time_step_spec = ts.time_step_spec(observation_spec)
+    super(TFVectorizedEnvironment, self).__init__(
+        time_step_spec, action_spec, batch_size)
+    self._discount = discount
+    self._max_episode_steps = max_episode_steps or 0
+    with tf.variable_scope(scope, default_name=type(self).__name__):
+      self._states = tf.Variable(
+          self._reset_states(batch_size), name='states',
+          dtype=state_spec.dtype)
+      self._episode_steps = tf.Variable(
+          tf.zeros([batch_size], tf.int64), name='episode_steps')
+      # The current time step, the environments which returned a LAST one are
+      # reset by the next step.
+      first_time_step = self._first_time_step(self._states.initialized_value())
+      self._time_step = nest.map_structure(
+          lambda t, spec: tf.Variable(t, name=spec.name or 'time_step'),
+          first_time_step, time_step_spec)
+
+  @abc.abstractmethod
+  def _reset_states(self, num_states):
+    """Returns num_states initial states, as a Tensor with a batch dimension."""
+
+  @abc.abstractmethod
+  def _step_states(self, states, actions):
+    """Steps a batch of states.
+
+    Args:
+      states: The batch of states.
+      actions: The batch of actions.
+
+    Returns:
+      A (next states, reward, terminated) tuple, with one reward and one
+      terminated boolean per state.
+    """
+
+  @abc.abstractmethod
+  def _observe(self, states):
+    """Returns the batch of observations of a batch of states."""
+
+  def _first_time_step(self, states):
+    return ts.TimeStep(
+        tf.fill([self.batch_size], ts.StepType.FIRST),
+        tf.zeros([self.batch_size], tf.float32),
+        tf.ones([self.batch_size], tf.float32),
+        self._observe(states))
+
+  def current_time_step(self):
+    return nest.map_structure(lambda v: v.read_value(), self._time_step)
+
+  def reset(self):
+    states = self._reset_states(self.batch_size)
+    return self._assign(states, tf.zeros([self.batch_size], tf.int64),
+                        self._first_time_step(states))
+
+  def step(self, action):
+    # The action depends on the previous time step, so that the variables are
+    # read after its assignment, e.g. in a tf.while_loop.
+    with tf.control_dependencies(nest.flatten(action)):
+      states = self._states.read_value()
+      episode_steps = self._episode_steps.read_value()
+      restart = tf.equal(self._time_step.step_type.read_value(),
+                         ts.StepType.LAST)
+    next_states, reward, terminated = self._step_states(states, action)
+    # Reset the rows which ended, by mask.
+    next_states = tf.where(restart, self._reset_states(self.batch_size),
+                           next_states)
+    episode_steps = tf.where(restart, tf.zeros_like(episode_steps),
+                             episode_steps + 1)
+    done = terminated
+    if self._max_episode_steps:
+      done |= episode_steps >= self._max_episode_steps
+    done &= ~restart
+    terminated &= ~restart
+    step_type = tf.where(
+        restart, tf.fill([self.batch_size], ts.StepType.FIRST),
+        tf.where(done, tf.fill([self.batch_size], ts.StepType.LAST),
+                 tf.fill([self.batch_size], ts.StepType.MID)))
+    reward = tf.where(restart, tf.zeros([self.batch_size]),
+                      tf.cast(reward, tf.float32))
+    discount = tf.where(terminated, tf.zeros([self.batch_size]),
+                        tf.fill([self.batch_size], float(self._discount)))
+    discount = tf.where(restart, tf.ones([self.batch_size]), discount)
+    time_step = ts.TimeStep(step_type, reward, discount,
+                            self._observe(next_states))
+    return self._assign(next_states, episode_steps, time_step)
+
+  def reset_last(self, time_step):
+    """Resets the environments which terminated an episode, by mask.
+
+    The environments whose time step is LAST with a zero discount are reset.
+    Truncated episodes, whose LAST time step keeps a non-zero discount, are
+    reset by the next `step` as usual.
+
+    Args:
+      time_step: The current `TimeStep` of the environment, e.g. returned by
+        `step`.
+
+    Returns:
+      The `TimeStep` to act on, time_step with the initial time steps of the
+      reset environments in the rows of the terminal LAST time steps, once the
+      variables are assigned.
+    """
+    # Read the variables once time_step is computed, like in `step`.
+    with tf.control_dependencies(nest.flatten(time_step)):
+      states = self._states.read_value()
+      episode_steps = self._episode_steps.read_value()
+    is_terminal = (tf.equal(time_step.step_type, ts.StepType.LAST) &
+                   tf.equal(time_step.discount, 0))
+    states = tf.where(is_terminal, self._reset_states(self.batch_size), states)
+    episode_steps = tf.where(is_terminal, tf.zeros_like(episode_steps),
+                             episode_steps)
+    time_step = nest.map_structure(
+        lambda first, t: tf.where(is_terminal, first, t),
+        self._first_time_step(states), time_step)
+    return self._assign(states, episode_steps, time_step)
+
+  def _assign(self, states, episode_steps, time_step):
+    """Assigns the variables, and returns the time step once assigned."""
+    assigns = [self._states.assign(states),
+               self._episode_steps.assign(episode_steps)]
+    assigns.extend(nest.flatten(nest.map_structure(
+        lambda v, t: v.assign(t), self._time_step, time_step)))
+    with tf.control_dependencies(assigns):
+      return nest.map_structure(tf.identity, time_step)
@@ -0,0 +1,140 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for tf_agents.environments.tf_vectorized_environment."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+from tf_agents.environments import tf_vectorized_environment
+from tf_agents.environments import time_step as ts
+from tf_agents.specs import tensor_spec
+
+FIRST = ts.StepType.FIRST
+MID = ts.StepType.MID
+LAST = ts.StepType.LAST
+
+
+class CountingEnvironment(tf_vectorized_environment.TFVectorizedEnvironment):
+  """Adds the actions to the states, and terminates at 3."""
+
+  def __init__(self, batch_size, **kwargs):
+    spec = tensor_spec.TensorSpec([], tf.int64)
+    super(CountingEnvironment, self).__init__(
+        spec, tensor_spec.BoundedTensorSpec([], tf.int64, 0, 3), spec,
+        batch_size, **kwargs)
+
+  def _reset_states(self, num_states):
+    return tf.zeros([num_states], tf.int64)
+
+  def _step_states(self, states, actions):
+    states += actions
+    return states, tf.cast(states, tf.float32), states >= 3
+
+  def _observe(self, states):
+    return states
+
+
+class TFVectorizedEnvironmentTest(tf.test.TestCase):
+
+  def testStepAndResetByMask(self):
+    env = CountingEnvironment(batch_size=3, discount=0.9)
+    actions = tf.placeholder(tf.int64, [3])
+    next_time_step = env.step(actions)
+    self.evaluate(tf.global_variables_initializer())
+    time_step = self.evaluate(env.current_time_step())
+    self.assertAllEqual([FIRST] * 3, time_step.step_type)
+    self.assertAllEqual([0, 0, 0], time_step.observation)
+
+    with self.cached_session() as sess:
+      time_step = sess.run(next_time_step, {actions: [1, 3, 2]})
+      self.assertAllEqual([MID, LAST, MID], time_step.step_type)
+      self.assertAllEqual([1, 3, 2], time_step.observation)
+      self.assertAllClose([1, 3, 2], time_step.reward)
+      self.assertAllClose([0.9, 0, 0.9], time_step.discount)
+
+      # The second environment restarts, ignoring its action.
+      time_step = sess.run(next_time_step, {actions: [1, 1, 2]})
+      self.assertAllEqual([MID, FIRST, LAST], time_step.step_type)
+      self.assertAllEqual([2, 0, 4], time_step.observation)
+      self.assertAllClose([2, 0, 4], time_step.reward)
+      self.assertAllClose([0.9, 1, 0], time_step.discount)
+      self.assertAllEqual(time_step.step_type,
+                          sess.run(env.current_time_step()).step_type)
+
+  def testResetAndMaxEpisodeSteps(self):
+    env = CountingEnvironment(batch_size=2, max_episode_steps=2)
+    next_time_step = env.step(tf.constant([0, 1], tf.int64))
+    reset_time_step = env.reset()
+    self.evaluate(tf.global_variables_initializer())
+    self.evaluate(next_time_step)
+    time_step = self.evaluate(next_time_step)
+    # Like a TimeLimit wrapper, the discount of the transition is kept.
+    self.assertAllEqual([LAST, LAST], time_step.step_type)
+    self.assertAllClose([1, 1], time_step.discount)
+    time_step = self.evaluate(next_time_step)
+    self.assertAllEqual([FIRST, FIRST], time_step.step_type)
+
+    self.evaluate(next_time_step)
+    time_step = self.evaluate(reset_time_step)
+    self.assertAllEqual([FIRST, FIRST], time_step.step_type)
+    self.assertAllEqual([0, 0], time_step.observation)
+    time_step = self.evaluate(next_time_step)
+    self.assertAllEqual([MID, MID], time_step.step_type)
+
+
+  def testResetLast(self):
+    env = CountingEnvironment(batch_size=3)
+    actions = tf.placeholder(tf.int64, [3])
+    next_time_step = env.reset_last(env.step(actions))
+    self.evaluate(tf.global_variables_initializer())
+
+    with self.cached_session() as sess:
+      # The second environment is reset in the step it ends.
+      time_step = sess.run(next_time_step, {actions: [1, 3, 2]})
+      self.assertAllEqual([MID, FIRST, MID], time_step.step_type)
+      self.assertAllEqual([1, 0, 2], time_step.observation)
+      self.assertAllClose([1, 0, 2], time_step.reward)
+
+      # Its next step belongs to the new episode.
+      time_step = sess.run(next_time_step, {actions: [1, 1, 1]})
+      self.assertAllEqual([MID, MID, FIRST], time_step.step_type)
+      self.assertAllEqual([2, 1, 0], time_step.observation)
+      self.assertAllEqual(time_step.step_type,
+                          sess.run(env.current_time_step()).step_type)
+
+  def testResetLastKeepsTruncatedEpisodes(self):
+    env = CountingEnvironment(batch_size=2, max_episode_steps=2)
+    actions = tf.placeholder(tf.int64, [2])
+    next_time_step = env.reset_last(env.step(actions))
+    self.evaluate(tf.global_variables_initializer())
+
+    with self.cached_session() as sess:
+      time_step = sess.run(next_time_step, {actions: [0, 3]})
+      self.assertAllEqual([MID, FIRST], time_step.step_type)
+
+      # The first episode is truncated, and takes its boundary step.
+      time_step = sess.run(next_time_step, {actions: [0, 0]})
+      self.assertAllEqual([LAST, MID], time_step.step_type)
+      self.assertAllClose([1, 1], time_step.discount)
+      time_step = sess.run(next_time_step, {actions: [1, 1]})
+      self.assertAllEqual([FIRST, LAST], time_step.step_type)
+      self.assertAllEqual([0, 1], time_step.observation)
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -399,6 +399,30 @@ def from_episode(observation, action, policy_info, reward, discount=None):
 
 
 def from_transition(time_step, action_step, next_time_step):
+  """Returns a `Trajectory` given transitions.
+
+  `from_transition` is used by a driver to convert sequence of transitions into
+  a `Trajectory` for efficient storage. Then an agent (e.g.
+  `ppo_agent.PPOAgent`) converts it back to transitions by invoking
+  `to_transition`.
+
+  When `time_step` is LAST and `next_time_step` is FIRST, the result is a
+  boundary trajectory. Its action and policy_info are not used by agents, so
+  `action_step` may be any action step of the right spec, e.g. the one which
+  led to `time_step` when the environment was reset without acting on the LAST
+  time step.
+
+  Args:
+    time_step: A `time_step.TimeStep` representing the first step in a
+      transition.
+    action_step: A `policy_step.PolicyStep` representing actions corresponding
+      to observations from time_step.
+    next_time_step: A `time_step.TimeStep` representing the second step in a
+      transition.
+
+  Returns:
+    A `Trajectory`.
+  """
   return Trajectory(
       step_type=time_step.step_type,
       observation=time_step.observation,
@@ -0,0 +1,191 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Vectorized versions of the gym classic control environments.
+
+The dynamics, rewards, terminations and episode lengths match the ones of the
+gym environments loaded by `suite_gym.load`, with the same specs.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+from tf_agents.environments import vectorized_py_environment
+from tf_agents.specs import array_spec
+import gin.tf
+
+
+@gin.configurable
+class CartPole(vectorized_py_environment.VectorizedPyEnvironment):
+  """Vectorized CartPole-v0, or CartPole-v1 with max_episode_steps=500."""
+
+  _GRAVITY = 9.8
+  _MASS_CART = 1.0
+  _MASS_POLE = 0.1
+  _TOTAL_MASS = _MASS_CART + _MASS_POLE
+  # Half of the pole length.
+  _LENGTH = 0.5
+  _POLE_MASS_LENGTH = _MASS_POLE * _LENGTH
+  _FORCE_MAG = 10.0
+  # Seconds between state updates.
+  _TAU = 0.02
+  _THETA_THRESHOLD = 12 * 2 * np.pi / 360
+  _X_THRESHOLD = 2.4
+
+  def __init__(self, batch_size, discount=1.0, max_episode_steps=200,
+               seed=None):
+    super(CartPole, self).__init__(batch_size, discount, max_episode_steps,
+                                   seed)
+    high = np.array([self._X_THRESHOLD * 2, np.finfo(np.float32).max,
+                     self._THETA_THRESHOLD * 2, np.finfo(np.float32).max],
+                    dtype=np.float32)
+    self._observation_spec = array_spec.BoundedArraySpec(
+        (4,), np.float32, minimum=-high, maximum=high)
+    self._action_spec = array_spec.BoundedArraySpec(
+        (), np.int64, minimum=0, maximum=1)
+
+  def observation_spec(self):
+    return self._observation_spec
+
+  def action_spec(self):
+    return self._action_spec
+
+  def _reset_states(self, num_states):
+    return self._rng.uniform(low=-0.05, high=0.05, size=(num_states, 4))
+
+  def _step_states(self, states, actions):
+    x, x_dot, theta, theta_dot = states.T
+    force = np.where(actions == 1, self._FORCE_MAG, -self._FORCE_MAG)
+    costheta = np.cos(theta)
+    sintheta = np.sin(theta)
+    temp = (force + self._POLE_MASS_LENGTH * theta_dot * theta_dot * sintheta
+           ) / self._TOTAL_MASS
+    thetaacc = (self._GRAVITY * sintheta - costheta * temp) / (
+        self._LENGTH * (4.0 / 3.0 - self._MASS_POLE * costheta * costheta /
+                        self._TOTAL_MASS))
+    xacc = temp - self._POLE_MASS_LENGTH * thetaacc * costheta / (
+        self._TOTAL_MASS)
+    states = np.stack([x + self._TAU * x_dot,
+                       x_dot + self._TAU * xacc,
+                       theta + self._TAU * theta_dot,
+                       theta_dot + self._TAU * thetaacc], axis=1)
+    x, theta = states[:, 0], states[:, 2]
+    terminated = ((np.abs(x) > self._X_THRESHOLD) |
+                  (np.abs(theta) > self._THETA_THRESHOLD))
+    return states, np.ones(len(states)), terminated
+
+  def _observe(self, states):
+    return states.astype(np.float32)
+
+
+@gin.configurable
+class Pendulum(vectorized_py_environment.VectorizedPyEnvironment):
+  """Vectorized Pendulum-v0."""
+
+  _MAX_SPEED = 8.
+  _MAX_TORQUE = 2.
+  _DT = .05
+  _GRAVITY = 10.
+  _MASS = 1.
+  _LENGTH = 1.
+
+  def __init__(self, batch_size, discount=1.0, max_episode_steps=200,
+               seed=None):
+    super(Pendulum, self).__init__(batch_size, discount, max_episode_steps,
+                                   seed)
+    high = np.array([1., 1., self._MAX_SPEED], dtype=np.float32)
+    self._observation_spec = array_spec.BoundedArraySpec(
+        (3,), np.float32, minimum=-high, maximum=high)
+    self._action_spec = array_spec.BoundedArraySpec(
+        (1,), np.float32, minimum=-self._MAX_TORQUE, maximum=self._MAX_TORQUE)
+
+  def observation_spec(self):
+    return self._observation_spec
+
+  def action_spec(self):
+    return self._action_spec
+
+  def _reset_states(self, num_states):
+    high = np.array([np.pi, 1])
+    return self._rng.uniform(low=-high, high=high, size=(num_states, 2))
+
+  def _step_states(self, states, actions):
+    th, thdot = states.T
+    u = np.clip(actions[:, 0], -self._MAX_TORQUE, self._MAX_TORQUE)
+    angle = ((th + np.pi) % (2 * np.pi)) - np.pi
+    costs = angle ** 2 + .1 * thdot ** 2 + .001 * (u ** 2)
+    newthdot = thdot + (
+        -3 * self._GRAVITY / (2 * self._LENGTH) * np.sin(th + np.pi) +
+        3. / (self._MASS * self._LENGTH ** 2) * u) * self._DT
+    newth = th + newthdot * self._DT
+    newthdot = np.clip(newthdot, -self._MAX_SPEED, self._MAX_SPEED)
+    states = np.stack([newth, newthdot], axis=1)
+    return states, -costs, np.zeros(len(states), np.bool_)
+
+  def _observe(self, states):
+    th, thdot = states.T
+    return np.stack([np.cos(th), np.sin(th), thdot], axis=1).astype(np.float32)
+
+
+@gin.configurable
+class MountainCar(vectorized_py_environment.VectorizedPyEnvironment):
+  """Vectorized MountainCar-v0."""
+
+  _MIN_POSITION = -1.2
+  _MAX_POSITION = 0.6
+  _MAX_SPEED = 0.07
+  _GOAL_POSITION = 0.5
+  _FORCE = 0.001
+  _GRAVITY = 0.0025
+
+  def __init__(self, batch_size, discount=1.0, max_episode_steps=200,
+               seed=None):
+    super(MountainCar, self).__init__(batch_size, discount, max_episode_steps,
+                                      seed)
+    self._observation_spec = array_spec.BoundedArraySpec(
+        (2,), np.float32,
+        minimum=np.array([self._MIN_POSITION, -self._MAX_SPEED], np.float32),
+        maximum=np.array([self._MAX_POSITION, self._MAX_SPEED], np.float32))
+    self._action_spec = array_spec.BoundedArraySpec(
+        (), np.int64, minimum=0, maximum=2)
+
+  def observation_spec(self):
+    return self._observation_spec
+
+  def action_spec(self):
+    return self._action_spec
+
+  def _reset_states(self, num_states):
+    return np.stack([self._rng.uniform(low=-0.6, high=-0.4, size=num_states),
+                     np.zeros(num_states)], axis=1)
+
+  def _step_states(self, states, actions):
+    position, velocity = states.T
+    velocity = velocity + (actions - 1) * self._FORCE + np.cos(
+        3 * position) * (-self._GRAVITY)
+    velocity = np.clip(velocity, -self._MAX_SPEED, self._MAX_SPEED)
+    position = np.clip(position + velocity, self._MIN_POSITION,
+                       self._MAX_POSITION)
+    velocity = np.where((position == self._MIN_POSITION) & (velocity < 0), 0.,
+                        velocity)
+    states = np.stack([position, velocity], axis=1)
+    terminated = position >= self._GOAL_POSITION
+    return states, -np.ones(len(states)), terminated
+
+  def _observe(self, states):
+    return states.astype(np.float32)
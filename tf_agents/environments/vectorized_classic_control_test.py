@@ -0,0 +1,93 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the vectorized classic control environments against the gym ones."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from absl.testing import parameterized
+import gym
+import numpy as np
+import tensorflow as tf
+
+from tf_agents.environments import suite_gym
+from tf_agents.environments import vectorized_classic_control
+from tf_agents.specs import array_spec
+
+
+class VectorizedClassicControlTest(parameterized.TestCase, tf.test.TestCase):
+
+  @parameterized.named_parameters(
+      ('CartPole', vectorized_classic_control.CartPole, 'CartPole-v0'),
+      ('Pendulum', vectorized_classic_control.Pendulum, 'Pendulum-v0'),
+      ('MountainCar', vectorized_classic_control.MountainCar,
+       'MountainCar-v0'),
+  )
+  def testMatchesGym(self, env_class, env_name):
+    batch_size = 64
+    env = env_class(batch_size, seed=0)
+    gym_env = suite_gym.load(env_name)
+    self.assertEqual(gym_env.observation_spec(), env.observation_spec())
+    self.assertEqual(gym_env.action_spec(), env.action_spec())
+    self.assertEqual(gym_env.time_step_spec(), env.time_step_spec())
+
+    # Step the same states and actions with the unwrapped gym environment.
+    unwrapped_env = gym.make(env_name).unwrapped
+    rng = np.random.RandomState(0)
+    states = env._reset_states(batch_size)
+    for _ in range(20):
+      actions = np.stack([
+          array_spec.sample_bounded_spec(env.action_spec(), rng)
+          for _ in range(batch_size)])
+      next_states, rewards, terminated = env._step_states(states, actions)
+      observations = env._observe(next_states)
+      for i in range(batch_size):
+        # Resetting clears the end of episode of CartPole.
+        unwrapped_env.reset()
+        unwrapped_env.state = states[i].copy()
+        observation, reward, done, _ = unwrapped_env.step(actions[i])
+        self.assertAllClose(observation, observations[i], atol=1e-5)
+        self.assertAllClose(reward, rewards[i], atol=1e-5)
+        self.assertEqual(done, terminated[i])
+      states = np.where(terminated[:, None], env._reset_states(batch_size),
+                        next_states)
+
+  @parameterized.named_parameters(
+      ('CartPole', vectorized_classic_control.CartPole),
+      ('Pendulum', vectorized_classic_control.Pendulum),
+      ('MountainCar', vectorized_classic_control.MountainCar),
+  )
+  def testEpisodes(self, env_class):
+    batch_size = 4096
+    env = env_class(batch_size, max_episode_steps=50, seed=0)
+    rng = np.random.RandomState(0)
+    time_step = env.reset()
+    num_episodes = 0
+    for _ in range(101):
+      actions = array_spec.sample_spec_nest(
+          env.action_spec(), rng, outer_dims=(batch_size,))
+      time_step = env.step(actions)
+      self.assertTrue(array_spec.check_arrays_nest(
+          time_step.observation, array_spec.add_outer_dims_nest(
+              env.observation_spec(), (batch_size,))))
+      num_episodes += np.sum(time_step.is_last())
+    # Each environment ends at least one episode every 50 steps.
+    self.assertGreaterEqual(num_episodes, 2 * batch_size)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -0,0 +1,147 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Base class for batched environments stepping all their states at once.
+
+Rather than stepping B environments one after another, like
+BatchedPyEnvironment, a VectorizedPyEnvironment holds the states of its B
+environments in arrays with a batch dimension, and steps them with NumPy
+operations on these arrays.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import abc
+
+import numpy as np
+
+from tf_agents.environments import py_environment
+from tf_agents.environments import time_step as ts
+
+
+class VectorizedPyEnvironment(py_environment.Base):
+  """Batched environment whose subclasses step all the states at once.
+
+  Subclasses implement `_reset_states`, `_step_states` and `_observe` on
+  batches of states, and this class handles the episodes: the rows which
+  returned a LAST time step are reset by the next `step`, ignoring their
+  action, and episodes end after max_episode_steps like with a TimeLimit
+  wrapper, i.e. with a LAST time step keeping the discount.
+  """
+
+  def __init__(self, batch_size, discount=1.0, max_episode_steps=None,
+               seed=None):
+    """Initializes the environment.
+
+    Args:
+      batch_size: Number of environments.
+      discount: Discount of the steps which don't terminate the episode.
+      max_episode_steps: Optional number of steps after which the episodes
+        end, 0 or None for no limit.
+      seed: Optional seed of the random number generator.
+    """
+    self._batch_size = batch_size
+    self._discount = np.float32(discount)
+    self._max_episode_steps = max_episode_steps or 0
+    self._rng = np.random.RandomState(seed)
+    self._states = None
+    self._episode_steps = np.zeros(batch_size, np.int64)
+    # Rows which returned a LAST time step, and are reset by the next step.
+    self._done = np.ones(batch_size, np.bool_)
+
+  @property
+  def batched(self):
+    return True
+
+  @property
+  def batch_size(self):
+    return self._batch_size
+
+  @abc.abstractmethod
+  def _reset_states(self, num_states):
+    """Returns num_states initial states, in arrays with a batch dimension."""
+
+  @abc.abstractmethod
+  def _step_states(self, states, actions):
+    """Steps a batch of states.
+
+    Args:
+      states: The batch of states, which may be updated in place.
+      actions: The batch of actions.
+
+    Returns:
+      A (next states, reward, terminated) tuple, with one reward and one
+      terminated boolean per state.
+    """
+
+  @abc.abstractmethod
+  def _observe(self, states):
+    """Returns the batch of observations of a batch of states."""
+
+  def reset(self):
+    self._states = self._reset_states(self._batch_size)
+    self._episode_steps[:] = 0
+    self._done[:] = False
+    return ts.TimeStep(
+        np.full(self._batch_size, ts.StepType.FIRST, np.int32),
+        np.zeros(self._batch_size, np.float32),
+        np.ones(self._batch_size, np.float32),
+        self._observe(self._states))
+
+  def reset_envs(self, env_ids):
+    """Resets some of the environments, e.g. the ones which returned LAST.
+
+    Args:
+      env_ids: Ids of the environments to reset, in [0, batch_size).
+
+    Returns:
+      The batched initial time steps of the environments.
+    """
+    if self._states is None:
+      self.reset()
+    num_envs = len(env_ids)
+    self._states[env_ids] = self._reset_states(num_envs)
+    self._episode_steps[env_ids] = 0
+    self._done[env_ids] = False
+    return ts.TimeStep(
+        np.full(num_envs, ts.StepType.FIRST, np.int32),
+        np.zeros(num_envs, np.float32),
+        np.ones(num_envs, np.float32),
+        self._observe(self._states[env_ids]))
+
+  def step(self, action):
+    if self._states is None:
+      return self.reset()
+    restart = self._done
+    self._states, reward, terminated = self._step_states(self._states, action)
+    self._episode_steps += 1
+    truncated = self._episode_steps >= (self._max_episode_steps or np.inf)
+    if np.any(restart):
+      # Reset the rows which ended, by mask.
+      initial_states = self._reset_states(np.sum(restart))
+      self._states[restart] = initial_states
+      self._episode_steps[restart] = 0
+    self._done = (terminated | truncated) & ~restart
+    step_type = np.where(
+        restart, ts.StepType.FIRST,
+        np.where(self._done, ts.StepType.LAST, ts.StepType.MID)).astype(
+            np.int32)
+    reward = np.where(restart, 0., reward).astype(np.float32)
+    discount = np.where(terminated & ~restart, 0., self._discount).astype(
+        np.float32)
+    discount[restart] = 1.
+    return ts.TimeStep(step_type, reward, discount, self._observe(self._states))
@@ -0,0 +1,106 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for tf_agents.environments.vectorized_py_environment."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+from tf_agents.environments import time_step as ts
+from tf_agents.environments import vectorized_py_environment
+from tf_agents.specs import array_spec
+
+FIRST = ts.StepType.FIRST
+MID = ts.StepType.MID
+LAST = ts.StepType.LAST
+
+
+class CountingEnvironment(vectorized_py_environment.VectorizedPyEnvironment):
+  """Adds the actions to the states, and terminates at 3."""
+
+  def observation_spec(self):
+    return array_spec.ArraySpec((), np.int64)
+
+  def action_spec(self):
+    return array_spec.BoundedArraySpec((), np.int64, minimum=0, maximum=3)
+
+  def _reset_states(self, num_states):
+    return np.zeros(num_states, np.int64)
+
+  def _step_states(self, states, actions):
+    states = states + actions
+    return states, states.astype(np.float32), states >= 3
+
+  def _observe(self, states):
+    return states.copy()
+
+
+class VectorizedPyEnvironmentTest(tf.test.TestCase):
+
+  def testStepAndResetByMask(self):
+    env = CountingEnvironment(batch_size=3, discount=0.9)
+    self.assertTrue(env.batched)
+    self.assertEqual(3, env.batch_size)
+    time_step = env.step(np.array([1, 1, 1]))
+    self.assertAllEqual([FIRST] * 3, time_step.step_type)
+    self.assertAllEqual([0, 0, 0], time_step.observation)
+
+    time_step = env.step(np.array([1, 3, 2]))
+    self.assertAllEqual([MID, LAST, MID], time_step.step_type)
+    self.assertAllEqual([1, 3, 2], time_step.observation)
+    self.assertAllClose([1, 3, 2], time_step.reward)
+    self.assertAllClose([0.9, 0, 0.9], time_step.discount)
+
+    # The second environment restarts, ignoring its action.
+    time_step = env.step(np.array([1, 1, 2]))
+    self.assertAllEqual([MID, FIRST, LAST], time_step.step_type)
+    self.assertAllEqual([2, 0, 4], time_step.observation)
+    self.assertAllClose([2, 0, 4], time_step.reward)
+    self.assertAllClose([0.9, 1, 0], time_step.discount)
+
+  def testResetEnvs(self):
+    env = CountingEnvironment(batch_size=3)
+    env.reset()
+    time_step = env.step(np.array([3, 1, 3]))
+    self.assertAllEqual([LAST, MID, LAST], time_step.step_type)
+    time_step = env.reset_envs(np.array([0, 2]))
+    self.assertAllEqual([FIRST, FIRST], time_step.step_type)
+    self.assertAllEqual([0, 0], time_step.observation)
+
+    # The reset environments step their new episode right away.
+    time_step = env.step(np.array([1, 1, 2]))
+    self.assertAllEqual([MID, MID, MID], time_step.step_type)
+    self.assertAllEqual([1, 2, 2], time_step.observation)
+
+  def testMaxEpisodeSteps(self):
+    env = CountingEnvironment(batch_size=2, max_episode_steps=2)
+    env.reset()
+    env.step(np.array([0, 1]))
+    time_step = env.step(np.array([0, 1]))
+    # Like a TimeLimit wrapper, the discount of the transition is kept.
+    self.assertAllEqual([LAST, LAST], time_step.step_type)
+    self.assertAllClose([1, 1], time_step.discount)
+    time_step = env.step(np.array([0, 1]))
+    self.assertAllEqual([FIRST, FIRST], time_step.step_type)
+    time_step = env.step(np.array([0, 1]))
+    self.assertAllEqual([MID, MID], time_step.step_type)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -27,6 +27,8 @@ import tensorflow as tf
 from tf_agents.metrics import py_metric
 from tf_agents.utils import nest_utils
 
+nest = tf.contrib.framework.nest
+
 
 class NumpyDeque(tf.contrib.checkpoint.NumpyState):
   """Deque implementation using a numpy array as a circular buffer."""
@@ -118,16 +120,29 @@ class StreamingMetric(py_metric.PyStepMetric,
     """Call with trajectory always batched."""
 
   def call(self, trajectory):
+    """Processes a trajectory, or a chunk of steps, to update the metric.
+
+    Args:
+      trajectory: A trajectory.Trajectory, unbatched, batched with shape
+        [batch_size], or a chunk of consecutive steps with shape [batch_size,
+        T] such as the ones passed to the chunk observers of a PyDriver.
+    """
     if not self._batch_size:
       if trajectory.step_type.ndim == 0:
         self._batch_size = 1
       else:
-        assert trajectory.step_type.ndim == 1
+        assert trajectory.step_type.ndim in (1, 2)
         self._batch_size = trajectory.step_type.shape[0]
       self.reset()
     if trajectory.step_type.ndim == 0:
       trajectory = nest_utils.batch_nested_array(trajectory)
-    self._batched_call(trajectory)
+    if trajectory.step_type.ndim == 2:
+      for t in range(trajectory.step_type.shape[1]):
+        self._batched_call(nest.map_structure(
+            lambda x: x[:, t],  # pylint: disable=cell-var-from-loop
+            trajectory))
+    else:
+      self._batched_call(trajectory)
 
 
 class AverageReturnMetric(StreamingMetric):
@@ -29,6 +29,8 @@ from tf_agents.environments import trajectory
 from tf_agents.metrics import py_metrics
 from tf_agents.utils import nest_utils
 
+nest = tf.contrib.framework.nest
+
 
 class PyMetricsTest(tf.test.TestCase, parameterized.TestCase):
 
@@ -154,6 +156,36 @@ class PyMetricsTest(tf.test.TestCase, parameterized.TestCase):
         trajectory.first((), (), (), 1., 1.)]))
     self.assertEqual(metric.result(), 5.0)
 
+  @parameterized.named_parameters(
+      ('AverageReturnMetric', py_metrics.AverageReturnMetric, 5.0),
+      ('AverageEpisodeLengthMetric', py_metrics.AverageEpisodeLengthMetric,
+       2.5),
+      ('EnvironmentSteps', py_metrics.EnvironmentSteps, 6.0),
+      ('NumberOfEpisodes', py_metrics.NumberOfEpisodes, 2.0))
+  def testChunk(self, metric_class, expected_result):
+    metric = metric_class()
+
+    steps = [
+        nest_utils.stack_nested_arrays([
+            trajectory.boundary((), (), (), 0., 1.),
+            trajectory.boundary((), (), (), 0., 1.)]),
+        nest_utils.stack_nested_arrays([
+            trajectory.first((), (), (), 1., 1.),
+            trajectory.first((), (), (), 1., 1.)]),
+        nest_utils.stack_nested_arrays([
+            trajectory.mid((), (), (), 2., 1.),
+            trajectory.last((), (), (), 3., 0.)]),
+        nest_utils.stack_nested_arrays([
+            trajectory.last((), (), (), 3., 0.),
+            trajectory.boundary((), (), (), 0., 1.)]),
+        nest_utils.stack_nested_arrays([
+            trajectory.boundary((), (), (), 0., 1.),
+            trajectory.first((), (), (), 1., 1.)]),
+    ]
+    # The steps of both batch entries, with shape [2, 5].
+    metric(nest.map_structure(lambda *x: np.stack(x, axis=1), *steps))
+    self.assertEqual(expected_result, metric.result())
+
   def testCounterMetricIncrements(self):
     counter = py_metrics.CounterMetric()
 
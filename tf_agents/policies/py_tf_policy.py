@@ -68,6 +68,9 @@ class PyTFPolicy(py_policy.Base, session_utils.SessionUser):
     self._batched = None
     self._seed = seed
     self._built = False
+    # Placeholders and op assigning the variables of the TF policy.
+    self._weights = None
+    self._assign_weights = None
 
   def initialize(self, batch_size):
     if self._built:
@@ -93,6 +96,33 @@ class PyTFPolicy(py_policy.Base, session_utils.SessionUser):
 
     self._built = True
 
+  def set_weights(self, weights):
+    """Assigns values to the variables of the TF policy.
+
+    Args:
+      weights: List of arrays, one per variable of the TF policy in the order
+        of its `variables()`, e.g. the values of the variables of the same
+        policy in a learner.
+
+    Raises:
+      RuntimeError: If the policy is not initialized yet, since initializing it
+        initializes the variables.
+      ValueError: If the number of weights doesn't match the variables.
+    """
+    if not self._built:
+      raise RuntimeError('set_weights() called before initialize().')
+    variables = self._tf_policy.variables()
+    if len(weights) != len(variables):
+      raise ValueError('Expected {} weights, got {}.'.format(
+          len(variables), len(weights)))
+    if self._assign_weights is None:
+      self._weights = [
+          tf.placeholder(v.dtype.base_dtype, v.shape, name='weights')
+          for v in variables]
+      self._assign_weights = tf.group(
+          *[v.assign(w) for v, w in zip(variables, self._weights)])
+    self.session.run(self._assign_weights, dict(zip(self._weights, weights)))
+
   def _build_from_time_step(self, time_step):
     outer_shape = nest_utils.get_outer_array_shape(
         time_step, self._time_step_spec)
@@ -177,6 +177,28 @@ class PyTFPolicyTest(tf.test.TestCase, parameterized.TestCase):
         self.assertIn(a, (0, 1))
       self.assertAllEqual(action_steps.state, np.zeros([5, 1]))
 
+  def testSetWeights(self):
+    tf_policy = q_policy.QPolicy(
+        self._time_step_spec,
+        self._action_spec,
+        q_network=DummyNet(stateful=False))
+    policy = py_tf_policy.PyTFPolicy(tf_policy)
+    time_step = ts.restart(np.array([1, 2], dtype=np.float32))
+
+    with self.test_session():
+      with self.assertRaises(RuntimeError):
+        policy.set_weights([])
+      policy.initialize(None)
+      # The Q-values become the bias, so that the actions are almost surely
+      # the ones with the large logit.
+      kernel = np.zeros([2, 2], dtype=np.float32)
+      policy.set_weights([kernel, np.array([-100, 100], dtype=np.float32)])
+      self.assertEqual(1, policy.action(time_step).action)
+      policy.set_weights([kernel, np.array([100, -100], dtype=np.float32)])
+      self.assertEqual(0, policy.action(time_step).action)
+      with self.assertRaises(ValueError):
+        policy.set_weights([kernel])
+
 
 if __name__ == '__main__':
   tf.test.main()
@@ -18,6 +18,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import os
+
 import numpy as np
 import tensorflow as tf
 
@@ -25,6 +27,8 @@ from tf_agents.specs import array_spec
 
 nest = tf.contrib.framework.nest
 
+_METADATA_FILENAME = 'metadata.npy'
+
 
 class NumpyStorage(tf.contrib.checkpoint.Checkpointable):
   """A class to store nested objects in a collection of numpy arrays.
@@ -56,11 +60,16 @@ class NumpyStorage(tf.contrib.checkpoint.Checkpointable):
                        'array_spec.ArraySpec. Got: {}'.format(data_spec))
     self._data_spec = data_spec
     self._flat_specs = nest.flatten(data_spec)
-    self._np_state = tf.contrib.checkpoint.NumpyState()
 
     self._buf_names = tf.contrib.checkpoint.NoDependency([])
     for idx in range(len(self._flat_specs)):
       self._buf_names.append('buffer{}'.format(idx))
+    self._init_buffers()
+
+  def _init_buffers(self):
+    """Sets up the state holding the numpy arrays, before they are created."""
+    self._np_state = tf.contrib.checkpoint.NumpyState()
+    for idx in range(len(self._flat_specs)):
       # Set each buffer to a sentinel value (real buffers will never be
       # scalars) rather than a real value so that if they are restored from
       # checkpoint, we don't end up double-initializing. We don't leave them
@@ -85,8 +94,145 @@ class NumpyStorage(tf.contrib.checkpoint.Checkpointable):
       encoded_item.append(self._array(buf_idx)[idx])
     return nest.pack_sequence_as(self._data_spec, encoded_item)
 
+  def get_fields(self, idx, field_indices):
+    """Get the values of some fields stored at idx.
+
+    Args:
+      idx: Index or array of indices to read.
+      field_indices: List of indices of fields in the flattened data_spec.
+
+    Returns:
+      A list of the values of the fields, in the order of field_indices.
+    """
+    return [self._array(buf_idx)[idx] for buf_idx in field_indices]
+
   def set(self, table_idx, value):
     """Set table_idx to value."""
     for nest_idx, element in enumerate(nest.flatten(value)):
       self._array(nest_idx)[table_idx] = element
 
+  def read_metadata(self):
+    """Returns the metadata persisted along with the data, if any.
+
+    Returns:
+      A dict of int metadata values, or None. In-memory storage does not
+      persist anything outside of checkpoints and always returns None.
+    """
+    return None
+
+  def write_metadata(self, **metadata):
+    """Persists int metadata values along with the data, if supported."""
+    del metadata  # Unused.
+
+
+class MemmapStorage(NumpyStorage):
+  """A NumpyStorage backed by memory-mapped files in a directory.
+
+  Each flattened field of the data_spec is stored in its own `.npy` file,
+  which is memory-mapped rather than allocated in RAM. Pages are only read from
+  disk when rows are accessed, so the storage can be larger than RAM and
+  sampling only touches the rows it reads.
+
+  The content of the files is not serialized in checkpoints. Instead, reopening
+  a directory that already holds files for the same data_spec and capacity
+  reuses their content, along with the metadata written by the owner of the
+  storage (see `write_metadata`), which allows warm starting a replay buffer
+  without restoring a checkpoint.
+  """
+
+  def __init__(self, data_spec, capacity, directory):
+    """Creates a MemmapStorage object.
+
+    Args:
+      data_spec: An ArraySpec or a list/tuple/nest of ArraySpecs describing a
+        single item that can be stored in this table.
+      capacity: The maximum number of items that can be stored in the buffer.
+      directory: Directory holding the memory-mapped files. It is created if it
+        does not exist.
+
+    Raises:
+      ValueError: If data_spec is not an instance or nest of ArraySpecs.
+    """
+    self._directory = directory
+    super(MemmapStorage, self).__init__(data_spec, capacity)
+
+  @property
+  def directory(self):
+    return self._directory
+
+  def _init_buffers(self):
+    if not os.path.isdir(self._directory):
+      os.makedirs(self._directory)
+    self._arrays = tf.contrib.checkpoint.NoDependency(
+        [None] * len(self._flat_specs))
+    self._metadata = None
+
+  def _open_memmap(self, filename, dtype, shape):
+    """Opens a memory-mapped .npy file, creating it if it does not exist."""
+    path = os.path.join(self._directory, filename)
+    if not os.path.exists(path):
+      return np.lib.format.open_memmap(
+          path, mode='w+', dtype=dtype, shape=shape)
+    array = np.lib.format.open_memmap(path, mode='r+')
+    if array.dtype != dtype or array.shape != shape:
+      raise ValueError(
+          'Existing file {} has dtype {} and shape {}, but dtype {} and shape '
+          '{} are expected.'.format(path, array.dtype, array.shape, dtype,
+                                    shape))
+    return array
+
+  def _array(self, index):
+    """Opens or retrieves one of the memory-mapped arrays of the storage."""
+    array = self._arrays[index]
+    if array is None:
+      spec = self._flat_specs[index]
+      array = self._open_memmap(
+          '{}.npy'.format(self._buf_names[index]), np.dtype(spec.dtype),
+          (self._capacity,) + tuple(spec.shape))
+      self._arrays[index] = array
+    return array
+
+  def get(self, idx):
+    """Get value stored at idx."""
+    # Return plain arrays rather than np.memmap instances.
+    return nest.map_structure(np.asarray, super(MemmapStorage, self).get(idx))
+
+  def get_fields(self, idx, field_indices):
+    """Get the values of some fields stored at idx."""
+    return [np.asarray(value) for value in
+            super(MemmapStorage, self).get_fields(idx, field_indices)]
+
+  def read_metadata(self):
+    """Returns the metadata found in the directory, or None."""
+    path = os.path.join(self._directory, _METADATA_FILENAME)
+    if self._metadata is None and os.path.exists(path):
+      self._metadata = np.lib.format.open_memmap(path, mode='r+')
+    if self._metadata is None:
+      return None
+    return {name: int(self._metadata[name])
+            for name in self._metadata.dtype.names}
+
+  def write_metadata(self, **metadata):
+    """Persists int metadata values in the directory.
+
+    The metadata file is memory-mapped as well, so this is cheap enough to be
+    called after every write.
+
+    Args:
+      **metadata: Int values to persist. The same names must be used every
+        time.
+    """
+    if self._metadata is None:
+      dtype = np.dtype([(name, np.int64) for name in sorted(metadata)])
+      self._metadata = self._open_memmap(_METADATA_FILENAME, dtype, ())
+    for name, value in metadata.items():
+      self._metadata[name] = value
+
+  def flush(self):
+    """Writes any changes of the memory-mapped arrays to disk."""
+    for array in self._arrays:
+      if array is not None:
+        array.flush()
+    if self._metadata is not None:
+      self._metadata.flush()
+
@@ -0,0 +1,194 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Uniform replay buffer in Python storing each stacked frame once.
+
+PyFrameStackReplayBuffer is a flavor of PyUniformReplayBuffer for observations
+made of stacked frames (e.g. produced by `atari_wrappers.FrameStack4`). Only the
+newest frame of each observation is stored, in the contiguous storage arrays
+along with the rest of the trajectory, and the stacks are rebuilt at sampling
+time from the frames of the previous items.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import threading
+
+import numpy as np
+import tensorflow as tf
+
+from tf_agents.environments import trajectory
+from tf_agents.replay_buffers import numpy_storage
+from tf_agents.replay_buffers import py_uniform_replay_buffer
+from tf_agents.specs import array_spec
+from tf_agents.utils import nest_utils
+
+nest = tf.contrib.framework.nest
+
+# Value of the last history when the items before the next one were skipped.
+_SKIPPED_ITEMS = -2
+
+
+class PyFrameStackReplayBuffer(py_uniform_replay_buffer.PyUniformReplayBuffer):
+  """A Python-based replay buffer storing stacked frames only once.
+
+  Observations are stacks of frames along their last axis, e.g. [84, 84, 4],
+  where each observation drops the oldest frame of the previous one and appends
+  a new frame. The buffer stores only the new frame of each item, along with the
+  number of previous items (its history) whose frames complete its stack. Older
+  frames, e.g. at the start of an episode, repeat the oldest frame of the
+  history, as `FrameStack4` does on reset.
+
+  Frames are stacked based on their content rather than the step types, so the
+  stacks are rebuilt exactly across episode boundaries, and also when a life
+  loss is turned into a FIRST step without resetting the frame stack.
+
+  Once items are overwritten, the stack_size - 1 oldest items may miss the
+  frames of their stack, so they are not sampled, like Dopamine excludes the
+  indices near the cursor.
+
+  Note: This replay buffer assumes that the items being stored are
+  trajectory.Trajectory instances, added in order from a single environment,
+  e.g. wrapped in `atari_wrappers.FrameStack4`. The observation of each item
+  must either extend the observation of the previous item, or repeat a single
+  frame (the start of an episode). Adding another observation raises a
+  ValueError. Adding more items than the capacity at once is supported, the
+  items skipped are not needed to rebuild the stacks of the items sampled.
+  """
+
+  def __init__(self, data_spec, capacity,
+               storage_fn=numpy_storage.NumpyStorage):
+    if not isinstance(data_spec, trajectory.Trajectory):
+      raise ValueError(
+          'data_spec must be the spec of a trajectory: {}'.format(data_spec))
+    self._stack_size = data_spec.observation.shape[-1]
+    self._lock_encode = threading.Lock()
+    super(PyFrameStackReplayBuffer, self).__init__(
+        data_spec, capacity, storage_fn=storage_fn)
+
+    # The last observation added, to check that the next one extends it.
+    observation_spec = data_spec.observation
+    self._np_state.last_observation = np.zeros(
+        observation_spec.shape, dtype=observation_spec.dtype)
+    # History of the last observation added, -1 when there is none.
+    self._np_state.last_history = np.int64(-1)
+    if self._np_state.size > 0:
+      last_row = np.int64(self._np_state.cur_id - 1)
+      item = self._read(last_row)
+      self._np_state.last_observation = item.observation
+      self._np_state.last_history = np.int64(
+          self._storage.get(last_row % self._capacity)[1])
+
+  def _encoded_data_spec(self):
+    observation = self._data_spec.observation
+    frame = array_spec.ArraySpec(
+        shape=observation.shape[:-1], dtype=observation.dtype)
+    history = array_spec.ArraySpec(shape=(), dtype=np.int8)
+    return (self._data_spec._replace(observation=frame), history)
+
+  def _encoded_trajectory(self, encoded_items):
+    return encoded_items[0]
+
+  def _encode(self, traj):
+    """Encodes a batch of trajectories, keeping the newest frames only.
+
+    Args:
+      traj: The original trajectory, with a leading batch dimension.
+
+    Returns:
+      A tuple of the trajectory where the observation is replaced by its newest
+      frame, and of the history of each item.
+
+    Raises:
+      ValueError: If an observation does not extend the previous one, and does
+        not repeat a single frame.
+    """
+    observation = np.asarray(traj.observation)
+    history = np.empty(len(observation), dtype=np.int8)
+    with self._lock_encode:
+      last_observation = self._np_state.last_observation
+      last_history = self._np_state.last_history
+      for i, stack in enumerate(observation):
+        if last_history == _SKIPPED_ITEMS:
+          # The previous items were skipped, so the item is the oldest one in
+          # the buffer, which is not sampled.
+          history[i] = self._stack_size - 1
+        elif (last_history >= 0 and
+            np.array_equal(stack[..., :-1], last_observation[..., 1:])):
+          history[i] = min(last_history + 1, self._stack_size - 1)
+        elif np.all(stack == stack[..., -1:]):
+          history[i] = 0
+        else:
+          raise ValueError(
+              'Observations must extend the previous observation by one '
+              'frame, or repeat a single frame at the start of an episode.')
+        last_observation = stack
+        last_history = history[i]
+      self._np_state.last_observation = last_observation
+      self._np_state.last_history = np.int64(last_history)
+    return (traj._replace(observation=observation[..., -1]), history)
+
+  def _add_batch(self, items):
+    outer_shape = nest_utils.get_outer_array_shape(items, self._data_spec)
+    if int(np.prod(outer_shape)) > self._capacity:
+      # Only the last capacity items are encoded, after the skipped ones.
+      with self._lock_encode:
+        self._np_state.last_history = np.int64(_SKIPPED_ITEMS)
+    super(PyFrameStackReplayBuffer, self)._add_batch(items)
+
+  def _num_unsampled_items(self):
+    if self._np_state.item_count > self._np_state.size:
+      # The previous items of the oldest ones were overwritten.
+      return self._stack_size - 1
+    return 0
+
+  def _read(self, idx, num_steps=None):
+    """Reads items starting at idx and rebuilds their stacked observations."""
+    if num_steps is not None:
+      idx = np.expand_dims(idx, -1) + np.arange(num_steps)
+    rows = np.asarray(idx % self._capacity)
+    num_rows = rows.size
+    # Read the stack_size rows ending at each row at once, the oldest first.
+    stack_rows = (np.expand_dims(rows, -1) -
+                  np.arange(self._stack_size - 1, -1, -1)) % self._capacity
+    traj, history = self._storage.get(stack_rows)
+    frame_shape = traj.observation.shape[rows.ndim + 1:]
+    frames = traj.observation.reshape(
+        (num_rows, self._stack_size) + frame_shape)
+    # The last row of each stack is the item itself.
+    traj, history = nest.map_structure(
+        lambda x: np.take(x, self._stack_size - 1, axis=rows.ndim),
+        (traj, history))
+
+    # Frames before the history repeat its oldest frame.
+    if np.any(history < self._stack_size - 1):
+      columns = np.maximum(np.arange(self._stack_size),
+                           self._stack_size - 1 - history.reshape(-1, 1))
+      frames = frames[np.arange(num_rows)[:, None], columns]
+    # Move the frames to the last axis, shape rows.shape + frame_shape +
+    # [stack_size].
+    frames = frames.reshape(rows.shape + (self._stack_size,) + frame_shape)
+    observation = np.moveaxis(frames, rows.ndim, -1)
+    return traj._replace(observation=observation)
+
+  def _gather_all(self):
+    data = self._read(np.arange(self._capacity))
+    batched = nest.map_structure(lambda t: np.expand_dims(t, 0), data)
+    return batched
+
+  def _clear(self):
+    super(PyFrameStackReplayBuffer, self)._clear()
+    self._np_state.last_history = np.int64(-1)
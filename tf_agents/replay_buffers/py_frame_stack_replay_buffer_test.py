@@ -0,0 +1,182 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for PyFrameStackReplayBuffer."""
+
+from __future__ import division
+from __future__ import unicode_literals
+
+import collections
+import functools
+import os
+
+from absl.testing import parameterized
+import numpy as np
+import tensorflow as tf
+
+from tf_agents.environments import time_step as ts
+from tf_agents.environments import trajectory
+from tf_agents.policies import policy_step
+from tf_agents.replay_buffers import numpy_storage
+from tf_agents.replay_buffers import py_frame_stack_replay_buffer
+from tf_agents.specs import array_spec
+from tf_agents.utils import nest_utils
+
+nest = tf.contrib.framework.nest
+
+
+class PyFrameStackReplayBufferTest(parameterized.TestCase, tf.test.TestCase):
+
+  def setUp(self):
+    super(PyFrameStackReplayBufferTest, self).setUp()
+    observation_spec = array_spec.ArraySpec((5, 5, 4), np.uint8, 'obs')
+    time_step_spec = ts.time_step_spec(observation_spec)
+    action_spec = policy_step.PolicyStep(array_spec.BoundedArraySpec(
+        shape=(), dtype=np.int32, minimum=0, maximum=1, name='action'))
+    self._trajectory_spec = trajectory.from_transition(
+        time_step_spec, action_spec, time_step_spec)
+
+  def _generate_trajectories(self, episode_lengths):
+    """Generates frame stacked trajectories, like FrameStack4 does.
+
+    The value of the pixels of each frame is the index of the frame.
+
+    Args:
+      episode_lengths: List of the number of items of each episode.
+
+    Returns:
+      A list of trajectories.
+    """
+    frame_index = 0
+    trajectories = []
+    dummy_action = policy_step.PolicyStep(np.int32(0))
+    for length in episode_lengths:
+      frames = collections.deque(maxlen=4)
+      for _ in range(4):
+        frames.append(np.full((5, 5, 1), frame_index, dtype=np.uint8))
+      time_step = ts.restart(np.concatenate(frames, axis=-1))
+      for _ in range(length):
+        frame_index += 1
+        frames.append(np.full((5, 5, 1), frame_index, dtype=np.uint8))
+        next_time_step = ts.transition(np.concatenate(frames, axis=-1), 0.0)
+        trajectories.append(trajectory.from_transition(
+            time_step, dummy_action, next_time_step))
+        time_step = next_time_step
+      frame_index += 1
+    return trajectories
+
+  def _add(self, replay_buffer, trajectories, add_batch_size=1):
+    for k in range(0, len(trajectories), add_batch_size):
+      replay_buffer.add_batch(nest_utils.stack_nested_arrays(
+          trajectories[k:k + add_batch_size]))
+
+  @parameterized.named_parameters(
+      ('AddBatchSizeOne', 1),
+      ('AddBatchSizeSeven', 7),
+  )
+  def testRebuildsStacks(self, add_batch_size):
+    trajectories = self._generate_trajectories([2, 7, 1, 5])
+    replay_buffer = py_frame_stack_replay_buffer.PyFrameStackReplayBuffer(
+        data_spec=self._trajectory_spec, capacity=20)
+    self._add(replay_buffer, trajectories, add_batch_size)
+
+    expected = nest_utils.stack_nested_arrays(trajectories)
+    actual = nest_utils.unbatch_nested_array(replay_buffer.gather_all())
+    nest.map_structure(lambda e, a: self.assertAllEqual(e, a[:15]), expected,
+                       actual)
+
+  def testStoresOneFramePerItem(self):
+    replay_buffer = py_frame_stack_replay_buffer.PyFrameStackReplayBuffer(
+        data_spec=self._trajectory_spec, capacity=20)
+    encoded_spec = replay_buffer._encoded_data_spec()
+    self.assertEqual((5, 5), encoded_spec[0].observation.shape)
+
+  def testLifeLossKeepsStack(self):
+    trajectories = self._generate_trajectories([6])
+    # A life loss restarts the episode without resetting the frame stack.
+    trajectories[3] = trajectories[3]._replace(
+        step_type=np.asarray(ts.StepType.FIRST, dtype=np.int32))
+    replay_buffer = py_frame_stack_replay_buffer.PyFrameStackReplayBuffer(
+        data_spec=self._trajectory_spec, capacity=20)
+    self._add(replay_buffer, trajectories)
+    observation = replay_buffer.gather_all().observation[0, :6]
+    self.assertAllEqual(
+        [traj.observation for traj in trajectories], observation)
+
+  def testOverwriteAndSample(self):
+    trajectories = self._generate_trajectories([30, 12])
+    replay_buffer = py_frame_stack_replay_buffer.PyFrameStackReplayBuffer(
+        data_spec=self._trajectory_spec, capacity=16)
+    self._add(replay_buffer, trajectories, add_batch_size=5)
+
+    items = replay_buffer.get_next(sample_batch_size=100, num_steps=2)
+    self.assertEqual((100, 2, 5, 5, 4), items.observation.shape)
+    for first, second in items.observation:
+      # Stacks never go past the oldest item (newest frame 26).
+      self.assertLessEqual(26, first[0, 0, 0])
+      # Consecutive items of an episode have consecutive stacks.
+      if second[0, 0, -1] == first[0, 0, -1] + 1:
+        self.assertAllEqual(first[..., 1:], second[..., :-1])
+    self._assertSamplesExactStacks(replay_buffer, trajectories[-13:])
+
+  def _assertSamplesExactStacks(self, replay_buffer, trajectories):
+    """Checks that the samples are the observations of trajectories."""
+    expected = dict((traj.observation[0, 0, -1], traj.observation)
+                    for traj in trajectories)
+    observation = replay_buffer.get_next(sample_batch_size=200).observation
+    self.assertAllEqual(sorted(expected),
+                        np.unique(observation[:, 0, 0, -1]))
+    for stack in observation:
+      self.assertAllEqual(expected[stack[0, 0, -1]], stack)
+
+  def testAddMoreItemsThanCapacity(self):
+    trajectories = self._generate_trajectories([30, 12])
+    replay_buffer = py_frame_stack_replay_buffer.PyFrameStackReplayBuffer(
+        data_spec=self._trajectory_spec, capacity=16)
+    self._add(replay_buffer, trajectories, add_batch_size=len(trajectories))
+    # The 3 oldest items may miss frames, and are not sampled.
+    self._assertSamplesExactStacks(replay_buffer, trajectories[-13:])
+
+  def testRejectsObservationsNotExtendingTheStack(self):
+    trajectories = self._generate_trajectories([5])
+    replay_buffer = py_frame_stack_replay_buffer.PyFrameStackReplayBuffer(
+        data_spec=self._trajectory_spec, capacity=20)
+    with self.assertRaises(ValueError):
+      self._add(replay_buffer, trajectories[1:])
+    self._add(replay_buffer, trajectories[:1])
+    with self.assertRaises(ValueError):
+      self._add(replay_buffer, trajectories[2:])
+
+  def testMemmapStorageWarmStart(self):
+    trajectories = self._generate_trajectories([8, 8])
+    storage_fn = functools.partial(
+        numpy_storage.MemmapStorage,
+        directory=os.path.join(self.get_temp_dir(), 'frame_stack_rb'))
+    replay_buffer = py_frame_stack_replay_buffer.PyFrameStackReplayBuffer(
+        data_spec=self._trajectory_spec, capacity=20, storage_fn=storage_fn)
+    self._add(replay_buffer, trajectories[:12])
+
+    # Reopening the directory restores the last stack, so the episode can go
+    # on.
+    reopened = py_frame_stack_replay_buffer.PyFrameStackReplayBuffer(
+        data_spec=self._trajectory_spec, capacity=20, storage_fn=storage_fn)
+    self._add(reopened, trajectories[12:])
+    observation = reopened.gather_all().observation[0, :16]
+    self.assertAllEqual(
+        [traj.observation for traj in trajectories], observation)
+
+
+if __name__ == '__main__':
+  tf.test.main()
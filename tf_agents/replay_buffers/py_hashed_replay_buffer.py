@@ -30,6 +30,7 @@ import numpy as np
 import tensorflow as tf
 
 from tf_agents.environments import trajectory
+from tf_agents.replay_buffers import numpy_storage
 from tf_agents.replay_buffers import py_uniform_replay_buffer
 from tf_agents.specs import array_spec
 
@@ -79,11 +80,33 @@ class FrameBuffer(tf.contrib.checkpoint.PythonStateWrapper):
     return np.array([self.add_frame(f) for f in frame_list])
 
   def decompress(self, observation, split_axis=-1):
-    frames = [self._frames[h][0] for h in observation]
-    return np.concatenate(frames, axis=split_axis)
+    """Rebuilds observations from their frame hashes.
+
+    Args:
+      observation: Array of frame hashes, shaped [..., num_frames]. Any outer
+        dimensions are treated as a batch and decompressed all at once.
+      split_axis: The axis of the original observation along which the frames
+        were split by `compress`.
+
+    Returns:
+      The decompressed observations, with the same outer dimensions.
+    """
+    observation = np.asarray(observation)
+    outer_shape = observation.shape[:-1]
+    num_frames = observation.shape[-1]
+    frames = [self._frames[h][0] for h in observation.reshape(-1)]
+    frame_shape = frames[0].shape
+    # Shape outer_shape + [num_frames] + frame_shape. Each frame has size 1
+    # along split_axis, so the frames are merged by moving the num_frames axis
+    # in its place.
+    frames = np.stack(frames).reshape(outer_shape + (num_frames,) + frame_shape)
+    frame_axis = split_axis % len(frame_shape)
+    outer_rank = len(outer_shape)
+    frames = np.squeeze(frames, axis=outer_rank + 1 + frame_axis)
+    return np.moveaxis(frames, outer_rank, outer_rank + frame_axis)
 
   def on_delete(self, observation, split_axis=-1):
-    for h in observation:
+    for h in np.asarray(observation).reshape(-1):
       frame, refcount = self._frames[h]
       if refcount > 1:
         self._frames[h] = (frame, refcount - 1)
@@ -106,14 +129,26 @@ class PyHashedReplayBuffer(py_uniform_replay_buffer.PyUniformReplayBuffer):
 
   Note: This replay buffer assumes that the items being stored are
   trajectory.Trajectory instances.
+
+  Note: Only the frame hashes go through `storage_fn`; the frames themselves
+  are kept in memory and saved in checkpoints. A memory-mapped storage thus
+  cannot warm start this buffer, and a storage which already holds items is
+  rejected rather than overwritten.
   """
 
-  def __init__(self, data_spec, capacity, log_interval=None):
+  def __init__(self, data_spec, capacity, log_interval=None,
+               storage_fn=numpy_storage.NumpyStorage):
     if not isinstance(data_spec, trajectory.Trajectory):
       raise ValueError(
           'data_spec must be the spec of a trajectory: {}'.format(data_spec))
     super(PyHashedReplayBuffer, self).__init__(
-        data_spec, capacity)
+        data_spec, capacity, storage_fn=storage_fn)
+    if self._np_state.size:
+      # The frames are not kept by the storage, so its content is unusable.
+      raise ValueError(
+          'The storage holds {} items, but PyHashedReplayBuffer cannot warm '
+          'start from a storage, its frames are only saved in checkpoints.'
+          .format(self._np_state.size))
 
     self._frame_buffer = FrameBuffer()
     self._lock_frame_buffer = threading.Lock()
@@ -126,23 +161,27 @@ class PyHashedReplayBuffer(py_uniform_replay_buffer.PyUniformReplayBuffer):
     return self._data_spec._replace(observation=observation)
 
   def _encode(self, traj):
-    """Encodes a trajectory for efficient storage.
+    """Encodes a batch of trajectories for efficient storage.
 
     The observations in this trajectory are replaced by a compressed
     version of the observations: each frame is only stored exactly once.
 
     Args:
-      traj: The original trajectory.
+      traj: The original trajectory, with a leading batch dimension.
 
     Returns:
       The same trajectory where frames in the observation have been
       de-duplicated.
     """
     with self._lock_frame_buffer:
-      observation = self._frame_buffer.compress(traj.observation)
+      observation = np.stack(
+          [self._frame_buffer.compress(o) for o in traj.observation])
 
+    # Log whenever the batch goes through a multiple of log_interval.
+    item_count = self._np_state.item_count
     if (self._log_interval and
-        self._np_state.item_count % self._log_interval == 0):
+        (item_count - 1) // self._log_interval !=
+        (item_count + len(observation) - 1) // self._log_interval):
       tf.logging.info('Effective Replay buffer frame count: {}'.format(
           len(self._frame_buffer)))
 
@@ -156,7 +195,8 @@ class PyHashedReplayBuffer(py_uniform_replay_buffer.PyUniformReplayBuffer):
     in this trajectory.
 
     Args:
-      encoded_trajectory: The compressed version of the trajectory.
+      encoded_trajectory: The compressed version of the trajectory, possibly
+        with outer (batch and time) dimensions.
 
     Returns:
       The original trajectory (uncompressed).
@@ -0,0 +1,319 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Prioritized replay buffer in Python.
+
+PyPrioritizedReplayBuffer samples items proportionally to their priority, as
+described in "Prioritized Experience Replay" (Schaul et al., 2015). Priorities
+are kept in array-backed segment trees, so that batches of items can be sampled
+and updated in O(log N) vectorized numpy operations.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+
+import numpy as np
+import tensorflow as tf
+
+from tf_agents.replay_buffers import numpy_storage
+from tf_agents.replay_buffers import py_uniform_replay_buffer
+from tf_agents.specs import array_spec
+
+nest = tf.contrib.framework.nest
+
+
+PrioritizedBufferInfo = collections.namedtuple(
+    'PrioritizedBufferInfo', ['ids', 'probabilities', 'weights'])
+
+
+class SegmentTree(tf.contrib.checkpoint.Checkpointable):
+  """A binary segment tree stored in a single numpy array.
+
+  Node 1 is the root, and the children of node i are nodes 2i and 2i + 1. The
+  leaves hold the values of rows [0, capacity) and every other node holds the
+  reduction of its children by `operation`. All the methods operate on batches
+  of rows, walking the tree one level at a time.
+  """
+
+  def __init__(self, capacity, operation, neutral_element):
+    """Creates a SegmentTree.
+
+    Args:
+      capacity: Number of rows (leaves) of the tree.
+      operation: A binary numpy ufunc, e.g. `np.add` or `np.minimum`.
+      neutral_element: Neutral element of operation, value of empty rows.
+    """
+    self._capacity = capacity
+    self._depth = int(np.ceil(np.log2(max(capacity, 1))))
+    self._num_leaves = 1 << self._depth
+    self._operation = operation
+    self._neutral_element = neutral_element
+    self._np_state = tf.contrib.checkpoint.NumpyState()
+    self.clear()
+
+  def clear(self):
+    """Sets all the rows to the neutral element."""
+    self._np_state.tree = np.full(
+        2 * self._num_leaves, self._neutral_element, dtype=np.float64)
+
+  def reduce(self):
+    """Returns the reduction of all the rows."""
+    return self._np_state.tree[1]
+
+  def get(self, rows):
+    """Returns the values of rows."""
+    return self._np_state.tree[np.asarray(rows) + self._num_leaves]
+
+  def set(self, rows, values):
+    """Sets the values of rows and updates their ancestors."""
+    tree = self._np_state.tree
+    nodes = np.asarray(rows, dtype=np.int64).reshape(-1) + self._num_leaves
+    tree[nodes] = np.reshape(values, -1)
+    level_size = self._num_leaves
+    # Update the ancestors one level at a time, gathering the updated nodes
+    # while they are fewer than the nodes of the level.
+    while level_size > 1 and level_size // 2 > nodes.size:
+      level_size //= 2
+      nodes //= 2
+      left = 2 * nodes
+      tree[nodes] = self._operation(tree.take(left), tree.take(left + 1))
+    # Recomputing the whole upper levels with strided slices is cheaper than
+    # gathering the (mostly duplicated) nodes.
+    while level_size > 1:
+      level_size //= 2
+      children = tree[2 * level_size:4 * level_size]
+      self._operation(children[0::2], children[1::2],
+                      out=tree[level_size:2 * level_size])
+
+
+class SumTree(SegmentTree):
+  """A SegmentTree of sums, which can sample rows proportionally to values."""
+
+  def __init__(self, capacity):
+    super(SumTree, self).__init__(capacity, np.add, 0.)
+
+  def find_prefix_sum_rows(self, prefix_sums):
+    """Finds the rows at which the cumulative sums reach prefix_sums.
+
+    Args:
+      prefix_sums: Array of values in [0, reduce()).
+
+    Returns:
+      An int64 array with the shape of prefix_sums, containing for each value
+      the smallest row i such that sum(rows [0, i]) > value.
+    """
+    tree = self._np_state.tree
+    values = np.array(prefix_sums, dtype=np.float64)
+    nodes = np.ones(values.shape, dtype=np.int64)
+    for _ in range(self._depth):
+      left = 2 * nodes
+      left_sums = tree.take(left)
+      go_right = values >= left_sums
+      values -= left_sums * go_right
+      nodes = left + go_right
+    # Floating point rounding errors can lead values close to the total past
+    # the last non empty row. Move them back to the last non empty row.
+    empty = tree.take(nodes) <= 0
+    if np.any(empty):
+      nonempty_rows = np.flatnonzero(self.get(np.arange(self._capacity)) > 0)
+      last_rows = nonempty_rows[np.searchsorted(
+          nonempty_rows, nodes[empty] - self._num_leaves, side='right') - 1]
+      nodes[empty] = last_rows + self._num_leaves
+    return nodes - self._num_leaves
+
+
+class MinTree(SegmentTree):
+  """A SegmentTree of minimums."""
+
+  def __init__(self, capacity):
+    super(MinTree, self).__init__(capacity, np.minimum, np.inf)
+
+
+class PyPrioritizedReplayBuffer(py_uniform_replay_buffer.PyUniformReplayBuffer):
+  """A Python-based replay buffer that supports prioritized sampling.
+
+  Items are sampled with probability p_i^alpha / sum_k p_k^alpha, where p_i is
+  the priority of item i. New items get the maximum priority seen so far.
+  Sampling returns a pair (items, PrioritizedBufferInfo) where:
+    - ids identify the sampled items (the first item of each sub-episode when
+      num_steps is set), to be passed to `update_priorities`.
+    - probabilities are the sampling probabilities of the items.
+    - weights are the importance sampling weights of the items, normalized by
+      their maximum, e.g. to be passed to `DqnAgent.train(weights=...)`.
+
+  Writing, reading and updating priorities is thread safe.
+
+  Note: Priorities are not persisted by `storage_fn`. When warm started from a
+  storage which already holds items, e.g. a MemmapStorage, the items get the
+  maximum priority.
+  """
+
+  def __init__(self,
+               data_spec,
+               capacity,
+               alpha=0.6,
+               beta=0.4,
+               epsilon=1e-6,
+               storage_fn=numpy_storage.NumpyStorage):
+    """Creates a PyPrioritizedReplayBuffer.
+
+    Args:
+      data_spec: An ArraySpec or a list/tuple/nest of ArraySpecs describing a
+        single item that can be stored in this buffer.
+      capacity: The maximum number of items that can be stored in the buffer.
+      alpha: Priority exponent, 0 corresponds to uniform sampling.
+      beta: Importance sampling exponent, 1 fully compensates for the
+        non-uniform sampling. Can be annealed through the `beta` property.
+      epsilon: Small value added to priorities so that no item has a zero
+        probability of being sampled.
+      storage_fn: Function to create the storage
+        `storage_fn(encoded_data_spec, capacity)`. If the storage persists
+        metadata, the buffer is warm started from its content.
+    """
+    super(PyPrioritizedReplayBuffer, self).__init__(
+        data_spec, capacity, storage_fn=storage_fn)
+    self._alpha = alpha
+    self._beta = beta
+    self._epsilon = epsilon
+    self._sum_tree = SumTree(capacity)
+    self._min_tree = MinTree(capacity)
+    # Maximum priority seen so far, after applying alpha.
+    self._np_state.max_priority = np.float64(1.)
+    # Priorities are not persisted by the storage, the items it already holds
+    # get the maximum priority.
+    size = self._np_state.size
+    if size:
+      rows = (self._np_state.cur_id - size + np.arange(size)) % capacity
+      priorities = np.full(rows.shape, self._np_state.max_priority)
+      self._sum_tree.set(rows, priorities)
+      self._min_tree.set(rows, priorities)
+
+  @property
+  def beta(self):
+    return self._beta
+
+  @beta.setter
+  def beta(self, beta):
+    self._beta = beta
+
+  def update_priorities(self, ids, priorities):
+    """Updates the priorities of items.
+
+    Ids of items which have been removed from the buffer since they were
+    sampled are ignored.
+
+    Args:
+      ids: Array of item ids, as returned by `get_next`.
+      priorities: Array of new priorities, with the same shape as ids, e.g. the
+        absolute TD errors of the items.
+    """
+    ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+    priorities = np.asarray(priorities, dtype=np.float64).reshape(-1)
+    priorities = (np.abs(priorities) + self._epsilon)**self._alpha
+    with self._lock:
+      item_count = self._np_state.item_count
+      valid = ((ids >= item_count - self._np_state.size) & (ids < item_count))
+      rows = self._rows_from_ids(ids[valid])
+      self._sum_tree.set(rows, priorities[valid])
+      self._min_tree.set(rows, priorities[valid])
+      if priorities.size:
+        self._np_state.max_priority = np.maximum(
+            self._np_state.max_priority, np.max(priorities))
+
+  def _rows_from_ids(self, ids):
+    # The item with id item_count - 1 is at row cur_id - 1.
+    offsets = self._np_state.item_count - ids
+    return (self._np_state.cur_id - offsets) % self._capacity
+
+  def _ids_from_rows(self, rows):
+    offsets = (self._np_state.cur_id - rows - 1) % self._capacity + 1
+    return self._np_state.item_count - offsets
+
+  def _on_insert(self, rows, encoded_items):
+    rows = np.arange(rows.start, rows.stop)
+    priorities = np.full(rows.shape, self._np_state.max_priority)
+    self._sum_tree.set(rows, priorities)
+    self._min_tree.set(rows, priorities)
+
+  def _get_next(self,
+                sample_batch_size=None,
+                num_steps=None,
+                time_stacked=True):
+    num_steps_value = num_steps if num_steps is not None else 1
+    rows_shape = () if sample_batch_size is None else (sample_batch_size,)
+    with self._lock:
+      if self._np_state.size - num_steps_value + 1 <= 0:
+        raise ValueError('Read error: not enough items in the replay buffer '
+                         'to sample {} steps.'.format(num_steps_value))
+
+      # The last num_steps - 1 items cannot start a sub-episode without
+      # crossing the head, so they are masked out while sampling.
+      excluded_rows = (
+          (self._np_state.cur_id - np.arange(1, num_steps_value)) %
+          self._capacity)
+      if num_steps_value > 1:
+        excluded_priorities = self._sum_tree.get(excluded_rows)
+        self._sum_tree.set(excluded_rows, 0.)
+      total = self._sum_tree.reduce()
+      rows = self._sum_tree.find_prefix_sum_rows(
+          np.random.uniform(0., total, size=rows_shape))
+      priorities = self._sum_tree.get(rows)
+      if num_steps_value > 1:
+        self._sum_tree.set(excluded_rows, excluded_priorities)
+
+      probabilities = priorities / total
+      min_probability = self._min_tree.reduce() / total
+      weights = (probabilities / min_probability)**-self._beta
+      ids = self._ids_from_rows(rows)
+      item = self._read(rows, num_steps)
+
+    if num_steps is not None and not time_stacked:
+      item = self._unstack_time(item, len(rows_shape), num_steps)
+    info = PrioritizedBufferInfo(
+        ids=ids,
+        probabilities=probabilities.astype(np.float32),
+        weights=weights.astype(np.float32))
+    return item, info
+
+  def _get_next_n_step(self, sample_batch_size=None, n_step=1, gamma=1.0):
+    raise NotImplementedError(
+        'PyPrioritizedReplayBuffer does not support n-step sampling.')
+
+  def _as_n_step_dataset(self,
+                         sample_batch_size=None,
+                         n_step=1,
+                         gamma=1.0,
+                         num_parallel_calls=None):
+    raise NotImplementedError(
+        'PyPrioritizedReplayBuffer does not support n-step sampling.')
+
+  def _get_next_spec(self, sample_batch_size=None, num_steps=None):
+    rows_shape = () if sample_batch_size is None else (sample_batch_size,)
+    info_spec = PrioritizedBufferInfo(
+        ids=array_spec.ArraySpec(rows_shape, np.int64, 'ids'),
+        probabilities=array_spec.ArraySpec(rows_shape, np.float32,
+                                           'probabilities'),
+        weights=array_spec.ArraySpec(rows_shape, np.float32, 'weights'))
+    item_spec = super(PyPrioritizedReplayBuffer, self)._get_next_spec(
+        sample_batch_size, num_steps)
+    return item_spec, info_spec
+
+  def _clear(self):
+    super(PyPrioritizedReplayBuffer, self)._clear()
+    self._sum_tree.clear()
+    self._min_tree.clear()
+    self._np_state.max_priority = np.float64(1.)
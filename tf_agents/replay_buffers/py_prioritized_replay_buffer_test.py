@@ -0,0 +1,147 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for PyPrioritizedReplayBuffer."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import functools
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from tf_agents.replay_buffers import numpy_storage
+from tf_agents.replay_buffers import py_prioritized_replay_buffer
+from tf_agents.specs import array_spec
+
+
+class SegmentTreeTest(tf.test.TestCase):
+
+  def testSumTree(self):
+    tree = py_prioritized_replay_buffer.SumTree(5)
+    tree.set([0, 1, 2, 3, 4], [1., 2., 3., 4., 0.])
+    self.assertEqual(10., tree.reduce())
+    self.assertAllEqual(
+        [0, 0, 1, 1, 2, 2, 3, 3],
+        tree.find_prefix_sum_rows([0., 0.99, 1., 2.9, 3., 5.99, 6., 9.99]))
+    # Values past the total never end up in empty rows.
+    self.assertAllEqual([3], tree.find_prefix_sum_rows([10.]))
+
+    tree.set([1, 1], [5., 5.])
+    self.assertEqual(13., tree.reduce())
+    self.assertAllEqual([5.], tree.get([1]))
+
+  def testMinTree(self):
+    tree = py_prioritized_replay_buffer.MinTree(7)
+    self.assertEqual(np.inf, tree.reduce())
+    tree.set([1, 3, 6], [5., 2., 3.])
+    self.assertEqual(2., tree.reduce())
+    tree.set(np.arange(7), np.arange(7) + 10.)
+    self.assertEqual(10., tree.reduce())
+
+
+class PyPrioritizedReplayBufferTest(tf.test.TestCase):
+
+  def _create_replay_buffer(self, capacity=4, num_items=6):
+    replay_buffer = py_prioritized_replay_buffer.PyPrioritizedReplayBuffer(
+        data_spec=array_spec.ArraySpec((), np.int64),
+        capacity=capacity,
+        alpha=1.0,
+        beta=1.0,
+        epsilon=0.)
+    replay_buffer.add_batch(np.arange(num_items, dtype=np.int64))
+    return replay_buffer
+
+  def testNewItemsHaveMaxPriority(self):
+    replay_buffer = self._create_replay_buffer()
+    items, info = replay_buffer.get_next(sample_batch_size=10)
+    self.assertEqual((10,), items.shape)
+    # The ids of the items are the index at which they were added.
+    self.assertAllEqual(items, info.ids)
+    self.assertAllClose([0.25] * 10, info.probabilities)
+    self.assertAllClose([1.] * 10, info.weights)
+
+  def testSampleProportionally(self):
+    np.random.seed(12345)
+    replay_buffer = self._create_replay_buffer()
+    # Items 0 and 1 were overwritten, their ids are ignored.
+    replay_buffer.update_priorities([2, 3, 4, 5, 0], [1., 2., 3., 4., 100.])
+
+    items, info = replay_buffer.get_next(sample_batch_size=10000)
+    frequencies = np.bincount(items, minlength=6) / 10000.
+    self.assertAllClose([0., 0., 0.1, 0.2, 0.3, 0.4], frequencies, atol=0.02)
+    self.assertAllClose((items - 1) / 10., info.probabilities)
+    # Weights are normalized by the weight of the least likely item.
+    self.assertAllClose(1. / (items - 1), info.weights)
+
+  def testSampleDoesNotCrossHead(self):
+    replay_buffer = self._create_replay_buffer()
+    replay_buffer.update_priorities([5], [100.])
+
+    items, info = replay_buffer.get_next(sample_batch_size=1000, num_steps=2)
+    self.assertEqual((1000, 2), items.shape)
+    self.assertAllEqual(items[:, 0], info.ids)
+    self.assertAllEqual(items[:, 0] + 1, items[:, 1])
+    self.assertAllClose([1. / 3] * 1000, info.probabilities)
+
+    first, second = replay_buffer.get_next(
+        sample_batch_size=1000, num_steps=2, time_stacked=False)[0]
+    self.assertAllEqual(first + 1, second)
+
+  def testClear(self):
+    replay_buffer = self._create_replay_buffer()
+    replay_buffer.update_priorities([5], [100.])
+    replay_buffer.clear()
+    replay_buffer.add_batch(np.arange(10, 12, dtype=np.int64))
+
+    items, info = replay_buffer.get_next(sample_batch_size=100)
+    self.assertAllEqual([10, 11], np.unique(items))
+    self.assertAllClose([0.5] * 100, info.probabilities)
+
+  def testWarmStart(self):
+    storage_fn = functools.partial(
+        numpy_storage.MemmapStorage,
+        directory=os.path.join(self.get_temp_dir(), 'prioritized_rb'))
+    data_spec = array_spec.ArraySpec((), np.int64)
+    replay_buffer = py_prioritized_replay_buffer.PyPrioritizedReplayBuffer(
+        data_spec=data_spec, capacity=4, storage_fn=storage_fn)
+    replay_buffer.add_batch(np.arange(6, dtype=np.int64))
+    replay_buffer.update_priorities([5], [100.])
+
+    # The items are kept, with the maximum priority.
+    reopened = py_prioritized_replay_buffer.PyPrioritizedReplayBuffer(
+        data_spec=data_spec, capacity=4, storage_fn=storage_fn)
+    self.assertEqual(4, reopened.size)
+    items, info = reopened.get_next(sample_batch_size=100)
+    self.assertAllEqual([2, 3, 4, 5], np.unique(items))
+    self.assertAllEqual(items, info.ids)
+    self.assertAllClose([0.25] * 100, info.probabilities)
+
+  def testAsDataset(self):
+    replay_buffer = self._create_replay_buffer()
+    ds = replay_buffer.as_dataset(sample_batch_size=5, num_steps=2)
+    items, info = ds.make_one_shot_iterator().get_next()
+    self.assertEqual([5, 2], items.shape.as_list())
+    self.assertEqual([5], info.weights.shape.as_list())
+    with self.test_session() as sess:
+      items, info = sess.run((items, info))
+      self.assertAllEqual(items[:, 0], info.ids)
+
+
+if __name__ == '__main__':
+  tf.test.main()
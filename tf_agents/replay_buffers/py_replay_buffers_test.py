@@ -18,7 +18,11 @@
 from __future__ import division
 from __future__ import unicode_literals
 
+import functools
+import itertools
 import os
+import threading
+import time
 
 from absl.testing import parameterized
 import numpy as np
@@ -27,11 +31,15 @@ import tensorflow as tf
 from tf_agents.environments import time_step as ts
 from tf_agents.environments import trajectory
 from tf_agents.policies import policy_step
+from tf_agents.replay_buffers import numpy_storage
 from tf_agents.replay_buffers import py_hashed_replay_buffer
 from tf_agents.replay_buffers import py_uniform_replay_buffer
+from tf_agents.replay_buffers import replay_buffer as replay_buffer_lib
 from tf_agents.specs import array_spec
 from tf_agents.utils import nest_utils
 
+nest = tf.contrib.framework.nest
+
 
 class FrameBufferTest(tf.test.TestCase):
 
@@ -50,9 +58,47 @@ class FrameBufferTest(tf.test.TestCase):
     self.assertEqual(1, len(fb))
 
 
+class BackgroundSamplesTest(tf.test.TestCase):
+
+  def _sampling_threads(self):
+    return [thread for thread in threading.enumerate()
+            if thread.name == 'replay_sampler']
+
+  def _assertSamplingThreadsStop(self):
+    for _ in range(50):
+      if not self._sampling_threads():
+        break
+      time.sleep(0.1)
+    self.assertEqual([], self._sampling_threads())
+
+  def testYieldsSamplesAndStopsThreads(self):
+    counter = itertools.count()
+    lock = threading.Lock()
+    def sample_fn():
+      with lock:
+        return next(counter)
+    samples = py_uniform_replay_buffer._background_samples(
+        sample_fn, num_threads=3)
+    values = [next(samples) for _ in range(20)]
+    self.assertEqual(20, len(set(values)))
+    self.assertEqual(3, len(self._sampling_threads()))
+
+    samples.close()
+    self._assertSamplingThreadsStop()
+
+  def testRaisesSamplingErrors(self):
+    def sample_fn():
+      raise ValueError('Read error: empty replay buffer')
+    samples = py_uniform_replay_buffer._background_samples(
+        sample_fn, num_threads=2)
+    with self.assertRaisesRegexp(ValueError, 'empty replay buffer'):
+      next(samples)
+    self._assertSamplingThreadsStop()
+
+
 class PyUniformReplayBufferTest(parameterized.TestCase, tf.test.TestCase):
 
-  def _generate_replay_buffer(self, rb_cls):
+  def _generate_replay_buffer(self, rb_cls, add_batch_size=1):
     stack_count = 4
     shape = (15, 15, stack_count)
     single_shape = (15, 15, 1)
@@ -83,10 +129,13 @@ class PyUniformReplayBufferTest(parameterized.TestCase, tf.test.TestCase):
 
     self._transition_count = len(time_steps) - 1
     dummy_action = policy_step.PolicyStep(np.int32(0))
-    for k in range(self._transition_count):
-      self._replay_buffer.add_batch(nest_utils.batch_nested_array(
-          trajectory.from_transition(
-              time_steps[k], dummy_action, time_steps[k + 1])))
+    trajectories = [
+        trajectory.from_transition(
+            time_steps[k], dummy_action, time_steps[k + 1])
+        for k in range(self._transition_count)]
+    for k in range(0, self._transition_count, add_batch_size):
+      self._replay_buffer.add_batch(nest_utils.stack_nested_arrays(
+          trajectories[k:k + add_batch_size]))
 
   @parameterized.named_parameters(
       [('WithoutHashing', py_uniform_replay_buffer.PyUniformReplayBuffer),
@@ -111,6 +160,255 @@ class PyUniformReplayBufferTest(parameterized.TestCase, tf.test.TestCase):
         self.assertAllEqual(traj.observation[:, :, 0] + 3,
                             traj.observation[:, :, 3])
 
+  @parameterized.named_parameters(
+      [('WithoutHashing', py_uniform_replay_buffer.PyUniformReplayBuffer),
+       ('WithHashing', py_hashed_replay_buffer.PyHashedReplayBuffer)])
+  def testAddMultipleItems(self, rb_cls):
+    self._generate_replay_buffer(rb_cls=rb_cls, add_batch_size=5)
+    self.assertEqual(self._capacity, self._replay_buffer.size)
+
+    traj = self._replay_buffer.get_next(sample_batch_size=200, num_steps=2)
+    min_value = self._transition_count - self._capacity
+    self.assertLessEqual(min_value, np.min(traj.observation))
+    self.assertAllEqual(traj.observation[:, 0, 0, 0, 0] + 1,
+                        traj.observation[:, 1, 0, 0, 0])
+    self.assertAllEqual(traj.observation[..., 0] + 3,
+                        traj.observation[..., 3])
+
+  def testAddBatchWrapsAround(self):
+    data_spec = array_spec.ArraySpec((), np.int32)
+    replay_buffer = py_uniform_replay_buffer.PyUniformReplayBuffer(
+        data_spec=data_spec, capacity=10)
+
+    replay_buffer.add_batch(np.arange(7, dtype=np.int32))
+    self.assertEqual(7, replay_buffer.size)
+    # A [B, T] batch is added in row-major order, wrapping around the head.
+    replay_buffer.add_batch(np.arange(7, 13, dtype=np.int32).reshape([2, 3]))
+    self.assertEqual(10, replay_buffer.size)
+    self.assertAllEqual([[10, 11, 12, 3, 4, 5, 6, 7, 8, 9]],
+                        replay_buffer.gather_all())
+
+    # Only the last `capacity` items of a larger batch are kept.
+    replay_buffer.add_batch(np.arange(13, 38, dtype=np.int32))
+    self.assertAllEqual([[35, 36, 37, 28, 29, 30, 31, 32, 33, 34]],
+                        replay_buffer.gather_all())
+
+  @parameterized.named_parameters(
+      [('WithoutHashing', py_uniform_replay_buffer.PyUniformReplayBuffer),
+       ('WithHashing', py_hashed_replay_buffer.PyHashedReplayBuffer)])
+  def testNStepSampling(self, rb_cls):
+    self._generate_replay_buffer(rb_cls=rb_cls)
+    # Frame k has value k, and the rewards and discounts are fixed.
+    traj = self._replay_buffer.get_next_n_step(
+        sample_batch_size=100, n_step=3, gamma=0.5)
+    self.assertEqual((100, 2), traj.reward.shape)
+    self.assertAllEqual(traj.observation[:, 0, 0, 0, 0] + 3,
+                        traj.observation[:, 1, 0, 0, 0])
+    self.assertAllClose([0.] * 100, traj.reward[:, 0])
+    self.assertAllClose([0.25] * 100, traj.discount[:, 0])
+
+  def testNStepSamplingTruncatesEpisodes(self):
+    mid, first, last = (ts.StepType.MID, ts.StepType.FIRST, ts.StepType.LAST)
+    step_types = [first, mid, mid, last, first, mid, mid, mid]
+    next_step_types = [mid, mid, last, first, mid, mid, mid, mid]
+    # The episode ends with a discount of 1, e.g. on a life loss.
+    items = trajectory.Trajectory(
+        step_type=np.array(step_types, dtype=np.int32),
+        observation=np.arange(8, dtype=np.int64),
+        action=np.zeros(8, dtype=np.int32),
+        policy_info=(),
+        next_step_type=np.array(next_step_types, dtype=np.int32),
+        reward=np.array([1., 2., 4., 0., 8., 16., 32., 64.], dtype=np.float32),
+        discount=np.array([1., .9, 1., 1., 1., 1., 1., 1.], dtype=np.float32))
+    data_spec = nest.map_structure(
+        lambda x: array_spec.ArraySpec(x.shape[1:], x.dtype), items)
+    replay_buffer = py_uniform_replay_buffer.PyUniformReplayBuffer(
+        data_spec=data_spec, capacity=10)
+    replay_buffer.add_batch(items)
+
+    # Start observation: (end observation, return, discount, next step type).
+    expected = {
+        0: (3, 1. + .5 * 2. + .25 * .9 * 4., .25 * .9, last),
+        1: (3, 2. + .5 * .9 * 4., .5 * .9, last),
+        2: (3, 4., 1., last),
+        # A window starting on the boundary item ends there.
+        3: (4, 0., 0., first),
+        4: (7, 8. + .5 * 16. + .25 * 32., .25, mid),
+    }
+    traj = replay_buffer.get_next_n_step(
+        sample_batch_size=100, n_step=3, gamma=0.5)
+    self.assertAllEqual(np.arange(5), np.unique(traj.observation[:, 0]))
+    for k in range(100):
+      start = traj.observation[k, 0]
+      end, reward, discount, next_step_type = expected[start]
+      self.assertEqual(end, traj.observation[k, 1])
+      self.assertEqual(step_types[start], traj.step_type[k, 0])
+      self.assertAllClose(reward, traj.reward[k, 0])
+      self.assertAllClose(discount, traj.discount[k, 0])
+      self.assertEqual(next_step_type, traj.next_step_type[k, 0])
+
+  def _generate_episodes(self, episode_lengths):
+    """Returns trajectory items of episodes ending with a boundary item.
+
+    The observation of each item is its index, and its action the index of its
+    episode.
+
+    Args:
+      episode_lengths: List of the number of items of each episode.
+    """
+    step_types = []
+    actions = []
+    for episode, length in enumerate(episode_lengths):
+      step_types += ([ts.StepType.FIRST] + [ts.StepType.MID] * (length - 2) +
+                     [ts.StepType.LAST])
+      actions += [episode] * length
+    step_types = np.array(step_types, dtype=np.int32)
+    num_items = len(step_types)
+    next_step_types = np.roll(step_types, -1)
+    next_step_types[-1] = ts.StepType.MID
+    return trajectory.Trajectory(
+        step_type=step_types,
+        observation=np.arange(num_items, dtype=np.int64),
+        action=np.array(actions, dtype=np.int32),
+        policy_info=(),
+        next_step_type=next_step_types,
+        reward=np.zeros(num_items, dtype=np.float32),
+        discount=np.ones(num_items, dtype=np.float32))
+
+  @parameterized.named_parameters(
+      ('WithinEpisode', replay_buffer_lib.WITHIN_EPISODE, 1, 20,
+       [0, 1, 6, 7, 8, 9]),
+      ('WithinEpisodeBatched', replay_buffer_lib.WITHIN_EPISODE, 5, 20,
+       [0, 1, 6, 7, 8, 9]),
+      ('WithinEpisodeOverwritten', replay_buffer_lib.WITHIN_EPISODE, 5, 10,
+       [6, 7, 8, 9]),
+      ('EpisodeStart', replay_buffer_lib.EPISODE_START, 1, 20, [0, 6]),
+      ('EpisodeStartOverwritten', replay_buffer_lib.EPISODE_START, 1, 10, [6]),
+  )
+  def testWindowMode(self, window_mode, add_batch_size, capacity,
+                     expected_starts):
+    items = self._generate_episodes([4, 2, 6])
+    data_spec = nest.map_structure(
+        lambda x: array_spec.ArraySpec(x.shape[1:], x.dtype), items)
+    replay_buffer = py_uniform_replay_buffer.PyUniformReplayBuffer(
+        data_spec=data_spec, capacity=capacity, window_mode=window_mode)
+    for k in range(0, 12, add_batch_size):
+      replay_buffer.add_batch(
+          nest.map_structure(lambda x: x[None, k:k + add_batch_size], items))  # pylint: disable=cell-var-from-loop
+
+    traj = replay_buffer.get_next(sample_batch_size=500, num_steps=3)
+    self.assertAllEqual(expected_starts, np.unique(traj.observation[:, 0]))
+    self.assertAllEqual(traj.observation[:, :1] + np.arange(3),
+                        traj.observation)
+    # All the items of a window belong to the same episode.
+    self.assertAllEqual(traj.action[:, :1] * np.ones(3), traj.action)
+
+    with self.assertRaises(ValueError):
+      replay_buffer.get_next(num_steps=7)
+
+  def testWindowModeWarmStart(self):
+    items = self._generate_episodes([4, 2, 6])
+    data_spec = nest.map_structure(
+        lambda x: array_spec.ArraySpec(x.shape[1:], x.dtype), items)
+    storage_fn = functools.partial(
+        numpy_storage.MemmapStorage,
+        directory=os.path.join(self.get_temp_dir(), 'window_mode_rb'))
+    replay_buffer = py_uniform_replay_buffer.PyUniformReplayBuffer(
+        data_spec=data_spec, capacity=10, storage_fn=storage_fn,
+        window_mode=replay_buffer_lib.EPISODE_START)
+    replay_buffer.add_batch(nest.map_structure(lambda x: x[None], items))
+
+    # The episode index is rebuilt from the items in the storage.
+    reopened = py_uniform_replay_buffer.PyUniformReplayBuffer(
+        data_spec=data_spec, capacity=10, storage_fn=storage_fn,
+        window_mode=replay_buffer_lib.EPISODE_START)
+    traj = reopened.get_next(sample_batch_size=100, num_steps=2)
+    self.assertAllEqual([4, 6], np.unique(traj.observation[:, 0]))
+
+  @parameterized.named_parameters(
+      ('WithinEpisode', replay_buffer_lib.WITHIN_EPISODE, 20,
+       [0, 1, 2, 6, 7, 8]),
+      ('WithinEpisodeOverwritten', replay_buffer_lib.WITHIN_EPISODE, 10,
+       [2, 6, 7, 8]),
+      ('EpisodeStart', replay_buffer_lib.EPISODE_START, 20, [0]),
+  )
+  def testWindowModeBatchedRows(self, window_mode, capacity, expected_starts):
+    # Steps of two environments, the second one in the middle of an episode.
+    items = self._generate_episodes([6, 6])
+    items = nest.map_structure(lambda x: np.reshape(x, [2, 6]), items)
+    items = items._replace(
+        step_type=np.array([[0, 1, 1, 1, 1, 1], [1, 1, 1, 1, 1, 1]],
+                           dtype=np.int32),
+        next_step_type=np.ones([2, 6], dtype=np.int32))
+    data_spec = nest.map_structure(
+        lambda x: array_spec.ArraySpec(x.shape[2:], x.dtype), items)
+    replay_buffer = py_uniform_replay_buffer.PyUniformReplayBuffer(
+        data_spec=data_spec, capacity=capacity, window_mode=window_mode)
+    replay_buffer.add_batch(items)
+
+    traj = replay_buffer.get_next(sample_batch_size=500, num_steps=4)
+    self.assertAllEqual(expected_starts, np.unique(traj.observation[:, 0]))
+    # No window spans the rows of the two environments.
+    self.assertAllEqual(traj.action[:, :1] * np.ones(4), traj.action)
+
+  def testWindowModeRejectsBatchedItems(self):
+    items = self._generate_episodes([4])
+    data_spec = nest.map_structure(
+        lambda x: array_spec.ArraySpec(x.shape[1:], x.dtype), items)
+    replay_buffer = py_uniform_replay_buffer.PyUniformReplayBuffer(
+        data_spec=data_spec, capacity=10,
+        window_mode=replay_buffer_lib.WITHIN_EPISODE)
+    with self.assertRaises(ValueError):
+      replay_buffer.add_batch(items)
+
+  def testWindowModeRequiresTrajectory(self):
+    with self.assertRaises(ValueError):
+      py_uniform_replay_buffer.PyUniformReplayBuffer(
+          data_spec=array_spec.ArraySpec((), np.int32), capacity=10,
+          window_mode=replay_buffer_lib.WITHIN_EPISODE)
+
+  def testMemmapStorageWarmStart(self):
+    data_spec = array_spec.ArraySpec((2,), np.int32)
+    storage_fn = functools.partial(
+        numpy_storage.MemmapStorage,
+        directory=os.path.join(self.get_temp_dir(), 'memmap_rb'))
+    replay_buffer = py_uniform_replay_buffer.PyUniformReplayBuffer(
+        data_spec=data_spec, capacity=10, storage_fn=storage_fn)
+    items = np.stack([np.arange(13), -np.arange(13)], axis=-1).astype(np.int32)
+    replay_buffer.add_batch(items)
+    replay_buffer.add_batch(items[:2])
+    expected = replay_buffer.gather_all()
+
+    # Reopening the directory restores the content and the buffer position.
+    reopened = py_uniform_replay_buffer.PyUniformReplayBuffer(
+        data_spec=data_spec, capacity=10, storage_fn=storage_fn)
+    self.assertEqual(10, reopened.size)
+    self.assertAllEqual(expected, reopened.gather_all())
+
+    # New items are added after the last ones written before reopening.
+    reopened.add_batch(items[2:3])
+    self.assertAllEqual([[0, 1, 2, 6, 7, 8, 9, 10, 11, 12]],
+                        reopened.gather_all()[..., 0])
+
+  def testHashedReplayBufferRejectsWarmStart(self):
+    self._generate_replay_buffer(
+        rb_cls=py_uniform_replay_buffer.PyUniformReplayBuffer)
+    storage_fn = functools.partial(
+        numpy_storage.MemmapStorage,
+        directory=os.path.join(self.get_temp_dir(), 'hashed_rb'))
+    replay_buffer = py_hashed_replay_buffer.PyHashedReplayBuffer(
+        data_spec=self._trajectory_spec, capacity=self._capacity,
+        storage_fn=storage_fn)
+    replay_buffer.add_batch(self._replay_buffer.get_next(sample_batch_size=2))
+
+    with self.assertRaises(ValueError):
+      py_hashed_replay_buffer.PyHashedReplayBuffer(
+          data_spec=self._trajectory_spec, capacity=self._capacity,
+          storage_fn=storage_fn)
+    # The items of the directory are kept, rather than cleared.
+    storage = storage_fn(array_spec.ArraySpec((), np.int32), self._capacity)
+    self.assertEqual(2, storage.read_metadata()['size'])
+
   def testSampleDoesNotCrossHead(self):
     np.random.seed(12345)
 
@@ -143,6 +441,33 @@ class PyUniformReplayBufferTest(parameterized.TestCase, tf.test.TestCase):
     for i in range(9):
       self.assertAlmostEqual(10000 / 9, sample_frequency[i], delta=150)
 
+  def testSampleBatchDoesNotCrossHead(self):
+    np.random.seed(12345)
+
+    data_spec = array_spec.ArraySpec((), np.int32)
+    replay_buffer = py_uniform_replay_buffer.PyUniformReplayBuffer(
+        data_spec=data_spec, capacity=10)
+
+    # Seed RB with 5 elements to move head to position 5, then fill it with
+    # elements 0-9.
+    for _ in range(5):
+      replay_buffer.add_batch(np.array([0]))
+    for i in range(10):
+      replay_buffer.add_batch(np.array([i]))
+
+    batch = replay_buffer.get_next(sample_batch_size=1000, num_steps=3)
+    self.assertEqual((1000, 3), batch.shape)
+    # Every sampled sequence is made of consecutive elements, so none of them
+    # wraps around the head of the circular buffer.
+    self.assertAllEqual(batch[:, 0] + 1, batch[:, 1])
+    self.assertAllEqual(batch[:, 0] + 2, batch[:, 2])
+
+    first, second, third = replay_buffer.get_next(
+        sample_batch_size=1000, num_steps=3, time_stacked=False)
+    self.assertEqual((1000,), first.shape)
+    self.assertAllEqual(first + 1, second)
+    self.assertAllEqual(first + 2, third)
+
   @parameterized.named_parameters(
       [('WithoutHashing', py_uniform_replay_buffer.PyUniformReplayBuffer),
        ('WithHashing', py_hashed_replay_buffer.PyHashedReplayBuffer)])
@@ -177,6 +502,25 @@ class PyUniformReplayBufferTest(parameterized.TestCase, tf.test.TestCase):
       self.assertEqual(traj.observation.shape, (5, 3, 15, 15, 4))
       self.assertEqual(traj.action.shape, (5, 3))
 
+  @parameterized.named_parameters(
+      [('WithoutHashing', py_uniform_replay_buffer.PyUniformReplayBuffer),
+       ('WithHashing', py_hashed_replay_buffer.PyHashedReplayBuffer)])
+  def testSampleBatchesInParallel(self, rb_cls):
+    self._generate_replay_buffer(rb_cls=rb_cls)
+
+    ds = self._replay_buffer.as_dataset(
+        sample_batch_size=5, num_steps=2, num_parallel_calls=3)
+    replay_itr = ds.make_one_shot_iterator()
+    tf_trajectory = replay_itr.get_next()
+    self.assertEqual(tf_trajectory.observation.shape.as_list(),
+                     [5, 2, 15, 15, 4])
+
+    with self.test_session() as sess:
+      for _ in range(10):
+        traj = sess.run(tf_trajectory)
+        self.assertAllEqual(traj.observation[:, 0, 0, 0, 0] + 1,
+                            traj.observation[:, 1, 0, 0, 0])
+
   @parameterized.named_parameters(
       [('WithoutHashing', py_uniform_replay_buffer.PyUniformReplayBuffer),
        ('WithHashing', py_hashed_replay_buffer.PyHashedReplayBuffer)])
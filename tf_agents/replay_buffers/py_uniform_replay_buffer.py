@@ -30,8 +30,11 @@ from __future__ import print_function
 import threading
 
 import numpy as np
+from six.moves import queue
 import tensorflow as tf
 
+from tf_agents.environments import time_step as ts
+from tf_agents.environments import trajectory
 from tf_agents.replay_buffers import numpy_storage
 from tf_agents.replay_buffers import replay_buffer
 from tf_agents.specs import array_spec
@@ -39,6 +42,228 @@ from tf_agents.utils import nest_utils
 
 nest = tf.contrib.framework.nest
 
+# Number of sampled batches each background sampling thread of a dataset can
+# get ahead of the consumer.
+_PREFETCH_BATCHES_PER_THREAD = 2
+# Number of sampling threads when num_parallel_calls is AUTOTUNE. Sampling holds
+# the buffer lock, so more threads mostly contend for it.
+_AUTOTUNE_SAMPLING_THREADS = 2
+
+
+def _background_samples(sample_fn, num_threads):
+  """Yields the outputs of sample_fn, called in a pool of background threads.
+
+  The threads fill a bounded queue of samples, and stop once the generator is
+  closed.
+
+  Args:
+    sample_fn: Function returning a sample, which must be thread safe.
+    num_threads: Number of threads calling sample_fn.
+
+  Yields:
+    The samples, in the order in which they are ready.
+
+  Raises:
+    Exception: Exceptions raised by sample_fn are raised by the generator.
+  """
+  samples = queue.Queue(maxsize=num_threads * _PREFETCH_BATCHES_PER_THREAD)
+  stopped = threading.Event()
+
+  def sample_loop():
+    while not stopped.is_set():
+      try:
+        sample = (sample_fn(), None)
+      except Exception as e:  # pylint: disable=broad-except
+        sample = (None, e)
+      # Wake up regularly to notice that the generator is closed.
+      while not stopped.is_set():
+        try:
+          samples.put(sample, timeout=0.1)
+          break
+        except queue.Full:
+          pass
+
+  threads = [threading.Thread(target=sample_loop, name='replay_sampler')
+             for _ in range(num_threads)]
+  for thread in threads:
+    thread.daemon = True
+    thread.start()
+  try:
+    while True:
+      sample, error = samples.get()
+      if error is not None:
+        raise error
+      yield sample
+  finally:
+    stopped.set()
+
+
+def _n_step_returns(step_types, rewards, discounts, next_step_types, gamma):
+  """Accumulates the rewards and discounts of n-step transitions.
+
+  The steps end at the first step reaching a LAST step, or at the first
+  boundary step, from a LAST step to the next episode. Nothing is bootstrapped
+  after a boundary step, whose discount is 0.
+
+  Args:
+    step_types: Array of step types, shape [..., n].
+    rewards: Array of rewards, shape [..., n].
+    discounts: Array of discounts, shape [..., n].
+    next_step_types: Array of next step types, shape [..., n].
+    gamma: Discount factor of the rewards.
+
+  Returns:
+    A tuple (returns, discount, next_step_type, num_steps) of arrays of shape
+    [...], where num_steps is the number of steps until the end of the episode
+    included, and the other values are accumulated over these steps.
+  """
+  n = rewards.shape[-1]
+  is_boundary = step_types == ts.StepType.LAST
+  is_end = ((next_step_types == ts.StepType.LAST) | is_boundary).astype(
+      np.int64)
+  # Steps after the end of the episode are ignored.
+  valid = (np.cumsum(is_end, axis=-1) - is_end) == 0
+  num_steps = np.sum(valid, axis=-1)
+  gammas = gamma**np.arange(n)
+  cumulative_discounts = np.cumprod(discounts, axis=-1)
+  # The reward of step i is discounted by gamma^i prod_{j<i} d_j.
+  reward_discounts = gammas * np.concatenate(
+      [np.ones_like(discounts[..., :1]), cumulative_discounts[..., :-1]],
+      axis=-1)
+  returns = np.sum(valid * reward_discounts * rewards, axis=-1)
+  last_step = np.arange(n) == np.expand_dims(num_steps - 1, -1)
+  discount = np.sum(last_step * gammas * cumulative_discounts, axis=-1)
+  discount = np.where(np.any(last_step & is_boundary, axis=-1), 0., discount)
+  next_step_type = np.sum(last_step * next_step_types, axis=-1)
+  return (returns.astype(rewards.dtype), discount.astype(discounts.dtype),
+          next_step_type.astype(next_step_types.dtype), num_steps)
+
+
+class EpisodeIndex(tf.contrib.checkpoint.Checkpointable):
+  """Incremental index of the episodes of the items in a replay buffer.
+
+  Keeps a ring of the (first item id, number of items) of the episodes, from
+  the oldest to the newest. An episode starts at an item with a FIRST step type,
+  or at the item following one with a LAST step type (a boundary item belongs to
+  the episode it ends). Items can also be added as a new segment, whose first
+  item starts an episode, e.g. when they come from another environment than
+  the previous items. Adding and removing items is O(1) per item, and windows
+  of num_steps items are sampled uniformly in O(number of episodes), without
+  rejection.
+  """
+
+  def __init__(self, capacity):
+    """Creates an EpisodeIndex.
+
+    Args:
+      capacity: The maximum number of items in the buffer, and so of episodes.
+    """
+    self._capacity = capacity
+    self._np_state = tf.contrib.checkpoint.NumpyState()
+    self.clear()
+
+  def clear(self):
+    """Removes all the episodes."""
+    self._np_state.starts = np.zeros(self._capacity, dtype=np.int64)
+    self._np_state.lengths = np.zeros(self._capacity, dtype=np.int64)
+    self._np_state.first = np.int64(0)
+    self._np_state.num_episodes = np.int64(0)
+    # Whether each episode lost its first items, or started before the first
+    # item of its segment.
+    self._np_state.truncated = np.zeros(self._capacity, dtype=np.int64)
+    self._np_state.last_step_type = np.int64(ts.StepType.FIRST)
+
+  def add(self, first_id, step_types, new_segment=False):
+    """Adds items with consecutive ids after the items already in the index.
+
+    Args:
+      first_id: Id of the first item added.
+      step_types: Array of shape [T] of the step types of the items added.
+      new_segment: Whether the items are a new segment, which does not continue
+        the newest episode.
+    """
+    if not step_types.size:
+      return
+    previous_step_types = np.concatenate(
+        [[self._np_state.last_step_type], step_types[:-1]])
+    is_start = ((step_types == ts.StepType.FIRST) |
+                (previous_step_types == ts.StepType.LAST))
+    truncated = False
+    if new_segment or self._np_state.num_episodes == 0:
+      # The episode of the first item started before it was added, unless the
+      # first item is a FIRST step.
+      is_start[0] = True
+      truncated = step_types[0] != ts.StepType.FIRST
+    new_starts = np.flatnonzero(is_start)
+    if not new_starts.size or new_starts[0] > 0:
+      # The first items continue the newest episode.
+      last = (self._np_state.first + self._np_state.num_episodes -
+              1) % self._capacity
+      self._np_state.lengths[last] += (
+          new_starts[0] if new_starts.size else step_types.size)
+    slots = (self._np_state.first + self._np_state.num_episodes +
+             np.arange(new_starts.size)) % self._capacity
+    self._np_state.starts[slots] = first_id + new_starts
+    self._np_state.lengths[slots] = np.diff(
+        np.append(new_starts, step_types.size))
+    self._np_state.truncated[slots] = 0
+    if truncated:
+      self._np_state.truncated[slots[0]] = 1
+    self._np_state.num_episodes += new_starts.size
+    self._np_state.last_step_type = np.int64(step_types[-1])
+
+  def remove(self, num_items):
+    """Removes the num_items oldest items."""
+    starts = self._np_state.starts
+    lengths = self._np_state.lengths
+    while num_items > 0 and self._np_state.num_episodes > 0:
+      first = self._np_state.first
+      if num_items < lengths[first]:
+        starts[first] += num_items
+        lengths[first] -= num_items
+        self._np_state.truncated[first] = 1
+        return
+      num_items -= lengths[first]
+      self._np_state.first = np.int64((first + 1) % self._capacity)
+      self._np_state.num_episodes -= 1
+
+  def sample_window_starts(self, num_steps, shape, from_episode_start=False):
+    """Samples windows of num_steps items lying fully inside one episode.
+
+    Args:
+      num_steps: Number of items of the windows.
+      shape: Shape of the sampled windows.
+      from_episode_start: If True, only the windows starting at the first item
+        of an episode are sampled.
+
+    Returns:
+      An int64 array of shape `shape`, with the ids of the first items of
+      windows sampled uniformly.
+
+    Raises:
+      ValueError: If no episode has num_steps items.
+    """
+    slots = (self._np_state.first +
+             np.arange(self._np_state.num_episodes)) % self._capacity
+    starts = self._np_state.starts[slots]
+    lengths = self._np_state.lengths[slots]
+    if from_episode_start:
+      counts = ((lengths >= num_steps) &
+                (self._np_state.truncated[slots] == 0)).astype(np.int64)
+    else:
+      counts = np.maximum(lengths - num_steps + 1, 0)
+    cumulative_counts = np.cumsum(counts)
+    total = cumulative_counts[-1] if counts.size else 0
+    if total <= 0:
+      raise ValueError('Read error: no episode in the replay buffer has {} '
+                       'items.'.format(num_steps))
+    values = np.random.randint(total, size=shape)
+    episodes = np.searchsorted(cumulative_counts, values, side='right')
+    if from_episode_start:
+      return starts[episodes]
+    offsets = values - cumulative_counts[episodes] + counts[episodes]
+    return starts[episodes] + offsets
+
 
 class PyUniformReplayBuffer(replay_buffer.ReplayBuffer):
   """A Python-based replay buffer that supports uniform sampling.
@@ -48,20 +273,59 @@ class PyUniformReplayBuffer(replay_buffer.ReplayBuffer):
   This replay buffer can be subclassed to change the encoding used for the
   underlying storage by overriding _encoded_data_spec, _encode, _decode, and
   _on_delete.
+
+  Note that reads and writes are batched: `_encode` and `_on_delete` receive
+  items with a leading batch dimension, and `_decode` receives items with
+  arbitrary outer dimensions (e.g. [B, T, ...] when sampling sub-episodes).
+
+  `add_batch` accepts items with outer dimensions [B] or [B, T]. They are added
+  in row-major order, so the T steps of each batch entry are stored
+  consecutively.
+
+  With a `window_mode`, the buffer keeps an EpisodeIndex of the items added,
+  and sub-episodes sampled with `num_steps` never cross an episode boundary.
+  This requires the items to be trajectories added in order, with outer
+  dimensions [1] or [B, T]. An add of [1] or [1, T] items continues the newest
+  episode, while each row of an add of [B, T] items with B > 1 starts a new
+  episode, as it may come from another environment. When warm started, the
+  index is rebuilt from the step types only, so the rows of past [B, T] adds
+  are only split at the episode boundaries.
   """
 
-  def __init__(self, data_spec, capacity):
+  def __init__(self, data_spec, capacity,
+               storage_fn=numpy_storage.NumpyStorage,
+               window_mode=None):
     """Creates a PyUniformReplayBuffer.
 
     Args:
       data_spec: An ArraySpec or a list/tuple/nest of ArraySpecs describing a
         single item that can be stored in this buffer.
       capacity: The maximum number of items that can be stored in the buffer.
+      storage_fn: Function to create the storage
+        `storage_fn(encoded_data_spec, capacity)`, e.g.
+        `functools.partial(numpy_storage.MemmapStorage, directory=...)` to
+        keep the items in memory-mapped files. If the storage persists
+        metadata, the buffer is warm started from its content.
+      window_mode: How sub-episodes of num_steps items are sampled:
+        - None: starting at any item, possibly crossing episode boundaries.
+        - `replay_buffer.WITHIN_EPISODE`: lying fully inside one episode.
+        - `replay_buffer.EPISODE_START`: lying fully inside one episode and
+          starting at its first item.
+        Requires data_spec to be the spec of a trajectory.
+
+    Raises:
+      ValueError: If window_mode is unknown, or set with a data_spec which is
+        not the spec of a trajectory.
     """
+    if window_mode not in replay_buffer.WINDOW_MODES:
+      raise ValueError('Unknown window_mode: {}'.format(window_mode))
+    if (window_mode is not None and
+        not isinstance(data_spec, trajectory.Trajectory)):
+      raise ValueError('window_mode requires the data_spec to be a '
+                       'trajectory: {}'.format(data_spec))
     super(PyUniformReplayBuffer, self).__init__(data_spec, capacity)
 
-    self._storage = numpy_storage.NumpyStorage(self._encoded_data_spec(),
-                                               capacity)
+    self._storage = storage_fn(self._encoded_data_spec(), capacity)
     self._lock = threading.Lock()
     self._np_state = tf.contrib.checkpoint.NumpyState()
 
@@ -74,20 +338,66 @@ class PyUniformReplayBuffer(replay_buffer.ReplayBuffer):
     # Total number of items that went through the replay buffer.
     self._np_state.item_count = np.int64(0)
 
+    metadata = self._storage.read_metadata()
+    if metadata:
+      self._np_state.size = np.int64(metadata['size'])
+      self._np_state.cur_id = np.int64(metadata['cur_id'])
+      self._np_state.item_count = np.int64(metadata['item_count'])
+
+    self._window_mode = window_mode
+    self._episode_index = None
+    if window_mode is not None:
+      self._episode_index = EpisodeIndex(capacity)
+      size = self._np_state.size
+      if size > 0:
+        # Rebuild the index from the step types of the items in the storage.
+        rows = (self._np_state.cur_id - size + np.arange(size)) % capacity
+        step_types, = self._storage.get_fields(
+            rows, [self._trajectory_field_indices().step_type])
+        self._episode_index.add(self._np_state.item_count - size, step_types)
+
   def _encoded_data_spec(self):
     """Spec of data items after encoding using _encode."""
     return self._data_spec
 
-  def _encode(self, item):
-    """Encodes an item (before adding it to the buffer)."""
-    return item
+  def _encode(self, items):
+    """Encodes a batch of items (before adding them to the buffer)."""
+    return items
 
-  def _decode(self, item):
-    """Decodes an item."""
-    return item
+  def _decode(self, items):
+    """Decodes items, which may have arbitrary outer dimensions."""
+    return items
+
+  def _on_delete(self, encoded_items):
+    """Do any necessary cleanup for a batch of deleted items."""
+    pass
 
-  def _on_delete(self, encoded_item):
-    """Do any necessary cleanup."""
+  def _encoded_trajectory(self, encoded_items):
+    """Returns the trajectory in encoded items, when the items are trajectories.
+
+    Args:
+      encoded_items: A nest with the structure of `_encoded_data_spec()`.
+
+    Returns:
+      The `Trajectory` in encoded_items, whose fields other than the
+      observation are stored as is.
+    """
+    return encoded_items
+
+  def _trajectory_field_indices(self):
+    """Returns the trajectory of the flat indices of the encoded fields."""
+    encoded_spec = self._encoded_data_spec()
+    return self._encoded_trajectory(nest.pack_sequence_as(
+        encoded_spec, list(range(len(nest.flatten(encoded_spec))))))
+
+  def _on_insert(self, rows, encoded_items):
+    """Called with the lock held after encoded_items are written at rows.
+
+    Args:
+      rows: A slice of the storage rows that were written.
+      encoded_items: The encoded items written at rows, with a leading batch
+        dimension.
+    """
     pass
 
   @property
@@ -96,102 +406,278 @@ class PyUniformReplayBuffer(replay_buffer.ReplayBuffer):
 
   def _add_batch(self, items):
     outer_shape = nest_utils.get_outer_array_shape(items, self._data_spec)
-    if outer_shape[0] != 1:
-      raise NotImplementedError('PyUniformReplayBuffer only supports a batch '
-                                'size of 1, but received `items` with batch '
-                                'size {}.'.format(outer_shape[0]))
+    outer_rank = len(outer_shape)
+    num_items = int(np.prod(outer_shape))
+    if num_items == 0:
+      return
+    if self._episode_index is not None and outer_rank == 1 and num_items > 1:
+      raise ValueError('With a window_mode, items must be added with outer '
+                       'dimensions [1] or [B, T], got: {}'.format(outer_shape))
+
+    # Merge the outer dimensions into a single one. Only the last `capacity`
+    # items can survive the write, so the others are not encoded nor written.
+    num_writes = min(num_items, self._capacity)
+    def flatten_outer_dims(x):
+      x = np.reshape(x, (num_items,) + x.shape[outer_rank:])
+      return x[num_items - num_writes:]
+    items = nest.map_structure(flatten_outer_dims, items)
+    encoded_items = self._encode(items)
 
-    item = nest_utils.unbatch_nested_array(items)
     with self._lock:
-      if self._np_state.size == self._capacity:
-        # If we are at capacity, we are deleting element cur_id.
-        self._on_delete(self._storage.get(self._np_state.cur_id))
-      self._storage.set(self._np_state.cur_id, self._encode(item))
-      self._np_state.size = np.minimum(self._np_state.size + 1,
-                                       self._capacity)
-      self._np_state.cur_id = (self._np_state.cur_id + 1) % self._capacity
-      self._np_state.item_count += 1
+      cur_id = int(self._np_state.cur_id)
+      size = int(self._np_state.size)
+      # Write in at most two contiguous slices, split where the ring wraps.
+      # Each segment is (first row, first item, last item + 1).
+      split = min(num_writes, self._capacity - cur_id)
+      for start, begin, end in ((cur_id, 0, split), (0, split, num_writes)):
+        if begin == end:
+          continue
+        stop = start + end - begin
+        # Rows [0, size) hold items, which get deleted when overwritten.
+        if start < size:
+          self._on_delete(self._storage.get(slice(start, min(stop, size))))
+        segment_items = nest.map_structure(lambda x: x[begin:end],  # pylint: disable=cell-var-from-loop
+                                           encoded_items)
+        self._storage.set(slice(start, stop), segment_items)
+        self._on_insert(slice(start, stop), segment_items)
+      if self._episode_index is not None:
+        self._index_episodes(size, outer_shape, num_writes, encoded_items)
+      self._np_state.size = np.int64(min(size + num_writes, self._capacity))
+      self._np_state.cur_id = np.int64((cur_id + num_writes) % self._capacity)
+      self._np_state.item_count += num_items
+      self._write_metadata()
+
+  def _index_episodes(self, size, outer_shape, num_writes, encoded_items):
+    """Adds the items written by `_add_batch` to the episode index.
+
+    Args:
+      size: The size of the buffer before the write.
+      outer_shape: The outer shape of the items added, [1] or [B, T].
+      num_writes: The number of items written, the last ones of the add.
+      encoded_items: The encoded items written.
+    """
+    num_items = int(np.prod(outer_shape))
+    num_skipped = num_items - num_writes
+    step_types = self._encoded_trajectory(encoded_items).step_type
+    self._episode_index.remove(max(0, size + num_writes - self._capacity))
+    # Each row of a [B, T] add with B > 1 is a new segment.
+    new_segment = outer_shape[0] > 1
+    row_length = outer_shape[-1]
+    for row_start in range(num_skipped - num_skipped % row_length, num_items,
+                           row_length):
+      begin = max(row_start - num_skipped, 0)
+      end = row_start + row_length - num_skipped
+      self._episode_index.add(
+          self._np_state.item_count + num_skipped + begin,
+          step_types[begin:end], new_segment=new_segment)
 
   def _get_next(self,
                 sample_batch_size=None,
                 num_steps=None,
                 time_stacked=True):
     num_steps_value = num_steps if num_steps is not None else 1
-    def get_single():
-      """Gets a single item from the replay buffer."""
-      with self._lock:
-        if self._np_state.size <= 0:
-          raise ValueError('Read error: empty replay buffer')
-
-        idx = np.random.randint(self._np_state.size - num_steps_value + 1)
-        if self._np_state.size == self._capacity:
-          # If the buffer is full, add cur_id (head of circular buffer) so that
-          # we sample from the range [cur_id, cur_id + size - num_steps_value].
-          # We will modulo the size below.
-          idx += self._np_state.cur_id
-
-        if num_steps is not None:
-          # TODO(b/120242830): Try getting data from numpy in one shot rather
-          # than num_steps_value.
-          item = [self._decode(self._storage.get((idx + n) % self._capacity))
-                  for n in range(num_steps)]
-        else:
-          item = self._decode(self._storage.get(idx % self._capacity))
-
-      if num_steps is not None and time_stacked:
-        item = nest_utils.stack_nested_arrays(item)
-      return item
-
-    if sample_batch_size is None:
-      return get_single()
-    else:
-      samples = [get_single() for _ in range(sample_batch_size)]
-      return nest_utils.stack_nested_arrays(samples)
+    rows_shape = () if sample_batch_size is None else (sample_batch_size,)
+    with self._lock:
+      if self._np_state.size <= 0:
+        raise ValueError('Read error: empty replay buffer')
+
+      if num_steps is not None and self._episode_index is not None:
+        start_ids = self._episode_index.sample_window_starts(
+            num_steps, rows_shape,
+            from_episode_start=self._window_mode == replay_buffer.EPISODE_START)
+        # Convert the item ids to rows, relative to the next row to write.
+        idx = self._np_state.cur_id - (self._np_state.item_count - start_ids)
+      else:
+        idx = self._sample_start_rows(num_steps_value, rows_shape)
+
+      item = self._read(idx, num_steps)
+
+    if num_steps is not None and not time_stacked:
+      item = self._unstack_time(item, len(rows_shape), num_steps)
+    return item
 
-  def _as_dataset(self, sample_batch_size=None, num_steps=None,
-                  num_parallel_calls=None):
-    if num_parallel_calls is not None:
-      raise NotImplementedError('PyUniformReplayBuffer does not support '
-                                'num_parallel_calls (must be None).')
+  def _num_unsampled_items(self):
+    """Returns the number of oldest items which cannot be sampled.
+
+    Subclasses decoding items from the previous ones override it, to exclude
+    the oldest items once their previous items were overwritten.
+    """
+    return 0
 
-    data_spec = self._data_spec
+  def _sample_start_rows(self, num_steps, rows_shape):
+    """Samples rows uniformly, starting num_steps items in the buffer.
+
+    Requires the lock to be held.
+
+    Args:
+      num_steps: Number of consecutive items to read from each row.
+      rows_shape: Shape of the sampled rows.
+
+    Returns:
+      An array of rows, possibly larger than the capacity.
+
+    Raises:
+      ValueError: If the buffer does not hold enough items.
+    """
+    num_skipped = self._num_unsampled_items()
+    num_starts = self._np_state.size - num_skipped - num_steps + 1
+    if num_starts <= 0:
+      raise ValueError('Read error: not enough items in the replay buffer '
+                       'to sample {} steps.'.format(num_steps))
+    # Draw all the start indices at once, shape rows_shape.
+    idx = num_skipped + np.random.randint(num_starts, size=rows_shape)
+    if self._np_state.size == self._capacity:
+      # If the buffer is full, add cur_id (head of circular buffer) so that
+      # we sample from the range [cur_id, cur_id + size - num_steps]. We will
+      # modulo the size below.
+      idx += self._np_state.cur_id
+    return idx
+
+  def _read(self, idx, num_steps=None):
+    """Reads and decodes items starting at idx. Requires the lock to be held.
+
+    Args:
+      idx: Array of start rows, possibly larger than the capacity.
+      num_steps: Optional number of consecutive items to read from each row.
+
+    Returns:
+      The decoded items, shaped idx.shape + [num_steps] if num_steps is not
+      None, otherwise idx.shape.
+    """
+    if num_steps is not None:
+      # Shape idx.shape + [num_steps], so that each field is gathered with a
+      # single fancy-index read already stacked on the time dimension.
+      idx = np.expand_dims(idx, -1) + np.arange(num_steps)
+    return self._decode(self._storage.get(idx % self._capacity))
+
+  def _get_next_n_step(self, sample_batch_size=None, n_step=1, gamma=1.0):
+    if not isinstance(self._data_spec, trajectory.Trajectory):
+      raise ValueError('n-step sampling requires the data_spec to be a '
+                       'trajectory: {}'.format(self._data_spec))
+    rows_shape = () if sample_batch_size is None else (sample_batch_size,)
+    # Flat indices of the fields accumulated over the n steps.
+    field_indices = self._trajectory_field_indices()
+    with self._lock:
+      idx = self._sample_start_rows(n_step + 1, rows_shape)
+      # Only the step types, reward and discount are read for the n steps.
+      step_rows = (np.expand_dims(idx, -1) + np.arange(n_step)) % self._capacity
+      step_types, rewards, discounts, next_step_types = (
+          self._storage.get_fields(
+              step_rows, [field_indices.step_type, field_indices.reward,
+                          field_indices.discount,
+                          field_indices.next_step_type]))
+      returns, discount, next_step_type, num_steps = _n_step_returns(
+          step_types, rewards, discounts, next_step_types, gamma)
+      item = self._read(np.stack([idx, idx + num_steps], axis=-1))
+
+    # Replace the values of the first step with the accumulated ones.
+    first_step = (slice(None),) * len(rows_shape) + (0,)
+    item.reward[first_step] = returns
+    item.discount[first_step] = discount
+    item.next_step_type[first_step] = next_step_type
+    return item
+
+  def _unstack_time(self, item, time_axis, num_steps):
+    """Splits time stacked items into a tuple of num_steps items."""
+    def time_slice(n):
+      return nest.map_structure(lambda t: np.take(t, n, axis=time_axis), item)
+    return tuple(time_slice(n) for n in range(num_steps))
+
+  def _get_next_spec(self, sample_batch_size=None, num_steps=None):
+    """Returns the spec of the time stacked output of `_get_next`."""
+    outer_dims = []
     if sample_batch_size is not None:
-      data_spec = array_spec.add_outer_dims_nest(
-          data_spec, (sample_batch_size,))
+      outer_dims.append(sample_batch_size)
     if num_steps is not None:
-      data_spec = (data_spec,) * num_steps
-    shapes = tuple(s.shape for s in nest.flatten(data_spec))
-    dtypes = tuple(s.dtype for s in nest.flatten(data_spec))
+      outer_dims.append(num_steps)
+    return array_spec.add_outer_dims_nest(self._data_spec, tuple(outer_dims))
+
+  def _as_dataset(self, sample_batch_size=None, num_steps=None,
+                  num_parallel_calls=None):
+    """Creates a dataset of batches sampled with `get_next`.
+
+    Args:
+      sample_batch_size: (Optional.) An optional batch_size to specify the
+        number of items to return. See as_dataset() documentation.
+      num_steps: (Optional.)  Optional way to specify that sub-episodes are
+        desired. See as_dataset() documentation.
+      num_parallel_calls: (Optional.) Number of background threads sampling
+        batches ahead of the consumer of the dataset, or
+        `tf.data.experimental.AUTOTUNE`. If None, batches are sampled when
+        requested by the dataset.
+
+    Returns:
+      A dataset of type tf.data.Dataset, elements of which are time stacked
+      items or batches thereof.
+    """
+    return self._generator_dataset(
+        lambda: self._get_next(sample_batch_size, num_steps, time_stacked=True),
+        self._get_next_spec(sample_batch_size, num_steps),
+        num_parallel_calls)
+
+  def _as_n_step_dataset(self,
+                         sample_batch_size=None,
+                         n_step=1,
+                         gamma=1.0,
+                         num_parallel_calls=None):
+    return self._generator_dataset(
+        lambda: self._get_next_n_step(sample_batch_size, n_step, gamma),
+        self._get_next_spec(sample_batch_size, num_steps=2),
+        num_parallel_calls)
+
+  def _generator_dataset(self, get_next_fn, output_spec,
+                         num_parallel_calls=None):
+    """Creates a dataset of the outputs of get_next_fn, matching output_spec.
+
+    Args:
+      get_next_fn: Thread safe function returning a nest of arrays matching
+        output_spec.
+      output_spec: Nest of ArraySpecs of the elements of the dataset.
+      num_parallel_calls: Optional number of background threads calling
+        get_next_fn, or `tf.data.experimental.AUTOTUNE`.
+
+    Returns:
+      A tf.data.Dataset of the outputs of get_next_fn.
+
+    Raises:
+      ValueError: If num_parallel_calls is not a python int.
+    """
+    if num_parallel_calls == tf.data.experimental.AUTOTUNE:
+      num_parallel_calls = _AUTOTUNE_SAMPLING_THREADS
+    if num_parallel_calls is not None and not isinstance(
+        num_parallel_calls, int):
+      raise ValueError('num_parallel_calls must be a python int for Python '
+                       'replay buffers: {}'.format(num_parallel_calls))
+    shapes = tuple(s.shape for s in nest.flatten(output_spec))
+    dtypes = tuple(s.dtype for s in nest.flatten(output_spec))
 
     def generator_fn():
-      while True:
-        if sample_batch_size is not None:
-          batch = [self._get_next(num_steps=num_steps, time_stacked=False)
-                   for _ in range(sample_batch_size)]
-          item = nest_utils.stack_nested_arrays(batch)
-        else:
-          item = self._get_next(num_steps=num_steps, time_stacked=False)
-        yield tuple(nest.flatten(item))
-
-    def time_stack(*structures):
-      time_axis = 0 if sample_batch_size is None else 1
-      return nest.map_structure(
-          lambda *elements: tf.stack(elements, axis=time_axis), *structures)
-
-    ds = tf.data.Dataset.from_generator(generator_fn, dtypes, shapes).map(
-        lambda *items: nest.pack_sequence_as(data_spec, items))
-    if num_steps is not None:
-      return ds.map(time_stack)
-    else:
-      return ds
+      if num_parallel_calls:
+        # Each iterator of the dataset gets its own sampling threads.
+        samples = _background_samples(get_next_fn, num_parallel_calls)
+      else:
+        samples = iter(get_next_fn, None)
+      for sample in samples:
+        yield tuple(nest.flatten(sample))
+
+    return tf.data.Dataset.from_generator(generator_fn, dtypes, shapes).map(
+        lambda *items: nest.pack_sequence_as(output_spec, items))
 
   def _gather_all(self):
-    data = [self._decode(self._storage.get(idx))
-            for idx in range(self._capacity)]
-    stacked = nest_utils.stack_nested_arrays(data)
-    batched = nest.map_structure(lambda t: np.expand_dims(t, 0), stacked)
+    data = self._decode(self._storage.get(np.arange(self._capacity)))
+    batched = nest.map_structure(lambda t: np.expand_dims(t, 0), data)
     return batched
 
   def _clear(self):
     self._np_state.size = np.int64(0)
     self._np_state.cur_id = np.int64(0)
+    if self._episode_index is not None:
+      self._episode_index.clear()
+    self._write_metadata()
+
+  def _write_metadata(self):
+    """Persists the position in the buffer along with the storage content."""
+    self._storage.write_metadata(
+        size=self._np_state.size,
+        cur_id=self._np_state.cur_id,
+        item_count=self._np_state.item_count)
@@ -24,6 +24,13 @@ import six
 
 import tensorflow as tf
 
+# Window modes of the uniform replay buffers, to sample sub-episodes of
+# num_steps items which lie fully inside one episode, or which also start at the
+# first item of an episode.
+WITHIN_EPISODE = 'within_episode'
+EPISODE_START = 'episode_start'
+WINDOW_MODES = (None, WITHIN_EPISODE, EPISODE_START)
+
 
 @six.add_metaclass(abc.ABCMeta)
 class ReplayBuffer(tf.contrib.eager.Checkpointable):
@@ -145,6 +152,62 @@ class ReplayBuffer(tf.contrib.eager.Checkpointable):
     """
     return self._as_dataset(sample_batch_size, num_steps, num_parallel_calls)
 
+  def get_next_n_step(self, sample_batch_size=None, n_step=1, gamma=1.0):
+    """Returns an n-step transition or batch thereof from the buffer.
+
+    The data_spec of the buffer must be a `Trajectory`. Each n-step transition
+    is returned as a 2-step trajectory of the items at t and t + k, where k is
+    n_step or fewer when the episode ends before. Only these two items are read
+    in full, the rewards and discounts of the k steps are accumulated in the
+    first item:
+      - `reward` is the discounted return sum_i gamma^i prod_{j<i} d_j r_i.
+      - `discount` is gamma^(k-1) prod_{i<k} d_i.
+      - `next_step_type` is the next step type of step t + k - 1.
+    Agents computing targets as `reward + gamma * discount * Q(observation at
+    t + k)`, like DqnAgent, thus train on n-step targets.
+
+    Args:
+      sample_batch_size: (Optional.) An optional batch_size to specify the
+        number of transitions to return. See get_next() documentation.
+      n_step: Maximum number of steps of the transitions.
+      gamma: Discount factor of the rewards, which should match the one of the
+        agent.
+
+    Returns:
+      A 2-tuple containing:
+        - A 2-step trajectory, shaped like `get_next(sample_batch_size,
+          num_steps=2)`.
+        - Auxiliary info for the items (i.e. ids, probs).
+    """
+    return self._get_next_n_step(sample_batch_size, n_step, gamma)
+
+  def as_n_step_dataset(self,
+                        sample_batch_size=None,
+                        n_step=1,
+                        gamma=1.0,
+                        num_parallel_calls=None):
+    """Creates and returns a dataset of n-step transitions from the buffer.
+
+    A single entry from the dataset is equivalent to one output from
+    `get_next_n_step(sample_batch_size, n_step, gamma)`.
+
+    Args:
+      sample_batch_size: (Optional.) An optional batch_size to specify the
+        number of transitions to return. See as_dataset() documentation.
+      n_step: Maximum number of steps of the transitions.
+      gamma: Discount factor of the rewards, which should match the one of the
+        agent.
+      num_parallel_calls: (Optional.) Number elements to process in parallel.
+        See as_dataset() documentation.
+
+    Returns:
+      A dataset of type tf.data.Dataset, elements of which are 2-tuples of:
+        - A 2-step trajectory or batch thereof.
+        - Auxiliary info for the items (i.e. ids, probs).
+    """
+    return self._as_n_step_dataset(sample_batch_size, n_step, gamma,
+                                   num_parallel_calls)
+
   def gather_all(self):
     """Returns all the items in buffer.
 
@@ -182,6 +245,20 @@ class ReplayBuffer(tf.contrib.eager.Checkpointable):
                   num_parallel_calls=None):
     """Creates and returns a dataset that returns entries from the buffer."""
 
+  def _get_next_n_step(self, sample_batch_size=None, n_step=1, gamma=1.0):
+    """Returns an n-step transition or batch thereof from the buffer."""
+    raise NotImplementedError(
+        '{} does not support n-step sampling.'.format(type(self).__name__))
+
+  def _as_n_step_dataset(self,
+                         sample_batch_size=None,
+                         n_step=1,
+                         gamma=1.0,
+                         num_parallel_calls=None):
+    """Creates and returns a dataset of n-step transitions from the buffer."""
+    raise NotImplementedError(
+        '{} does not support n-step sampling.'.format(type(self).__name__))
+
   @abc.abstractmethod
   def _gather_all(self):
     """Returns all the items in buffer."""
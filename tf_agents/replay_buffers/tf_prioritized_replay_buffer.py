@@ -0,0 +1,274 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A batched replay buffer of nests of Tensors with prioritized sampling.
+
+- Stores items like the TFUniformReplayBuffer, and keeps a priority per row in
+a Table.
+- Samples rows proportionally to their priority in the graph, with a search in
+the cumulative sum of the priorities, so that no round-trip to Python is needed.
+- New items get the maximum priority seen so far, and priorities are updated by
+running the op returned by `update_priorities(ids, priorities)`, e.g. with the
+absolute TD errors computed by the agent.
+
+Example usage with a DQN agent:
+
+```python
+(experience, buffer_info) = replay_buffer.get_next(
+    sample_batch_size=64, num_steps=2)
+loss_info = agent.train(experience, weights=buffer_info.weights)
+update_op = replay_buffer.update_priorities(
+    buffer_info.ids, tf.abs(loss_info.extra.td_error))
+```
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+from tf_agents.replay_buffers import py_prioritized_replay_buffer
+from tf_agents.replay_buffers import table
+from tf_agents.replay_buffers import tf_uniform_replay_buffer
+from tf_agents.specs import tensor_spec
+import gin.tf
+
+
+PrioritizedBufferInfo = py_prioritized_replay_buffer.PrioritizedBufferInfo
+
+
+@gin.configurable
+class TFPrioritizedReplayBuffer(tf_uniform_replay_buffer.TFUniformReplayBuffer):
+  """A TFUniformReplayBuffer with proportional prioritized sampling."""
+
+  def __init__(self,
+               data_spec,
+               batch_size,
+               max_length=1000,
+               alpha=0.6,
+               beta=0.4,
+               epsilon=1e-6,
+               scope='TFPrioritizedReplayBuffer',
+               device='cpu:*',
+               table_fn=table.Table):
+    """Creates a TFPrioritizedReplayBuffer.
+
+    Args:
+      data_spec: A TensorSpec or a list/tuple/nest of TensorSpecs describing a
+        single item that can be stored in this buffer.
+      batch_size: Batch dimension of tensors when adding to buffer.
+      max_length: The maximum number of items that can be stored in a single
+        batch segment of the buffer.
+      alpha: Priority exponent, 0 corresponds to uniform sampling.
+      beta: Importance sampling exponent, a float or a scalar float Tensor
+        (e.g. annealed as a function of the global step). 1 fully compensates
+        for the non-uniform sampling.
+      epsilon: Small value added to priorities so that no item has a zero
+        probability of being sampled.
+      scope: Scope prefix for variables and ops created by this class.
+      device: A TensorFlow device to place the Variables and ops.
+      table_fn: Function to create tables `table_fn(data_spec, capacity)` that
+        can read/write nested tensors.
+    """
+    super(TFPrioritizedReplayBuffer, self).__init__(
+        data_spec,
+        batch_size,
+        max_length=max_length,
+        scope=scope,
+        device=device,
+        table_fn=table_fn)
+    self._alpha = alpha
+    self._beta = beta
+    self._epsilon = epsilon
+    self._priority_spec = tensor_spec.TensorSpec(
+        [], dtype=tf.float32, name='priority')
+    with tf.device(self._device), tf.variable_scope(self._scope):
+      self._priority_table = table_fn(self._priority_spec,
+                                      self._capacity_value)
+      # Maximum priority seen so far, after applying alpha.
+      self._max_priority = tf.get_variable(
+          name='max_priority',
+          shape=[],
+          dtype=tf.float32,
+          initializer=tf.constant_initializer(1.0),
+          use_resource=True,
+          trainable=False)
+
+  def _on_write(self, write_rows):
+    """Returns an op giving the max priority to the items written."""
+    return [self._priority_table.write(
+        write_rows,
+        tf.fill(tf.shape(write_rows), self._max_priority.value()))]
+
+  def _get_next(self,
+                sample_batch_size=None,
+                num_steps=None,
+                time_stacked=True):
+    """Returns an item or batch of items sampled by priority from the buffer.
+
+    Args:
+      sample_batch_size: (Optional.) An optional batch_size to specify the
+        number of items to return. See get_next() documentation.
+      num_steps: (Optional.)  Optional way to specify that sub-episodes are
+        desired. See get_next() documentation.
+      time_stacked: Bool, when true and num_steps > 1 get_next on the buffer
+        would return the items stack on the time dimension. The outputs would be
+        [B, T, ..] if sample_batch_size is given or [T, ..] otherwise.
+    Returns:
+      A 2 tuple, containing:
+        - An item, sequence of items, or batch thereof sampled by priority
+          from the buffer.
+        - PrioritizedBufferInfo NamedTuple, containing:
+          - The ids of the items (of the first item of each sub-episode when
+            num_steps is set), to be passed to `update_priorities`.
+          - The sampling probability of each item.
+          - The importance sampling weight of each item, normalized by the
+            maximum weight.
+    """
+    with tf.device(self._device), tf.name_scope(self._scope):
+      with tf.name_scope('get_next'):
+        min_val, max_val = self._valid_range_ids(
+            self._get_last_id(), self._max_length, num_steps)
+        rows_shape = () if sample_batch_size is None else (sample_batch_size,)
+        assert_nonempty = tf.assert_greater(
+            max_val,
+            min_val,
+            message='TFPrioritizedReplayBuffer is empty. Make sure to add '
+            'items before sampling the buffer.')
+
+        # Rows can start a sample when their id is in [min_val, max_val). The
+        # valid ids are contiguous, and the same in all the batch segments.
+        positions = tf.range(self._max_length, dtype=tf.int64)
+        valid_positions = tf.less(
+            tf.mod(positions - min_val, self._max_length), max_val - min_val)
+        valid_rows = tf.tile(valid_positions, [self._batch_size])
+        priorities = self._priority_table.read(
+            tf.range(self._capacity_value, dtype=tf.int64))
+        priorities = tf.where(valid_rows, tf.to_double(priorities),
+                              tf.zeros([self._capacity_value], tf.float64))
+
+        # Search the sampled values in the cumulative sum of the priorities.
+        cumulative_priorities = tf.cumsum(priorities)
+        total = cumulative_priorities[-1]
+        with tf.control_dependencies([assert_nonempty]):
+          values = tf.random_uniform(rows_shape, dtype=tf.float64) * total
+        rows = tf.searchsorted(
+            cumulative_priorities, tf.reshape(values, [-1]), side='right',
+            out_type=tf.int64)
+        # Rounding can lead to values equal to the total, which would be
+        # found past the last row with a non zero priority.
+        last_row = tf.searchsorted(
+            cumulative_priorities, tf.reshape(total, [1]), side='left',
+            out_type=tf.int64)
+        rows = tf.reshape(tf.minimum(rows, last_row), rows_shape)
+
+        probabilities = tf.gather(priorities, rows) / total
+        min_probability = tf.reduce_min(
+            tf.where(valid_rows, priorities,
+                     tf.fill([self._capacity_value],
+                             tf.constant(np.inf, tf.float64)))) / total
+        weights = tf.pow(probabilities / min_probability,
+                         -tf.to_double(self._beta))
+
+        # Read the num_steps items following each row in its batch segment.
+        segments = tf.floordiv(rows, self._max_length)
+        if num_steps is None:
+          data = self._data_table.read(rows)
+        else:
+          steps = tf.range(num_steps, dtype=tf.int64)
+          step_rows = (
+              tf.expand_dims(segments * self._max_length, -1) +
+              tf.mod(tf.expand_dims(rows, -1) + steps, self._max_length))
+          if time_stacked:
+            data = self._data_table.read(step_rows)
+          else:
+            data = tuple(self._data_table.read(step_rows[..., step])
+                         for step in range(num_steps))
+        # Ids are shared by the batch segments, so the segment is added to
+        # identify rows uniquely.
+        ids = self._id_table.read(rows) * self._batch_size + segments
+
+        buffer_info = PrioritizedBufferInfo(
+            ids=ids,
+            probabilities=tf.to_float(probabilities),
+            weights=tf.to_float(weights))
+    return data, buffer_info
+
+  def _get_next_n_step(self, sample_batch_size=None, n_step=1, gamma=1.0):
+    raise NotImplementedError(
+        'TFPrioritizedReplayBuffer does not support n-step sampling.')
+
+  def _as_n_step_dataset(self,
+                         sample_batch_size=None,
+                         n_step=1,
+                         gamma=1.0,
+                         num_parallel_calls=None):
+    raise NotImplementedError(
+        'TFPrioritizedReplayBuffer does not support n-step sampling.')
+
+  def update_priorities(self, ids, priorities):
+    """Returns an op updating the priorities of items.
+
+    Ids of items which have been overwritten since they were sampled are
+    ignored.
+
+    Args:
+      ids: Tensor of item ids, as returned in the `PrioritizedBufferInfo` of
+        `get_next`.
+      priorities: Tensor of new priorities, with the same shape as ids, e.g.
+        the absolute TD errors of the items.
+
+    Returns:
+      An op that updates the priorities.
+    """
+    with tf.device(self._device), tf.name_scope(self._scope):
+      with tf.name_scope('update_priorities'):
+        ids = tf.reshape(tf.convert_to_tensor(ids, dtype=tf.int64), [-1])
+        priorities = tf.reshape(
+            tf.convert_to_tensor(priorities, dtype=tf.float32), [-1])
+        priorities = tf.pow(tf.abs(priorities) + self._epsilon, self._alpha)
+
+        item_ids = tf.floordiv(ids, self._batch_size)
+        segments = tf.mod(ids, self._batch_size)
+        rows = segments * self._max_length + tf.mod(item_ids, self._max_length)
+        is_current = tf.equal(self._id_table.read(rows), item_ids)
+        rows = tf.boolean_mask(rows, is_current)
+        priorities = tf.boolean_mask(priorities, is_current)
+
+        write_op = self._priority_table.write(rows, priorities)
+        max_priority_op = self._max_priority.assign(
+            tf.maximum(self._max_priority.value(),
+                       tf.reduce_max(tf.concat([[0.], priorities], 0))))
+        return tf.group(write_op, max_priority_op)
+
+  def _clear(self, clear_all_variables=False):
+    """Return op that resets the contents of replay buffer.
+
+    Args:
+      clear_all_variables: boolean indicating if all variables should be
+        cleared. See TFUniformReplayBuffer.clear().
+
+    Returns:
+      op that clears or unlinks the replay buffer contents.
+    """
+    clear_op = super(TFPrioritizedReplayBuffer, self)._clear(
+        clear_all_variables)
+    assignments = [clear_op, self._max_priority.assign(1.0)]
+    if clear_all_variables:
+      assignments += [v.assign(tf.zeros_like(v))
+                      for v in self._priority_table.variables()]
+    return tf.group(*assignments, name='clear_priorities')
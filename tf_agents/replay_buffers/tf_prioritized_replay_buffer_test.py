@@ -0,0 +1,182 @@
+# coding=utf-8
+# Copyright 2018 The TF-Agents Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for tf_prioritized_replay_buffer."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from absl.testing import parameterized
+import numpy as np
+import tensorflow as tf
+
+from tf_agents import specs
+from tf_agents.replay_buffers import tf_prioritized_replay_buffer
+
+
+class TFPrioritizedReplayBufferTest(parameterized.TestCase, tf.test.TestCase):
+
+  def _create_replay_buffer(self, batch_size=1, max_length=4):
+    spec = specs.TensorSpec([], tf.int64, 'value')
+    replay_buffer = tf_prioritized_replay_buffer.TFPrioritizedReplayBuffer(
+        spec,
+        batch_size=batch_size,
+        max_length=max_length,
+        alpha=1.0,
+        beta=1.0,
+        epsilon=0.,
+        scope='rb{}'.format(batch_size))
+    # Items of segment b have values 100 * b + [0, 1, 2, ...].
+    counter = tf.Variable(0, dtype=tf.int64)
+    add_op = replay_buffer.add_batch(
+        counter.assign_add(1) - 1 +
+        100 * tf.range(batch_size, dtype=tf.int64))
+    return replay_buffer, add_op
+
+  def testGetNextEmpty(self):
+    replay_buffer, _ = self._create_replay_buffer()
+    sample, _ = replay_buffer.get_next()
+    self.evaluate(tf.global_variables_initializer())
+    with self.assertRaisesRegexp(
+        tf.errors.InvalidArgumentError, 'TFPrioritizedReplayBuffer is empty.'):
+      self.evaluate(sample)
+
+  @parameterized.named_parameters(
+      ('BatchSizeOne', 1),
+      ('BatchSizeTwo', 2),
+  )
+  def testNewItemsHaveMaxPriority(self, batch_size):
+    replay_buffer, add_op = self._create_replay_buffer(batch_size)
+    sample, info = replay_buffer.get_next(sample_batch_size=100)
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      for _ in range(6):
+        sess.run(add_op)
+      sample_, info_ = sess.run((sample, info))
+      self.assertAllEqual(
+          np.arange(2, 6) + 100 * np.arange(batch_size)[:, None],
+          np.reshape(np.unique(sample_), [batch_size, 4]))
+      self.assertAllClose([0.25 / batch_size] * 100, info_.probabilities)
+      self.assertAllClose([1.] * 100, info_.weights)
+
+  @parameterized.named_parameters(
+      ('BatchSizeOne', 1),
+      ('BatchSizeTwo', 2),
+  )
+  def testSampleProportionally(self, batch_size):
+    replay_buffer, add_op = self._create_replay_buffer(batch_size)
+    sample, info = replay_buffer.get_next(sample_batch_size=10000)
+    ids = tf.placeholder(tf.int64, [None])
+    priorities = tf.placeholder(tf.float32, [None])
+    update_op = replay_buffer.update_priorities(ids, priorities)
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      for _ in range(6):
+        sess.run(add_op)
+      # Sets the priority of each item to its value modulo 100 minus 1.
+      item_ids = np.unique(sess.run(info.ids))
+      self.assertEqual(4 * batch_size, item_ids.size)
+      sess.run(update_op, {
+          ids: item_ids,
+          priorities: item_ids // batch_size - 1.
+      })
+
+      sample_, info_ = sess.run((sample, info))
+      frequencies = np.bincount(sample_ % 100, minlength=6) / 10000.
+      self.assertAllClose([0., 0., 0.1, 0.2, 0.3, 0.4], frequencies, atol=0.02)
+      self.assertAllClose((sample_ % 100 - 1) / (10. * batch_size),
+                          info_.probabilities)
+      # Weights are normalized by the weight of the least likely item.
+      self.assertAllClose(1. / (sample_ % 100 - 1), info_.weights)
+
+  def testIgnoresOverwrittenIds(self):
+    replay_buffer, add_op = self._create_replay_buffer()
+    sample, info = replay_buffer.get_next(sample_batch_size=1000)
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      sess.run(add_op)
+      _, info_ = sess.run((sample, info))
+      for _ in range(5):
+        sess.run(add_op)
+      # Item 0 was overwritten by item 4.
+      sess.run(replay_buffer.update_priorities(info_.ids[:1], [100.]))
+      _, info_ = sess.run((sample, info))
+      self.assertAllClose([0.25] * 1000, info_.probabilities)
+
+  @parameterized.named_parameters(
+      ('BatchSizeOne', 1),
+      ('BatchSizeTwo', 2),
+  )
+  def testSampleDoesNotCrossHead(self, batch_size):
+    replay_buffer, add_op = self._create_replay_buffer(batch_size)
+    sample, info = replay_buffer.get_next(sample_batch_size=1000, num_steps=2)
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      for _ in range(6):
+        sess.run(add_op)
+      # The last item cannot start a sub-episode, even with a high priority.
+      sess.run(replay_buffer.update_priorities([5 * batch_size], [100.]))
+      sample_, info_ = sess.run((sample, info))
+      self.assertEqual((1000, 2), sample_.shape)
+      self.assertAllEqual(sample_[:, 0] + 1, sample_[:, 1])
+      self.assertAllClose([1. / (3 * batch_size)] * 1000, info_.probabilities)
+
+  def testAddSteps(self):
+    spec = specs.TensorSpec([], tf.int64, 'value')
+    replay_buffer = tf_prioritized_replay_buffer.TFPrioritizedReplayBuffer(
+        spec, batch_size=2, max_length=4, alpha=1.0, beta=1.0, epsilon=0.)
+    items = tf.placeholder(tf.int64, [2, None])
+    add_op = replay_buffer.add_batch(items)
+    sample, info = replay_buffer.get_next(sample_batch_size=1000)
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      # Items of segment b have values 100 * b + [0, 1, 2, ...].
+      for steps in [np.arange(3), np.arange(3, 6)]:
+        sess.run(add_op, {items: steps + 100 * np.arange(2)[:, None]})
+      sample_, info_ = sess.run((sample, info))
+      self.assertAllEqual([2, 3, 4, 5, 102, 103, 104, 105],
+                          np.unique(sample_))
+      self.assertAllClose([1. / 8] * 1000, info_.probabilities)
+
+      # All the steps of a sequence get the max priority.
+      sess.run(replay_buffer.update_priorities([5 * 2], [3.]))
+      sess.run(add_op, {items: [[6, 7], [106, 107]]})
+      sample_, info_ = sess.run((sample, info))
+      self.assertAllEqual([4, 5, 6, 7, 104, 105, 106, 107],
+                          np.unique(sample_))
+      expected_priorities = np.where(np.isin(sample_, [5, 6, 7, 106, 107]),
+                                     3., 1.)
+      self.assertAllClose(expected_priorities / 18., info_.probabilities)
+
+  def testClear(self):
+    replay_buffer, add_op = self._create_replay_buffer()
+    sample, info = replay_buffer.get_next(sample_batch_size=100)
+    update_op = replay_buffer.update_priorities([3], [100.])
+    clear_op = replay_buffer.clear()
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      for _ in range(4):
+        sess.run(add_op)
+      sess.run(update_op)
+      sess.run(clear_op)
+      for _ in range(2):
+        sess.run(add_op)
+      sample_, info_ = sess.run((sample, info))
+      self.assertAllEqual([4, 5], np.unique(sample_))
+      self.assertAllClose([0.5] * 100, info_.probabilities)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -18,6 +18,8 @@
 - Each add assumes tensors have batch_size as first dimension, and will store
 each element of the batch in an offset segment, so that each batch dimension has
 its own contiguous memory. Within batch segments, behaves as a circular buffer.
+An add may also have a time dimension [batch_size, T, ...], e.g. trajectories
+of T steps, which are written in order in their batch segments in one op.
 
 The get_next function returns 'ids' in addition to the data. This is not really
 needed for the batched replay buffer, but is returned to be consistent with
@@ -32,6 +34,8 @@ import collections
 import numpy as np
 import tensorflow as tf
 
+from tf_agents.environments import time_step as ts
+from tf_agents.environments import trajectory
 from tf_agents.replay_buffers import replay_buffer
 from tf_agents.replay_buffers import table
 from tf_agents.specs import tensor_spec
@@ -46,6 +50,50 @@ BufferInfo = collections.namedtuple('BufferInfo',
                                     ['ids', 'probabilities'])
 
 
+def _n_step_returns(step_types, rewards, discounts, next_step_types, gamma):
+  """Accumulates the rewards and discounts of n-step transitions.
+
+  The steps end at the first step reaching a LAST step, or at the first
+  boundary step, from a LAST step to the next episode. Nothing is bootstrapped
+  after a boundary step, whose discount is 0.
+
+  Args:
+    step_types: Tensor of step types, shape [..., n].
+    rewards: Tensor of rewards, shape [..., n].
+    discounts: Tensor of discounts, shape [..., n].
+    next_step_types: Tensor of next step types, shape [..., n].
+    gamma: Discount factor of the rewards.
+
+  Returns:
+    A tuple (returns, discount, next_step_type, num_steps) of tensors of shape
+    [...], where num_steps is the number of steps until the end of the episode
+    included, and the other values are accumulated over these steps.
+  """
+  n = rewards.shape[-1].value
+  is_boundary = tf.equal(step_types, ts.StepType.LAST)
+  is_end = tf.to_int64(tf.logical_or(
+      tf.equal(next_step_types, ts.StepType.LAST), is_boundary))
+  # Steps after the end of the episode are ignored.
+  valid = tf.cast(
+      tf.equal(tf.cumsum(is_end, axis=-1, exclusive=True), 0), rewards.dtype)
+  num_steps = tf.to_int64(tf.reduce_sum(valid, axis=-1))
+  gammas = tf.constant(gamma**np.arange(n), dtype=rewards.dtype)
+  # The reward of step i is discounted by gamma^i prod_{j<i} d_j.
+  reward_discounts = gammas * tf.cast(
+      tf.cumprod(discounts, axis=-1, exclusive=True), rewards.dtype)
+  returns = tf.reduce_sum(valid * reward_discounts * rewards, axis=-1)
+  last_step = tf.one_hot(num_steps - 1, n, dtype=discounts.dtype)
+  discount = tf.reduce_sum(
+      last_step * tf.cast(gammas, discounts.dtype) *
+      tf.cumprod(discounts, axis=-1), axis=-1)
+  ends_on_boundary = tf.reduce_any(
+      tf.logical_and(tf.cast(last_step, tf.bool), is_boundary), axis=-1)
+  discount = tf.where(ends_on_boundary, tf.zeros_like(discount), discount)
+  next_step_type = tf.reduce_sum(
+      tf.cast(last_step, next_step_types.dtype) * next_step_types, axis=-1)
+  return returns, discount, next_step_type, num_steps
+
+
 @gin.configurable
 class TFUniformReplayBuffer(replay_buffer.ReplayBuffer,
                             tf.contrib.eager.Checkpointable):
@@ -57,9 +105,15 @@ class TFUniformReplayBuffer(replay_buffer.ReplayBuffer,
                max_length=1000,
                scope='TFUniformReplayBuffer',
                device='cpu:*',
-               table_fn=table.Table):
+               table_fn=table.Table,
+               window_mode=None):
     """Creates a TFUniformReplayBuffer.
 
+    With a `window_mode`, the buffer keeps the id of the first item of the
+    episode of each row, and sub-episodes sampled with `num_steps` never cross
+    an episode boundary. An episode starts at an item with a FIRST step type,
+    or at the item following one with a LAST step type in its batch segment.
+
     Args:
       data_spec: A TensorSpec or a list/tuple/nest of TensorSpecs describing a
         single item that can be stored in this buffer.
@@ -70,10 +124,24 @@ class TFUniformReplayBuffer(replay_buffer.ReplayBuffer,
       device: A TensorFlow device to place the Variables and ops.
       table_fn: Function to create tables `table_fn(data_spec, capacity)` that
         can read/write nested tensors.
+      window_mode: How sub-episodes of num_steps items are sampled:
+        - None: starting at any item, possibly crossing episode boundaries.
+        - `replay_buffer.WITHIN_EPISODE`: lying fully inside one episode.
+        - `replay_buffer.EPISODE_START`: lying fully inside one episode and
+          starting at its first item.
+        Requires data_spec to be the spec of a trajectory.
 
     Raises:
-      ValueError: If batch_size does not evenly divide capacity.
+      ValueError: If batch_size does not evenly divide capacity, or if
+        window_mode is unknown, or set with a data_spec which is not the spec of
+        a trajectory.
     """
+    if window_mode not in replay_buffer.WINDOW_MODES:
+      raise ValueError('Unknown window_mode: {}'.format(window_mode))
+    if (window_mode is not None and
+        not isinstance(data_spec, trajectory.Trajectory)):
+      raise ValueError('window_mode requires the data_spec to be a '
+                       'trajectory: {}'.format(data_spec))
     self._batch_size = batch_size
     self._max_length = max_length
     capacity = self._batch_size * self._max_length
@@ -86,6 +154,7 @@ class TFUniformReplayBuffer(replay_buffer.ReplayBuffer,
     self._scope = scope
     self._device = device
     self._table_fn = table_fn
+    self._window_mode = window_mode
     # TODO(sguada) move to create_variables function so we can use make_template
     # to handle this.
     with tf.device(self._device), tf.variable_scope(self._scope):
@@ -100,6 +169,29 @@ class TFUniformReplayBuffer(replay_buffer.ReplayBuffer,
           use_resource=True,
           trainable=False)
       self._last_id_cs = tf.contrib.framework.CriticalSection(name='last_id')
+      if window_mode is not None:
+        # Id of the first item of the episode of each row, -1 when the
+        # episode started before the first item added to its batch segment.
+        self._episode_start_spec = tensor_spec.TensorSpec(
+            [], dtype=tf.int64, name='episode_start')
+        self._episode_start_table = table_fn(self._episode_start_spec,
+                                             self._capacity_value)
+        # Episode start and step type of the last item of each batch segment.
+        self._episode_starts = tf.get_variable(
+            name='episode_starts',
+            shape=[self._batch_size],
+            dtype=tf.int64,
+            initializer=tf.constant_initializer(-1, dtype=tf.int64),
+            use_resource=True,
+            trainable=False)
+        self._last_step_types = tf.get_variable(
+            name='last_step_types',
+            shape=[self._batch_size],
+            dtype=tf.int32,
+            initializer=tf.constant_initializer(
+                ts.StepType.FIRST, dtype=tf.int32),
+            use_resource=True,
+            trainable=False)
 
   def variables(self):
     # TODO(sguada) - make this Eager-compatible. Don't rely on scopes.
@@ -126,19 +218,134 @@ class TFUniformReplayBuffer(replay_buffer.ReplayBuffer,
       items: A tensor or list/tuple/nest of tensors representing a batch of
       items to be added to the replay buffer. Each element of `items` must match
       the data_spec of this class. Should be shape [batch_size, data_spec, ...]
+      or [batch_size, T, data_spec, ...] to add T items to each batch segment.
     Returns:
       An op that adds `items` to the replay buffer.
     Raises:
       ValueError: If called more than once.
     """
     nest.assert_same_structure(items, self._data_spec)
+    first_item = nest.flatten(items)[0]
+    first_spec = nest.flatten(self._data_spec)[0]
+    if (first_item.shape.ndims is not None and
+        first_item.shape.ndims - first_spec.shape.ndims == 2):
+      return self._add_batch_steps(items)
 
     with tf.device(self._device), tf.name_scope(self._scope):
       id_ = self._increment_last_id()
       write_rows = self._get_rows_for_id(id_)
-      write_id_op = self._id_table.write(write_rows, id_)
-      write_data_op = self._data_table.write(write_rows, items)
-      return tf.group(write_id_op, write_data_op)
+      write_ops = [self._id_table.write(write_rows, id_),
+                   self._data_table.write(write_rows, items)]
+      write_ops += self._on_write(write_rows)
+      if self._window_mode is not None:
+        write_ops.append(self._write_episode_starts(
+            write_rows, id_, items.step_type))
+      return tf.group(*write_ops)
+
+  def _add_batch_steps(self, items):
+    """Adds items of shape [batch_size, T, ...] to the buffer in one op.
+
+    T may be dynamic, e.g. 0. When it is greater than max_length, only the last
+    max_length items are written, the others being overwritten anyway.
+
+    Args:
+      items: A nest of tensors of shape [batch_size, T, ...].
+
+    Returns:
+      An op that adds `items` to the replay buffer.
+    """
+    with tf.device(self._device), tf.name_scope(self._scope):
+      num_steps = tf.shape(nest.flatten(items)[0], out_type=tf.int64)[1]
+      last_id = self._increment_last_id(num_steps)
+      ids = last_id - num_steps + 1 + tf.range(num_steps, dtype=tf.int64)
+      # Index of the first of the last max_length items.
+      first_write = tf.to_int32(tf.maximum(num_steps - self._max_length, 0))
+      write_ids = ids[first_write:]
+      # Rows of the items written, of shape [batch_size, T] at most, flattened
+      # in row-major order like the items.
+      rows = tf.expand_dims(self._batch_offsets, 1) + tf.mod(
+          write_ids, self._max_length)
+      write_rows = tf.reshape(rows, [-1])
+      flat_items = nest.map_structure(
+          lambda t: tf.reshape(t[:, first_write:],
+                               tf.concat([[-1], tf.shape(t)[2:]], 0)),
+          items)
+      write_ops = [
+          self._id_table.write(
+              write_rows, tf.tile(write_ids, [self._batch_size])),
+          self._data_table.write(write_rows, flat_items)]
+      write_ops += self._on_write(write_rows)
+      if self._window_mode is not None:
+        write_ops.append(self._write_episode_starts_steps(
+            write_rows, ids, items.step_type, first_write))
+      return tf.group(*write_ops)
+
+  def _on_write(self, write_rows):
+    """Returns the ops writing per row data of subclasses, e.g. priorities.
+
+    Args:
+      write_rows: An int64 Tensor of shape [N], the rows of the items written
+        by `add_batch`, single steps or sequences of steps alike.
+
+    Returns:
+      A list of ops.
+    """
+    del write_rows  # Unused.
+    return []
+
+  def _write_episode_starts(self, write_rows, id_, step_types):
+    """Returns an op writing the episode start of the items added at id_."""
+    step_types = tf.cast(step_types, tf.int32)
+    is_start = tf.logical_or(
+        tf.equal(step_types, ts.StepType.FIRST),
+        tf.equal(self._last_step_types.value(), ts.StepType.LAST))
+    episode_starts = tf.where(is_start, tf.fill([self._batch_size], id_),
+                              self._episode_starts.value())
+    return tf.group(
+        self._episode_start_table.write(write_rows, episode_starts),
+        self._episode_starts.assign(episode_starts),
+        self._last_step_types.assign(step_types))
+
+  def _write_episode_starts_steps(self, write_rows, ids, step_types,
+                                  first_write):
+    """Like _write_episode_starts, for step_types of shape [batch_size, T].
+
+    Args:
+      write_rows: Rows of the items written in each batch segment.
+      ids: The T ids of the items.
+      step_types: The step types of the items, shape [batch_size, T].
+      first_write: Index of the first item written in each batch segment.
+
+    Returns:
+      An op writing the episode starts of the items written.
+    """
+    def next_episode_starts(previous, id_and_step_types):
+      episode_starts, last_step_types = previous
+      id_, step_types = id_and_step_types
+      is_start = tf.logical_or(
+          tf.equal(step_types, ts.StepType.FIRST),
+          tf.equal(last_step_types, ts.StepType.LAST))
+      episode_starts = tf.where(is_start, tf.fill([self._batch_size], id_),
+                                episode_starts)
+      return episode_starts, step_types
+
+    last_episode_starts = self._episode_starts.value()
+    last_step_types = self._last_step_types.value()
+    step_types = tf.transpose(tf.cast(step_types, tf.int32))
+    episode_starts, _ = tf.scan(
+        next_episode_starts, (ids, step_types),
+        initializer=(last_episode_starts, last_step_types),
+        back_prop=False)
+    write_starts = tf.transpose(episode_starts[first_write:])
+    # The last episode starts and step types are kept when T is 0.
+    episode_starts = tf.concat(
+        [tf.expand_dims(last_episode_starts, 0), episode_starts], 0)
+    step_types = tf.concat([tf.expand_dims(last_step_types, 0), step_types], 0)
+    return tf.group(
+        self._episode_start_table.write(
+            write_rows, tf.reshape(write_starts, [-1])),
+        self._episode_starts.assign(episode_starts[-1]),
+        self._last_step_types.assign(step_types[-1]))
 
   def _get_next(self,
                 sample_batch_size=None,
@@ -169,6 +376,8 @@ class TFUniformReplayBuffer(replay_buffer.ReplayBuffer,
     Raises:
       ValueError: if num_steps is bigger than the capacity.
     """
+    if num_steps is not None and self._window_mode is not None:
+      return self._get_next_window(sample_batch_size, num_steps, time_stacked)
     with tf.device(self._device), tf.name_scope(self._scope):
       with tf.name_scope('get_next'):
         min_val, max_val = self._valid_range_ids(
@@ -226,6 +435,155 @@ class TFUniformReplayBuffer(replay_buffer.ReplayBuffer,
                                  probabilities=probabilities)
     return data, buffer_info
 
+  def _get_next_window(self, sample_batch_size, num_steps, time_stacked):
+    """Samples sub-episodes uniformly among the windows of the window_mode.
+
+    The valid windows are found from the episode start of their last row, so
+    the sampling is a search in the cumulative count of the valid rows, without
+    rejection.
+
+    Args:
+      sample_batch_size: An optional batch_size to specify the number of
+        sub-episodes to return.
+      num_steps: Number of items of the sub-episodes.
+      time_stacked: Bool, whether the items are stacked on the time dimension.
+    Returns:
+      A 2 tuple of the sub-episodes and their BufferInfo, see `_get_next`.
+    """
+    with tf.device(self._device), tf.name_scope(self._scope):
+      with tf.name_scope('get_next_window'):
+        last_id = self._get_last_id()
+        min_id = tf.maximum(last_id + 1 - self._max_length, 0)
+        rows_shape = () if sample_batch_size is None else (sample_batch_size,)
+
+        # Id of the item of each row, negative if the row is empty, and id of
+        # the first item of the window ending at each row.
+        positions = tf.range(self._max_length, dtype=tf.int64)
+        row_ids = tf.tile(
+            last_id - tf.mod(last_id - positions, self._max_length),
+            [self._batch_size])
+        window_starts = row_ids - (num_steps - 1)
+        episode_starts = self._episode_start_table.read(
+            tf.range(self._capacity_value, dtype=tf.int64))
+        if self._window_mode == replay_buffer.EPISODE_START:
+          is_window_end = tf.logical_and(
+              tf.equal(window_starts, episode_starts),
+              window_starts >= min_id)
+        else:
+          is_window_end = window_starts >= tf.maximum(episode_starts, min_id)
+
+        cumulative_counts = tf.cumsum(tf.to_int64(is_window_end))
+        total = cumulative_counts[-1]
+        assert_nonempty = tf.assert_greater(
+            total,
+            tf.constant(0, tf.int64),
+            message='TFUniformReplayBuffer has no episode with enough items. '
+            'Make sure to add items before sampling the buffer.')
+        with tf.control_dependencies([assert_nonempty]):
+          values = tf.random_uniform(
+              rows_shape, maxval=total, dtype=tf.int64)
+        end_rows = tf.searchsorted(
+            cumulative_counts, tf.reshape(values, [-1]), side='right',
+            out_type=tf.int64)
+        end_rows = tf.reshape(end_rows, rows_shape)
+
+        # Read the window within the batch segment of its last row.
+        segments = tf.floordiv(end_rows, self._max_length)
+        step_ids = (tf.expand_dims(tf.gather(window_starts, end_rows), -1) +
+                    tf.range(num_steps, dtype=tf.int64))
+        rows = (tf.expand_dims(segments * self._max_length, -1) +
+                tf.mod(step_ids, self._max_length))
+        if time_stacked:
+          data = self._data_table.read(rows)
+          data_ids = self._id_table.read(rows)
+        else:
+          data = tuple(self._data_table.read(rows[..., step])
+                       for step in range(num_steps))
+          data_ids = tuple(self._id_table.read(rows[..., step])
+                           for step in range(num_steps))
+        probabilities = tf.fill(rows_shape, 1. / tf.to_float(total))
+
+        buffer_info = BufferInfo(ids=data_ids,
+                                 probabilities=probabilities)
+    return data, buffer_info
+
+  def _get_next_n_step(self, sample_batch_size=None, n_step=1, gamma=1.0):
+    """Returns an n-step transition or batch thereof sampled uniformly.
+
+    Args:
+      sample_batch_size: (Optional.) An optional batch_size to specify the
+        number of transitions to return. See get_next() documentation.
+      n_step: Maximum number of steps of the transitions.
+      gamma: Discount factor of the rewards.
+    Returns:
+      A 2 tuple, containing:
+        - A 2-step trajectory or batch thereof, see get_next_n_step()
+          documentation.
+        - BufferInfo NamedTuple, containing:
+          - The ids of the 2 items.
+          - The sampling probability of each transition.
+    Raises:
+      ValueError: If the data_spec is not a Trajectory.
+    """
+    if not isinstance(self._data_spec, trajectory.Trajectory):
+      raise ValueError('n-step sampling requires the data_spec to be a '
+                       'trajectory: {}'.format(self._data_spec))
+    with tf.device(self._device), tf.name_scope(self._scope):
+      with tf.name_scope('get_next_n_step'):
+        min_val, max_val = self._valid_range_ids(
+            self._get_last_id(), self._max_length, n_step + 1)
+        rows_shape = () if sample_batch_size is None else (sample_batch_size,)
+        assert_nonempty = tf.assert_greater(
+            max_val,
+            min_val,
+            message='TFUniformReplayBuffer is empty. Make sure to add items '
+            'before sampling the buffer.')
+        with tf.control_dependencies([assert_nonempty]):
+          ids = tf.random_uniform(
+              rows_shape, minval=min_val, maxval=max_val, dtype=tf.int64)
+        batch_offsets = tf.random_uniform(
+            rows_shape, minval=0, maxval=self._batch_size, dtype=tf.int64)
+        batch_offsets = tf.expand_dims(batch_offsets * self._max_length, -1)
+
+        # Only the step types, reward and discount are read for the n steps.
+        # Rows stay within the batch segment of the first one.
+        step_ids = tf.expand_dims(ids, -1) + tf.range(n_step, dtype=tf.int64)
+        step_rows = batch_offsets + tf.mod(step_ids, self._max_length)
+        slots = self._data_table.slots
+        step_types, rewards, discounts, next_step_types = (
+            self._data_table.read(
+                step_rows, slots=[slots.step_type, slots.reward,
+                                  slots.discount, slots.next_step_type]))
+        returns, discount, next_step_type, num_steps = _n_step_returns(
+            step_types, rewards, discounts, next_step_types, gamma)
+
+        item_ids = tf.stack([ids, ids + num_steps], axis=-1)
+        rows = batch_offsets + tf.mod(item_ids, self._max_length)
+        data = self._data_table.read(rows)
+        data_ids = self._id_table.read(rows)
+
+        # Replace the values of the first step with the accumulated ones.
+        time_axis = len(rows_shape)
+        def replace_first_step(values, first_step_values):
+          return tf.stack(
+              [first_step_values, tf.gather(values, 1, axis=time_axis)],
+              axis=time_axis)
+        data = data._replace(
+            reward=replace_first_step(data.reward, returns),
+            discount=replace_first_step(data.discount, discount),
+            next_step_type=replace_first_step(data.next_step_type,
+                                              next_step_type))
+
+        num_ids = max_val - min_val
+        probability = tf.cond(
+            tf.equal(num_ids, 0), lambda: 0.,
+            lambda: 1. / tf.cast(num_ids * self._batch_size, tf.float32))
+        probabilities = tf.fill(rows_shape, probability)
+
+        buffer_info = BufferInfo(ids=data_ids,
+                                 probabilities=probabilities)
+    return data, buffer_info
+
   @gin.configurable(
       'tf_agents.tf_uniform_replay_buffer.TFUniformReplayBuffer.as_dataset')
   def as_dataset(self,
@@ -256,6 +614,49 @@ class TFUniformReplayBuffer(replay_buffer.ReplayBuffer,
       ValueError: If the data spec contains lists that must be converted to
         tuples.
     """
+    self._check_dataset_data_spec()
+
+    def get_next(_):
+      return self.get_next(sample_batch_size, num_steps, time_stacked=True)
+
+    return tf.data.experimental.Counter().map(
+        get_next,
+        num_parallel_calls=num_parallel_calls)
+
+  def _as_n_step_dataset(self,
+                         sample_batch_size=None,
+                         n_step=1,
+                         gamma=1.0,
+                         num_parallel_calls=None):
+    """Creates a dataset that returns n-step transitions from the buffer.
+
+    Args:
+      sample_batch_size: (Optional.) An optional batch_size to specify the
+        number of transitions to return. See as_dataset() documentation.
+      n_step: Maximum number of steps of the transitions.
+      gamma: Discount factor of the rewards.
+      num_parallel_calls: (Optional.) Number elements to process in parallel.
+        See as_dataset() documentation.
+    Returns:
+      A dataset of type tf.data.Dataset, elements of which are 2-tuples of:
+        - A 2-step trajectory or batch thereof.
+        - Auxiliary info for the items (i.e. ids, probs).
+
+    Raises:
+      ValueError: If the data spec contains lists that must be converted to
+        tuples.
+    """
+    self._check_dataset_data_spec()
+
+    def get_next_n_step(_):
+      return self.get_next_n_step(sample_batch_size, n_step, gamma)
+
+    return tf.data.experimental.Counter().map(
+        get_next_n_step,
+        num_parallel_calls=num_parallel_calls)
+
+  def _check_dataset_data_spec(self):
+    """Raises a ValueError if the data spec cannot be used by datasets."""
     # data_nest.flatten does not flatten python lists, nest.flatten does.
     if nest.flatten(self._data_spec) != data_nest.flatten(self._data_spec):
       raise ValueError(
@@ -265,13 +666,6 @@ class TFUniformReplayBuffer(replay_buffer.ReplayBuffer,
           'change it to (a, b, c).  Spec structure is:\n  {}'.format(
               nest.map_structure(lambda spec: spec.dtype, self._data_spec)))
 
-    def get_next(_):
-      return self.get_next(sample_batch_size, num_steps, time_stacked=True)
-
-    return tf.data.experimental.Counter().map(
-        get_next,
-        num_parallel_calls=num_parallel_calls)
-
   def _gather_all(self):
     """Returns all the items in buffer, shape [batch_size, timestep, ...].
 
@@ -310,8 +704,16 @@ class TFUniformReplayBuffer(replay_buffer.ReplayBuffer,
       op that clears or unlinks the replay buffer contents.
     """
     table_vars = self._data_table.variables() + self._id_table.variables()
+    if self._window_mode is not None:
+      table_vars += self._episode_start_table.variables()
     def _init_vars():
       assignments = [self._last_id.assign(-1)]
+      if self._window_mode is not None:
+        assignments += [
+            self._episode_starts.assign(tf.fill([self._batch_size],
+                                                tf.constant(-1, tf.int64))),
+            self._last_step_types.assign(
+                tf.fill([self._batch_size], np.int32(ts.StepType.FIRST)))]
       if clear_all_variables:
         assignments += [v.assign(tf.zeros_like(v)) for v in table_vars]
       return tf.group(*assignments, name='clear')
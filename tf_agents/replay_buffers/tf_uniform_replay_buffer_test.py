@@ -23,6 +23,9 @@ import numpy as np
 import tensorflow as tf
 
 from tf_agents import specs
+from tf_agents.environments import time_step as ts
+from tf_agents.environments import trajectory
+from tf_agents.replay_buffers import replay_buffer as replay_buffer_lib
 from tf_agents.replay_buffers import tf_uniform_replay_buffer
 from tf_agents.utils import test_utils
 
@@ -413,6 +416,161 @@ class TFUniformReplayBufferTest(parameterized.TestCase, tf.test.TestCase):
             1. / min(i * buffer_batch_size, max_length * buffer_batch_size))
         self.assertAllClose(expected_probability, probabilities_)
 
+  def testGetNextNStep(self):
+    mid, first, last = (ts.StepType.MID, ts.StepType.FIRST, ts.StepType.LAST)
+    step_types = [first, mid, mid, last, first, mid, mid, mid]
+    next_step_types = [mid, mid, last, first, mid, mid, mid, mid]
+    # The episode ends with a discount of 1, e.g. on a life loss.
+    items = trajectory.Trajectory(
+        step_type=np.array(step_types, dtype=np.int32),
+        observation=np.arange(8, dtype=np.int64),
+        action=np.zeros(8, dtype=np.int32),
+        policy_info=(),
+        next_step_type=np.array(next_step_types, dtype=np.int32),
+        reward=np.array([1., 2., 4., 0., 8., 16., 32., 64.], dtype=np.float32),
+        discount=np.array([1., .9, 1., 1., 1., 1., 1., 1.], dtype=np.float32))
+    spec = nest.map_structure(
+        lambda x: specs.TensorSpec(x.shape[1:], tf.as_dtype(x.dtype)), items)
+    replay_buffer = tf_uniform_replay_buffer.TFUniformReplayBuffer(
+        spec, batch_size=2, max_length=8)
+
+    # The second batch segment has observations offset by 100.
+    index = tf.Variable(0).count_up_to(8)
+    item = nest.map_structure(lambda x: tf.gather(x, index), items)
+    batch = nest.map_structure(lambda x: tf.stack([x, x]), item)
+    add_op = replay_buffer.add_batch(batch._replace(
+        observation=tf.stack([item.observation, item.observation + 100])))
+    traj, buffer_info = replay_buffer.get_next_n_step(
+        sample_batch_size=100, n_step=3, gamma=0.5)
+
+    # Start observation: (end observation, return, discount, next step type).
+    expected = {
+        0: (3, 1. + .5 * 2. + .25 * .9 * 4., .25 * .9, last),
+        1: (3, 2. + .5 * .9 * 4., .5 * .9, last),
+        2: (3, 4., 1., last),
+        # A window starting on the boundary item ends there.
+        3: (4, 0., 0., first),
+        4: (7, 8. + .5 * 16. + .25 * 32., .25, mid),
+    }
+    with self.test_session() as sess:
+      tf.global_variables_initializer().run()
+      for _ in range(8):
+        sess.run(add_op)
+      traj_, buffer_info_ = sess.run((traj, buffer_info))
+      self.assertEqual((100, 2), buffer_info_.ids.shape)
+      self.assertAllClose([1. / 10] * 100, buffer_info_.probabilities)
+      self.assertAllEqual(np.arange(5),
+                          np.unique(traj_.observation[:, 0] % 100))
+      for k in range(100):
+        start = traj_.observation[k, 0]
+        end, reward, discount, next_step_type = expected[start % 100]
+        # Both items are read from the same batch segment.
+        self.assertEqual(end + start // 100 * 100, traj_.observation[k, 1])
+        self.assertEqual(step_types[start % 100], traj_.step_type[k, 0])
+        self.assertAllClose(reward, traj_.reward[k, 0])
+        self.assertAllClose(discount, traj_.discount[k, 0])
+        self.assertEqual(next_step_type, traj_.next_step_type[k, 0])
+
+  @parameterized.named_parameters(
+      ('WithinEpisode', replay_buffer_lib.WITHIN_EPISODE,
+       [6, 7, 8, 9, 102, 103, 106, 107, 108, 109]),
+      ('EpisodeStart', replay_buffer_lib.EPISODE_START, [6, 106]),
+      ('WithinEpisodeAddSteps', replay_buffer_lib.WITHIN_EPISODE,
+       [6, 7, 8, 9, 102, 103, 106, 107, 108, 109], 3),
+      ('EpisodeStartAddSteps', replay_buffer_lib.EPISODE_START, [6, 106], 4),
+  )
+  def testGetNextWindowMode(self, window_mode, expected_starts,
+                            steps_per_add=1):
+    def episode_step_types(episode_lengths):
+      step_types = []
+      for length in episode_lengths:
+        step_types += ([ts.StepType.FIRST] + [ts.StepType.MID] * (length - 2) +
+                       [ts.StepType.LAST])
+      return step_types
+    # The batch segments have different episodes, and the second one has
+    # observations offset by 100. The 2 oldest items get overwritten.
+    step_types = np.array(
+        [episode_step_types([4, 2, 6]), episode_step_types([6, 6])],
+        dtype=np.int32).T
+    items = trajectory.Trajectory(
+        step_type=step_types,
+        observation=np.arange(12, dtype=np.int64)[:, None] + [0, 100],
+        action=np.zeros((12, 2), dtype=np.int32),
+        policy_info=(),
+        next_step_type=np.roll(step_types, -1, axis=0),
+        reward=np.zeros((12, 2), dtype=np.float32),
+        discount=np.ones((12, 2), dtype=np.float32))
+    spec = nest.map_structure(
+        lambda x: specs.TensorSpec(x.shape[2:], tf.as_dtype(x.dtype)), items)
+    replay_buffer = tf_uniform_replay_buffer.TFUniformReplayBuffer(
+        spec, batch_size=2, max_length=10, window_mode=window_mode)
+
+    num_adds = 12 // steps_per_add
+    index = tf.Variable(0).count_up_to(num_adds)
+    if steps_per_add == 1:
+      add_op = replay_buffer.add_batch(
+          nest.map_structure(lambda x: tf.gather(x, index), items))
+    else:
+      # Add items of shape [batch_size, steps_per_add].
+      step_ids = index * steps_per_add + tf.range(steps_per_add)
+      add_op = replay_buffer.add_batch(nest.map_structure(
+          lambda x: tf.transpose(tf.gather(x, step_ids), [1, 0]), items))
+    traj, buffer_info = replay_buffer.get_next(
+        sample_batch_size=500, num_steps=3)
+    with self.test_session() as sess:
+      tf.global_variables_initializer().run()
+      for _ in range(num_adds):
+        sess.run(add_op)
+      traj_, buffer_info_ = sess.run((traj, buffer_info))
+      self.assertAllEqual(expected_starts, np.unique(traj_.observation[:, 0]))
+      self.assertAllEqual(traj_.observation[:, :1] + np.arange(3),
+                          traj_.observation)
+      self.assertAllClose([1. / len(expected_starts)] * 500,
+                          buffer_info_.probabilities)
+
+  def testAddBatchSteps(self):
+    spec = specs.TensorSpec([2], tf.int64, 'obs')
+    replay_buffer = tf_uniform_replay_buffer.TFUniformReplayBuffer(
+        spec, batch_size=2, max_length=5)
+    # Items of shape [batch_size, 3, 2], the second segment offset by 100.
+    items = tf.reshape(tf.range(6, dtype=tf.int64), [1, 3, 2]) + [[[0]],
+                                                                  [[100]]]
+    add_op = replay_buffer.add_batch(items)
+    data = replay_buffer.gather_all()
+    # pylint: disable=protected-access
+    ids = replay_buffer._id_table.read(tf.range(10))
+    with self.test_session() as sess:
+      tf.global_variables_initializer().run()
+      sess.run(add_op)
+      sess.run(add_op)
+      data_, ids_ = sess.run((data, ids))
+      # The second add overwrote the first item of each segment.
+      expected = np.arange(6).reshape(3, 2)[[1, 2, 0, 1, 2]]
+      self.assertAllEqual([expected, expected + 100], data_)
+      self.assertAllEqual([5, 1, 2, 3, 4] * 2, ids_)
+
+  def testAddBatchStepsLongerThanMaxLength(self):
+    spec = specs.TensorSpec([], tf.int64, 'obs')
+    replay_buffer = tf_uniform_replay_buffer.TFUniformReplayBuffer(
+        spec, batch_size=1, max_length=2)
+    num_steps = tf.placeholder(tf.int32, [])
+    add_op = replay_buffer.add_batch(
+        tf.expand_dims(tf.range(num_steps, dtype=tf.int64), 0))
+    data = replay_buffer.gather_all()
+    with self.test_session() as sess:
+      tf.global_variables_initializer().run()
+      sess.run(add_op, feed_dict={num_steps: 3})
+      self.assertAllEqual([[1, 2]], sess.run(data))
+      # Adding no item leaves the buffer as it is.
+      sess.run(add_op, feed_dict={num_steps: 0})
+      self.assertAllEqual([[1, 2]], sess.run(data))
+
+  def testWindowModeRequiresTrajectory(self):
+    with self.assertRaises(ValueError):
+      tf_uniform_replay_buffer.TFUniformReplayBuffer(
+          self._data_spec(), batch_size=1,
+          window_mode=replay_buffer_lib.WITHIN_EPISODE)
+
 
 if __name__ == '__main__':
   tf.test.main()